@@ -4,7 +4,6 @@
 
 import sys
 import os
-import glob
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -22,20 +21,42 @@ print("\n========== SCRIPT STARTED ==========")
 # ============================================
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "biometric_data")
-
-files = glob.glob(os.path.join(DATA_DIR, "*.xlsx"))
-
-if not files:
-    raise FileNotFoundError("❌ No Excel files found")
-
-df = pd.concat(
-    (pd.read_excel(
-        f,
-        usecols=['state', 'district', 'pincode', 'bio_age_5_17', 'bio_age_17_']
-    ) for f in files),
-    ignore_index=True
-)
+sys.path.insert(0, os.path.join(BASE_DIR, os.pardir, "Aadhaar"))
+from ingest import load_source
+from rollups import load_rollups
+from sketches import distinct_pincodes, sketch_quantile
+from sampling import preview_source, estimate_ratio
+from bootstrap import bootstrap_ranks
+
+# Guidance zone cut-offs. None = fixed 0.05 / 0.15.
+# e.g. (0.25, 0.50) = national percentiles of child_compliance_ratio from the rollup sketches
+PERCENTILE_ZONES = None
+
+# True = estimate from a stratified sample of the workbooks (by state and month, see
+# sampling.py) with confidence intervals. Quick threshold tuning only; the rollup
+# sketches (PIN counts, medians, percentile zones) are skipped in a preview.
+PREVIEW = False
+
+# Rank stability of the TOP 10: resample the PIN codes of every district this many
+# times (bootstrap.py). 0 = skip; not run in a preview (the sample has its own intervals).
+BOOTSTRAP_REPLICATES = 2000
+
+if PREVIEW:
+    sample = preview_source(
+        'biometric',
+        ['state', 'district', 'pincode', 'bio_age_5_17', 'bio_age_17_'],
+        data_dir=BASE_DIR
+    )
+    df = sample['rows']
+else:
+    # Validated once at ingest: bad PINs, negative / missing counts are quarantined
+    df = load_source(
+        'biometric',
+        ['state', 'district', 'pincode', 'bio_age_5_17', 'bio_age_17_'],
+        data_dir=BASE_DIR
+    )
+    # Sketches for the PIN counts, medians and percentile zones (one unpickle)
+    rollups = load_rollups(BASE_DIR)
 
 print("✔ Files Loaded | Rows:", len(df))
 
@@ -49,13 +70,10 @@ df.rename(columns={
 }, inplace=True)
 
 # ============================================
-# 3. DATA SANITY FILTER (VERY IMPORTANT)
+# 3. ZERO DIVISION GUARD
 # ============================================
 
-df = df[
-    (df['child_updates'] >= 0) &
-    (df['adult_updates'] > 0)   # 🚀 THIS FIXES ZERO DIVISION
-]
+df = df[df['adult_updates'] > 0]   # 🚀 THIS FIXES ZERO DIVISION
 
 # ============================================
 # 4. COMPLIANCE RATIO (SAFE)
@@ -71,13 +89,26 @@ print("✔ Ratio Computed")
 # 5. DISTRICT LEVEL AGGREGATION (FAST & CORRECT)
 # ============================================
 
-district_summary = (
-    df.groupby(['state', 'district'], as_index=False)
-      .agg(
-          avg_child_compliance=('child_compliance_ratio', 'mean'),
-          affected_pincodes=('pincode', 'nunique')
-      )
-)
+if PREVIEW:
+    # Mean ratio = estimated sum of ratios / estimated row count, per district
+    # (the filtered-out rows count as zeros of both, as the design requires)
+    sample['rows'] = df.assign(row=1)
+    estimate = estimate_ratio(sample, ['state', 'district'], 'child_compliance_ratio', 'row')
+    district_summary = estimate.rename(columns={'estimate': 'avg_child_compliance'}).reset_index()
+    # PIN codes seen in the sample: a lower bound of the true count
+    pin_counts = df.groupby(['state', 'district'])['pincode'].nunique()
+else:
+    district_summary = (
+        df.groupby(['state', 'district'], as_index=False)
+          .agg(avg_child_compliance=('child_compliance_ratio', 'mean'))
+    )
+    # Distinct PIN codes per district: merged HyperLogLog sketches from the rollups
+    # (no exact nunique over the raw rows)
+    bio_sketch = rollups['hll']['biometric']
+    pin_counts = distinct_pincodes(bio_sketch, by=['state', 'district'])
+
+district_summary = district_summary.join(pin_counts.rename('affected_pincodes'), on=['state', 'district'])
+district_summary['affected_pincodes'] = district_summary['affected_pincodes'].fillna(0).round().astype(int)
 
 # 🚨 This is why second graph was blank earlier
 district_summary = district_summary[
@@ -90,9 +121,42 @@ top_problem_districts = (
     .head(10)
 )
 
-print("\nTOP LOW COMPLIANCE DISTRICTS")
+print("\nTOP LOW COMPLIANCE DISTRICTS" + (" (PREVIEW: estimated, with confidence intervals)" if PREVIEW else ""))
 print(top_problem_districts)
 
+if BOOTSTRAP_REPLICATES and not PREVIEW:
+    # Same mean ratio per district, re-ranked on PIN codes resampled within each district
+    ranked = pd.MultiIndex.from_frame(district_summary[['state', 'district']])
+    rank_ci = bootstrap_ranks(
+        df[pd.MultiIndex.from_frame(df[['state', 'district']]).isin(ranked)],
+        ['state', 'district'],
+        ['child_compliance_ratio'],
+        lambda s: s['child_compliance_ratio'] / s['rows'],
+        ascending=True,
+        top=10,
+        replicates=BOOTSTRAP_REPLICATES
+    )
+    top_problem_districts = top_problem_districts.merge(
+        rank_ci[['state', 'district', 'rank', 'rank_ci_low', 'rank_ci_high', 'p_top']],
+        on=['state', 'district'], how='left'
+    )
+    print(f"\nRANK STABILITY ({BOOTSTRAP_REPLICATES} bootstrap resamples of PIN codes, p_top = P(in top 10))")
+    print(top_problem_districts[['state', 'district', 'rank', 'rank_ci_low', 'rank_ci_high', 'p_top']].to_string(index=False))
+
+if not PREVIEW:
+    # Bottom 5% of districts by MEDIAN ratio, straight from the quantile sketches
+    ratio_sketch = rollups['quantiles']['child_compliance_ratio']
+    district_medians = sketch_quantile(ratio_sketch, 0.5, by=['state', 'district'])
+    bottom_5pct = district_medians[district_medians <= district_medians.quantile(0.05)].sort_values()
+
+    print("\nBOTTOM 5% DISTRICTS (median child compliance ratio)")
+    print(bottom_5pct.to_string())
+
+warn_cut, critical_cut = 0.05, 0.15
+if PERCENTILE_ZONES and not PREVIEW:
+    warn_cut, critical_cut = (sketch_quantile(ratio_sketch, q) for q in PERCENTILE_ZONES)
+    print(f"Percentile zones: {warn_cut:.3f} / {critical_cut:.3f}")
+
 # ============================================
 # 6. VISUALIZATION (CLEAR & MISREAD-PROOF)
 # ============================================
@@ -106,14 +170,20 @@ sns.barplot(
     color='#c0392b'  # strong red = bad
 )
 
+if PREVIEW:
+    # Confidence interval of each estimated district ratio
+    ratio = top_problem_districts['avg_child_compliance']
+    plt.errorbar(x=ratio, y=range(len(top_problem_districts)), fmt='none', ecolor='black', capsize=4,
+                 xerr=[ratio - top_problem_districts['ci_low'], top_problem_districts['ci_high'] - ratio])
+
 # --- Visual guidance zones ---
-plt.axvspan(0, 0.05, color='green', alpha=0.15, label='Acceptable gap')
-plt.axvspan(0.05, 0.15, color='orange', alpha=0.15, label='Warning')
-plt.axvspan(0.15, top_problem_districts['avg_child_compliance'].max(),
+plt.axvspan(0, warn_cut, color='green', alpha=0.15, label='Acceptable gap')
+plt.axvspan(warn_cut, critical_cut, color='orange', alpha=0.15, label='Warning')
+plt.axvspan(critical_cut, top_problem_districts['avg_child_compliance'].max(),
             color='red', alpha=0.10, label='Critical')
 
 plt.title(
-    'Child Disadvantage vs Adults (Biometric Usage)\nDistrict-wise',
+    'Child Disadvantage vs Adults (Biometric Usage)\nDistrict-wise' + (' - PREVIEW' if PREVIEW else ''),
     fontsize=16
 )
 
@@ -3,7 +3,6 @@
 # ============================================
 
 import os
-import glob
 import sys
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -22,64 +21,58 @@ print("\n========== SCRIPT STARTED ==========")
 # ============================================
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, os.pardir, "Aadhaar"))
+from ingest import load_source
+from rollups import load_rollups
+from sketches import sketch_quantile
+from bootstrap import bootstrap_ranks
 
-BIO_DIR = os.path.join(BASE_DIR, "biometric_data")
-DEMO_DIR = os.path.join(BASE_DIR, "demographic_data")
+# Compliance bucket cut-offs. None = fixed 0.30 / 0.60.
+# e.g. (0.10, 0.30) = national 10th / 30th percentiles of bio_demo_ratio,
+# read from the quantile sketches in the rollups (no pass over the archive).
+# The sketch holds the same ratio as below: same PIN code and date, demo 5-17 > 0.
+PERCENTILE_CUTOFFS = None
 
-bio_files = glob.glob(os.path.join(BIO_DIR, "*.xlsx"))
-demo_files = glob.glob(os.path.join(DEMO_DIR, "*.xlsx"))
-
-print("BIO files:", len(bio_files))
-print("DEMO files:", len(demo_files))
-
-if not bio_files or not demo_files:
-    raise FileNotFoundError("BIO or DEMO Excel files missing")
+# Rank stability of the TOP 10: resample the PIN codes of every district this many
+# times (bootstrap.py). 0 = skip
+BOOTSTRAP_REPLICATES = 2000
 
 # ============================================
 # 2. LOAD BIOMETRIC DATA (ONLY REQUIRED COLS)
 # ============================================
 
-bio_cols = ['state', 'district', 'pincode', 'bio_age_5_17']
+bio_cols = ['date', 'state', 'district', 'pincode', 'bio_age_5_17']
 
-bio_df = pd.concat(
-    [pd.read_excel(f, usecols=bio_cols) for f in bio_files],
-    ignore_index=True
-)
+# Validated at ingest; pincode and counts already arrive as int32
+bio_df = load_source('biometric', bio_cols, data_dir=BASE_DIR)
 
 bio_df.rename(columns={'bio_age_5_17': 'bio_child'}, inplace=True)
 
-# Optimize datatypes
-bio_df['pincode'] = bio_df['pincode'].astype('int32')
-bio_df['bio_child'] = bio_df['bio_child'].astype('int32')
-
 print("BIO rows:", len(bio_df))
 
 # ============================================
 # 3. LOAD DEMOGRAPHIC DATA
 # ============================================
 
-demo_cols = ['state', 'district', 'pincode', 'demo_age_5_17']
+demo_cols = ['date', 'state', 'district', 'pincode', 'demo_age_5_17']
 
-demo_df = pd.concat(
-    [pd.read_excel(f, usecols=demo_cols) for f in demo_files],
-    ignore_index=True
-)
+demo_df = load_source('demographic', demo_cols, data_dir=BASE_DIR)
 
 demo_df.rename(columns={'demo_age_5_17': 'demo_child'}, inplace=True)
 
-demo_df['pincode'] = demo_df['pincode'].astype('int32')
-demo_df['demo_child'] = demo_df['demo_child'].astype('int32')
-
 print("DEMO rows:", len(demo_df))
 
 # ============================================
-# 4. MERGE (PINCODE LEVEL)
+# 4. MERGE (PINCODE + DATE LEVEL)
 # ============================================
 
+# Same PIN code on the same date, each source summed per key first (as in the rollups'
+# daily table, so the ratio below is exactly the one the quantile sketch holds)
+keys = ['date', 'state', 'district', 'pincode']
 df = pd.merge(
-    bio_df,
-    demo_df,
-    on=['state', 'district', 'pincode'],
+    bio_df.groupby(keys, as_index=False)['bio_child'].sum(),
+    demo_df.groupby(keys, as_index=False)['demo_child'].sum(),
+    on=keys,
     how='inner'
 )
 
@@ -89,17 +82,25 @@ print("Merged rows:", len(df))
 # 5. FAST COMPLIANCE RATIO (NO APPLY)
 # ============================================
 
-df['bio_demo_ratio'] = (
-    df['bio_child'] / df['demo_child']
-).replace([float('inf')], 0).fillna(0)
+# No demographic child updates = no ratio (left out, as in the rollup sketch)
+df = df[df['demo_child'] > 0]
+
+df['bio_demo_ratio'] = df['bio_child'] / df['demo_child']
 
 # ============================================
 # 6. COMPLIANCE CATEGORY
 # ============================================
 
+low_cut, mid_cut = 0.30, 0.60
+if PERCENTILE_CUTOFFS:
+    ratio_sketch = load_rollups(BASE_DIR)['quantiles']['bio_demo_ratio']
+    low_cut, mid_cut = (sketch_quantile(ratio_sketch, q) for q in PERCENTILE_CUTOFFS)
+    print(f"Percentile cut-offs: {low_cut:.3f} / {mid_cut:.3f}")
+
 df['compliance_status'] = pd.cut(
     df['bio_demo_ratio'],
-    bins=[-1, 0.30, 0.60, 10],
+    # Open top bucket: a cut-off of any size still leaves room for 'Normal'
+    bins=[-1, low_cut, max(mid_cut, low_cut + 1e-9), float('inf')],
     labels=['High Risk', 'Moderate', 'Normal']
 )
 
@@ -129,6 +130,24 @@ top_districts = district_summary.sort_values(
 print("\nTOP RISK DISTRICTS")
 print(top_districts)
 
+if BOOTSTRAP_REPLICATES:
+    # Same risk score, re-ranked on PIN codes resampled within each district
+    rank_ci = bootstrap_ranks(
+        df.assign(high_risk=(df['compliance_status'] == 'High Risk').astype(int)),
+        ['state', 'district'],
+        ['bio_demo_ratio', 'high_risk'],
+        lambda s: (1 - s['bio_demo_ratio'] / s['rows']) * s['high_risk'],
+        ascending=False,
+        top=10,
+        replicates=BOOTSTRAP_REPLICATES
+    )
+    top_districts = top_districts.merge(
+        rank_ci[['state', 'district', 'rank', 'rank_ci_low', 'rank_ci_high', 'p_top']],
+        on=['state', 'district'], how='left'
+    )
+    print(f"\nRANK STABILITY ({BOOTSTRAP_REPLICATES} bootstrap resamples of PIN codes, p_top = P(in top 10))")
+    print(top_districts[['state', 'district', 'rank', 'rank_ci_low', 'rank_ci_high', 'p_top']].to_string(index=False))
+
 # ============================================
 # 8. VISUALIZATION (CLEAR & MISREAD-PROOF)
 # ============================================
@@ -143,9 +162,9 @@ sns.barplot(
 )
 
 # --- Risk guidance zones ---
-plt.axvspan(0.0, 0.30, color='red', alpha=0.15, label='Critical gap')
-plt.axvspan(0.30, 0.60, color='orange', alpha=0.15, label='Moderate gap')
-plt.axvspan(0.60, 1.0, color='green', alpha=0.15, label='Acceptable')
+plt.axvspan(0.0, low_cut, color='red', alpha=0.15, label='Critical gap')
+plt.axvspan(low_cut, mid_cut, color='orange', alpha=0.15, label='Moderate gap')
+plt.axvspan(mid_cut, max(1.0, mid_cut), color='green', alpha=0.15, label='Acceptable')
 
 plt.title(
     'Child Biometric Disadvantage vs Demographic Updates\nDistrict-wise (Age 5–17)',
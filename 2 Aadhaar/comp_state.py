@@ -5,11 +5,8 @@
 
 import sys
 import os
-import glob
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import re
 
 # ---------- UTF-8 FIX ----------
 try:
@@ -24,17 +21,10 @@ print("\n========== STATE-WISE SCRIPT STARTED ==========")
 # ============================================
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "biometric_data")
+sys.path.insert(0, os.path.join(BASE_DIR, os.pardir, "Aadhaar"))
+from ingest import load_source, normalize_states
 
-files = glob.glob(os.path.join(DATA_DIR, "*.xlsx"))
-
-if not files:
-    raise FileNotFoundError("❌ No Excel files found")
-
-df = pd.concat(
-    (pd.read_excel(f) for f in files),
-    ignore_index=True
-)
+df = load_source('biometric', data_dir=BASE_DIR)
 
 print("✔ Data Loaded:", df.shape)
 
@@ -48,13 +38,10 @@ df.rename(columns={
 }, inplace=True)
 
 # ============================================
-# 3. FILTER INVALID ROWS
+# 3. ZERO DIVISION GUARD (bad rows already quarantined)
 # ============================================
 
-df = df[
-    (df['adult_updates'] > 0) &
-    (df['child_updates'] >= 0)
-]
+df = df[df['adult_updates'] > 0]
 
 # ============================================
 # 4. SAFE COMPLIANCE RATIO
@@ -68,30 +55,8 @@ df['child_compliance_ratio'] = (
 # 5. 🔥 BULLETPROOF STATE NORMALIZATION 🔥
 # ============================================
 
-def normalize_state(s):
-    s = str(s)
-    s = s.replace('\xa0', ' ')          # remove non-breaking spaces
-    s = re.sub(r'\s+', ' ', s)          # collapse multiple spaces
-    s = s.strip().lower()               # trim + lowercase
-    return s
-
-df['state'] = df['state'].apply(normalize_state)
-
-state_map = {
-    'west bengal': 'West Bengal',
-    'uttaranchal': 'Uttarakhand',
-    'orissa': 'Odisha',
-    'nct of delhi': 'Delhi',
-    'delhi nct': 'Delhi',
-    'dadra & nagar haveli': 'Dadra And Nagar Haveli And Daman And Diu',
-    'daman & diu': 'Dadra And Nagar Haveli And Daman And Diu',
-    'dadra and nagar haveli and daman and diu':
-        'Dadra And Nagar Haveli And Daman And Diu',
-    'jammu & kashmir': 'Jammu And Kashmir'
-}
-
-df['state'] = df['state'].replace(state_map)
-df['state'] = df['state'].str.title()
+# Shared with every consumer of state names (ingest.STATE_MAP)
+df['state'] = normalize_states(df['state'])
 
 print("✔ State Names Fully Normalized")
 
@@ -161,8 +126,6 @@ print("\n✅ FINAL GRAPH GENERATED — NO DUPLICATE STATES")
 
 import sys
 import os
-import glob
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
@@ -179,17 +142,17 @@ print("\n========== STATE-WISE SCRIPT STARTED ==========")
 # ============================================
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "biometric_data")
-
-files = glob.glob(os.path.join(DATA_DIR, "*.xlsx"))
+sys.path.insert(0, os.path.join(BASE_DIR, os.pardir, "Aadhaar"))
+from ingest import load_source, normalize_states
+from rollups import load_rollups
+from sketches import distinct_pincodes
+from bootstrap import bootstrap_ranks
 
-if not files:
-    raise FileNotFoundError("❌ No Excel files found in biometric_data folder")
+# Rank stability of the TOP 10: resample the PIN codes of every state this many
+# times (bootstrap.py). 0 = skip
+BOOTSTRAP_REPLICATES = 2000
 
-df = pd.concat(
-    (pd.read_excel(f) for f in files),
-    ignore_index=True
-)
+df = load_source('biometric', data_dir=BASE_DIR)
 
 print("✔ Data Loaded:", df.shape)
 
@@ -209,13 +172,10 @@ if missing:
     raise ValueError(f"❌ Missing columns: {missing}")
 
 # ============================================
-# 3. SANITY FILTER (NO ZERO / NEGATIVE DIVISION)
+# 3. ZERO DIVISION GUARD (bad rows already quarantined)
 # ============================================
 
-df = df[
-    (df['adult_updates'] > 0) &
-    (df['child_updates'] >= 0)
-]
+df = df[df['adult_updates'] > 0]
 
 # ============================================
 # 4. SAFE COMPLIANCE RATIO
@@ -231,45 +191,7 @@ print("✔ Compliance Ratio Calculated")
 # 5. STRONG STATE NAME NORMALIZATION (FINAL FIX)
 # ============================================
 
-df['state'] = (
-    df['state']
-    .astype(str)
-    .str.strip()
-    .str.lower()
-)
-
-state_map = {
-    # West Bengal
-    'west bengal': 'West Bengal',
-    'westbengal': 'West Bengal',
-    'west bangal': 'West Bengal',
-
-    # Uttarakhand
-    'uttaranchal': 'Uttarakhand',
-    'uttarakhand': 'Uttarakhand',
-
-    # Odisha
-    'orissa': 'Odisha',
-    'odisha': 'Odisha',
-
-    # Dadra & Daman
-    'dadra & nagar haveli': 'Dadra And Nagar Haveli And Daman And Diu',
-    'daman & diu': 'Dadra And Nagar Haveli And Daman And Diu',
-    'dadra and nagar haveli and daman and diu':
-        'Dadra And Nagar Haveli And Daman And Diu',
-
-    # Delhi
-    'nct of delhi': 'Delhi',
-    'delhi nct': 'Delhi',
-    'delhi': 'Delhi',
-
-    # Jammu & Kashmir
-    'jammu & kashmir': 'Jammu And Kashmir',
-    'jammu and kashmir': 'Jammu And Kashmir'
-}
-
-df['state'] = df['state'].replace(state_map)
-df['state'] = df['state'].str.title()
+df['state'] = normalize_states(df['state'])
 
 print("✔ State Names Normalized")
 
@@ -279,10 +201,16 @@ print("✔ State Names Normalized")
 
 state_summary = (
     df.groupby('state', as_index=False)
-      .agg(
-          avg_child_compliance=('child_compliance_ratio', 'mean'),
-          total_pincodes=('adult_updates', 'count')
-      )
+      .agg(avg_child_compliance=('child_compliance_ratio', 'mean'))
+)
+
+# Distinct PIN codes per state (the old row count overstated it): merge the
+# per-district HyperLogLog sketches under the same normalized state names
+bio_sketch = load_rollups(BASE_DIR)['hll']['biometric']
+sketch_states = normalize_states(bio_sketch['index']['state'])
+pin_counts = distinct_pincodes(bio_sketch, by=sketch_states.to_numpy())
+state_summary['total_pincodes'] = (
+    state_summary['state'].map(pin_counts).fillna(0).round().astype(int)
 )
 
 # Lowest ratio = highest disadvantage
@@ -295,6 +223,23 @@ top_problem_states = (
 print("\nTOP LOW COMPLIANCE STATES")
 print(top_problem_states)
 
+if BOOTSTRAP_REPLICATES:
+    # Same mean ratio per state, re-ranked on PIN codes resampled within each state
+    rank_ci = bootstrap_ranks(
+        df,
+        'state',
+        ['child_compliance_ratio'],
+        lambda s: s['child_compliance_ratio'] / s['rows'],
+        ascending=True,
+        top=10,
+        replicates=BOOTSTRAP_REPLICATES
+    )
+    top_problem_states = top_problem_states.merge(
+        rank_ci[['state', 'rank', 'rank_ci_low', 'rank_ci_high', 'p_top']], on='state', how='left'
+    )
+    print(f"\nRANK STABILITY ({BOOTSTRAP_REPLICATES} bootstrap resamples of PIN codes, p_top = P(in top 10))")
+    print(top_problem_states[['state', 'rank', 'rank_ci_low', 'rank_ci_high', 'p_top']].to_string(index=False))
+
 # ============================================
 # 7. VISUALIZATION (CLEAR & UNAMBIGUOUS)
 # ============================================
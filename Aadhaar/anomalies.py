@@ -0,0 +1,171 @@
+"""Goal: One combined anomaly ranking of every PIN code across ALL measures of all three sources.
+
+Each analysis script looks at one or two columns. Here every PIN code gets one feature row
+built from the rollups (volume, month-to-month volatility and peak share of every measure,
+plus the cross-source ratios) and a scikit-learn IsolationForest ranks the PINs that are
+unusual in ANY combination of them.
+- The forest is fitted with n_jobs=-1 and pickled to Output/anomalies/model.pkl.
+- When new months arrive the model is warm-refitted: WARM_TREES trees trained on the new
+  feature rows (PIN codes that are new or whose features changed since the saved model)
+  are added to the existing forest instead of starting over (a full refit happens once the
+  forest reaches MAX_TREES, or when the feature layout changes).
+- Scoring runs in SCORE_CHUNK-row chunks in parallel, so memory stays flat at national scale.
+The ranked table is written to Output/anomalies/pincode_anomalies.csv.
+
+Usage: python anomalies.py (from the folder holding the data folders)"""
+
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import IsolationForest
+from ingest import OUTPUT_DIR
+from rollups import load_rollups, MEASURES, ROW_COUNTS
+
+N_TREES = 200          # trees of a fresh fit
+WARM_TREES = 50        # trees added per warm refit
+MAX_TREES = 500        # refit from scratch past this size
+SCORE_CHUNK = 50000    # PIN rows scored per chunk
+TOP_N = 20
+RANDOM_STATE = 42
+MODEL_VERSION = 2      # bump when the feature layout changes
+
+
+def anomaly_dir(data_dir='.'):
+    return os.path.join(data_dir, OUTPUT_DIR, 'anomalies')
+
+
+# --- 1. FEATURES ---
+
+def _safe_ratio(num, den):
+    return np.divide(num, den, out=np.zeros_like(num, dtype=float), where=den > 0)
+
+
+def feature_matrix(daily):
+    """
+    One row per PIN code. For every measure: log volume, coefficient of variation across
+    months and share of the busiest month; plus row counts per source and the ratios the
+    single-measure analyses use (child compliance, bio vs demo, migration).
+    Returns (features DataFrame indexed by pincode, pincode -> (state, district) table).
+    """
+    month = daily['date'].dt.to_period('M')
+    monthly = daily.groupby([daily['pincode'], month])[MEASURES].sum()
+    cube = monthly.unstack(fill_value=0)                       # pins x (measure, month)
+    pins = cube.index
+    values = cube.to_numpy(dtype=float).reshape(len(pins), len(MEASURES), -1)   # pins x measures x months
+
+    total = values.sum(axis=2)
+    mean = values.mean(axis=2)
+    features = {}
+    for i, m in enumerate(MEASURES):
+        features[f'{m}_log_total'] = np.log1p(total[:, i])
+        features[f'{m}_cv'] = _safe_ratio(values[:, i].std(axis=1), mean[:, i])
+        features[f'{m}_peak_share'] = _safe_ratio(values[:, i].max(axis=1), total[:, i])
+
+    counts = daily.groupby('pincode')[ROW_COUNTS].sum().reindex(pins)
+    for col in ROW_COUNTS:
+        features[f'{col}_log'] = np.log1p(counts[col].to_numpy(dtype=float))
+
+    by_name = dict(zip(MEASURES, total.T))
+    features['child_compliance_ratio'] = _safe_ratio(by_name['bio_age_5_17'], by_name['bio_age_17_'])
+    features['bio_demo_ratio'] = _safe_ratio(by_name['bio_age_5_17'], by_name['demo_age_5_17'])
+    features['migration_ratio'] = by_name['demo_age_17_'] / (by_name['age_18_greater'] + 1)
+
+    areas = daily.groupby('pincode')[['state', 'district']].first().reindex(pins)
+    return pd.DataFrame(features, index=pins), areas
+
+
+# --- 2. MODEL ---
+
+def fit_forest(X, model=None, fresh=None):
+    """
+    Fresh fit on X, or a warm refit that adds WARM_TREES trees to `model`, trained on the
+    rows of X flagged in `fresh` (new or changed PIN codes). When fewer rows changed than
+    the forest's subsample size, unchanged rows are drawn at random to fill it, so every
+    tree is grown on samples of the same size (the score normalization assumes that).
+    Returns (model, 'fresh' | 'warm').
+    """
+    if model is not None and model.n_estimators + WARM_TREES <= MAX_TREES:
+        rows = np.flatnonzero(fresh)
+        rest = np.flatnonzero(~fresh)
+        fill = min(max(model.max_samples_ - len(rows), 0), len(rest))
+        rows = np.concatenate([rows, np.random.default_rng(RANDOM_STATE).choice(rest, fill, replace=False)])
+        model.set_params(n_estimators=model.n_estimators + WARM_TREES, warm_start=True)
+        return model.fit(X[np.sort(rows)]), 'warm'
+    model = IsolationForest(n_estimators=N_TREES, n_jobs=-1, random_state=RANDOM_STATE, warm_start=True)
+    return model.fit(X), 'fresh'
+
+
+def score_chunks(model, X, chunk=SCORE_CHUNK):
+    """Anomaly score per row (higher = more unusual), chunks scored in parallel threads."""
+    parts = Parallel(n_jobs=-1, prefer='threads')(
+        delayed(model.score_samples)(X[start:start + chunk]) for start in range(0, len(X), chunk))
+    return -np.concatenate(parts) if parts else np.empty(0)
+
+
+def load_model(data_dir='.', rollups=None, features=None, refit=False):
+    """
+    The pickled forest for the current rollups: reused as-is if the workbooks (or at
+    least the feature rows) are unchanged, warm-refitted on the changed rows when they
+    changed (e.g. a new month), fitted fresh when there is no usable model.
+    """
+    path = os.path.join(anomaly_dir(data_dir), 'model.pkl')
+    # One hash per feature row: which PIN codes are new or changed since the saved model
+    row_hashes = pd.util.hash_pandas_object(features, index=True)
+    saved = None
+    if not refit and os.path.exists(path):
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if saved.get('version') != MODEL_VERSION or saved['features'] != list(features.columns):
+            saved = None
+        elif saved['manifest'] == rollups['manifest']:
+            return saved['model']
+
+    fresh = None
+    if saved:
+        fresh = (row_hashes != saved['rows'].reindex(row_hashes.index, fill_value=0)).to_numpy()
+    if saved and not fresh.any():
+        model, mode = saved['model'], 'reused'   # only the manifest changed
+    else:
+        model, mode = fit_forest(features.to_numpy(), saved['model'] if saved else None, fresh)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump({'version': MODEL_VERSION, 'manifest': rollups['manifest'], 'features': list(features.columns),
+                     'rows': row_hashes, 'model': model}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"✔ Anomaly model: {mode if mode == 'reused' else mode + ' fit'}, {model.n_estimators} trees on {len(features)} PIN codes "
+          f"({len(features) if fresh is None else int(fresh.sum())} new or changed)")
+    return model
+
+
+# --- 3. RANKING ---
+
+def anomaly_table(data_dir='.', refit=False):
+    """Every PIN code ranked by anomaly score, with the feature that deviates most."""
+    rollups = load_rollups(data_dir)
+    features, areas = feature_matrix(rollups['daily'])
+    model = load_model(data_dir, rollups, features, refit)
+
+    X = features.to_numpy()
+    # Robust z-score per feature: which measure makes the PIN stand out
+    median = np.median(X, axis=0)
+    spread = np.subtract(*np.percentile(X, [75, 25], axis=0))
+    z = np.abs(X - median) / np.where(spread > 0, spread, 1)
+
+    table = areas.reset_index()
+    table['anomaly_score'] = score_chunks(model, X)
+    table['top_feature'] = features.columns[z.argmax(axis=1)]
+    table['top_feature_value'] = X[np.arange(len(X)), z.argmax(axis=1)].round(3)
+    table = table.sort_values('anomaly_score', ascending=False, ignore_index=True)
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+
+    out = os.path.join(anomaly_dir(data_dir), 'pincode_anomalies.csv')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    table.to_csv(out, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    ranked = anomaly_table()
+    print(f"--- TOP {TOP_N} ANOMALOUS PIN CODES (all measures, all sources) ---")
+    print(ranked.head(TOP_N).to_string(index=False))
@@ -1,43 +1,45 @@
 """Goal: Identify areas with failing fingerprint sensors by looking for high voluntary adult biometric updates (bio_age_17_)."""
 
 
-import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
+from specs import SPECS, run_spec
+from cache import AnalysisCache
 
-# --- 1. LOAD BIOMETRIC DATA ---
-files = glob.glob('biometric_data/*.xlsx')
-df_list = []
+TOP_N = 10
+START, END = None, None  # date window to rank over, e.g. '2025-03-15', '2025-06-30' (None = open)
 
-for file in files:
-    # We focus on ADULT biometric updates (Age 17+)
-    temp = pd.read_excel(file, usecols=['state', 'district', 'bio_age_17_'])
-    df_list.append(temp)
 
-df_bio = pd.concat(df_list)
+def compute():
+    # --- 1 & 2. ADULT BIOMETRIC UPDATES (Age 17+) PER DISTRICT FOR THE WINDOW ---
+    # (spec 'biometric_friction' in specs.py: window totals over the rollup daily rows,
+    # grouped by District - district level is better for hardware procurement)
+    # -> the "Most Frustrated" Districts
+    spec = dict(SPECS['biometric_friction'], top=TOP_N, window=(START, END))
+    return {'top_friction': run_spec(spec)}
 
-# --- 2. AGGREGATE ---
-# Group by District (District level is better for hardware procurement)
-friction_districts = df_bio.groupby(['state', 'district'])['bio_age_17_'].sum().reset_index()
 
-# Sort to find the "Most Frustrated" Districts
-top_friction = friction_districts.sort_values(by='bio_age_17_', ascending=False).head(10)
+# Unchanged data + code + parameters -> results straight from Output/cache
+cache = AnalysisCache('biometric_friction', {'top_n': TOP_N, 'start': START, 'end': END}, __file__)
+top_friction = cache.tables(compute)['top_friction']
 
 # --- 3. VISUALIZATION ---
-plt.figure(figsize=(12, 6))
+# (a cache hit shows the stored PNG instead of re-rendering)
+if not cache.show_figure():
+    plt.figure(figsize=(12, 6))
 
-# Heatmap-style Bar Chart
-sns.barplot(data=top_friction, x='bio_age_17_', y='district', palette='magma')
+    # Heatmap-style Bar Chart
+    sns.barplot(data=top_friction, x='bio_age_17_', y='district', palette='magma')
 
-plt.title('The "Biometric Friction" Indicator: Districts with High Adult Biometric Updates', fontsize=16)
-plt.xlabel('Number of Voluntary Adult Updates (Likely Authentication Failures)', fontsize=12)
-plt.ylabel('District', fontsize=12)
-plt.grid(axis='x', linestyle='--', alpha=0.6)
+    plt.title('The "Biometric Friction" Indicator: Districts with High Adult Biometric Updates', fontsize=16)
+    plt.xlabel('Number of Voluntary Adult Updates (Likely Authentication Failures)', fontsize=12)
+    plt.ylabel('District', fontsize=12)
+    plt.grid(axis='x', linestyle='--', alpha=0.6)
 
-# Add Recommendation Text
-plt.figtext(0.5, -0.05, "Recommendation: Prioritize these districts for Iris Scanners/Face Auth devices.", 
-            ha="center", fontsize=11, fontweight='bold', color='darkred')
+    # Add Recommendation Text
+    plt.figtext(0.5, -0.05, "Recommendation: Prioritize these districts for Iris Scanners/Face Auth devices.", 
+                ha="center", fontsize=11, fontweight='bold', color='darkred')
 
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+    plt.tight_layout()
+    cache.save_figure()
+    plt.show()
\ No newline at end of file
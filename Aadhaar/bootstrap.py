@@ -0,0 +1,81 @@
+"""Goal: How sure is a "TOP 10"? Rank confidence intervals for district / state rankings.
+
+Many districts have only a handful of PIN codes, so a district mean can move a lot when one
+PIN code is left out. bootstrap_ranks() resamples the PIN codes within every group (with
+replacement, the same number as observed) BOOTSTRAP_REPLICATES times and re-ranks the groups
+each time. Reported per group: the observed rank, the rank interval at RANK_CONFIDENCE and
+the probability of making the top N.
+
+No groupby in the loop: rows are summed once per (group, PIN code), PIN codes are laid out
+group after group, and a replicate is one row of an index matrix - position j draws from
+the range of j's own group - so the group sums of a whole block of replicates are one
+fancy-index plus one np.add.reduceat. Blocks run in parallel on BOOTSTRAP_WORKERS
+processes with independent seeds (same result for any worker count)."""
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+BOOTSTRAP_REPLICATES = 2000
+RANK_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 42
+BOOTSTRAP_WORKERS = -1          # processes (-1 = all cores)
+BLOCK_CELLS = 4_000_000         # index-matrix cells per block (replicates x PIN codes)
+
+
+def _block_sums(values, offsets, sizes, replicates, seed):
+    """(columns x replicates x groups) group sums of one block of resamples."""
+    rng = np.random.default_rng(seed)
+    start = np.repeat(offsets, sizes)
+    size = np.repeat(sizes, sizes)
+    idx = start + (rng.random((replicates, len(start))) * size).astype(np.int64)
+    return np.add.reduceat(values[:, idx], offsets, axis=2)
+
+
+def _ranks(scores, ascending):
+    """1-based rank of every group in every row (NaN scores last, ties by position)."""
+    keyed = np.where(np.isnan(scores), np.inf, scores if ascending else -scores)
+    order = np.argsort(keyed, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1), axis=1)
+    return ranks
+
+
+def bootstrap_ranks(rows, by, columns, score, ascending=False, top=10,
+                    replicates=BOOTSTRAP_REPLICATES, confidence=RANK_CONFIDENCE, seed=BOOTSTRAP_SEED):
+    """
+    rows: one row per record, with the `by` keys, 'pincode' and the `columns` to sum.
+    score: function of {column: group sums} (plus 'rows': record counts) -> group score;
+    it receives (groups,) arrays for the observed data and (replicates x groups) arrays
+    for the resamples. Returns one row per group: the `by` keys, score, rank,
+    rank_ci_low, rank_ci_high and p_top (share of replicates ranked <= top), by rank.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    pins = rows.groupby(by + ['pincode'], observed=True)[columns].sum()
+    pins['rows'] = rows.groupby(by + ['pincode'], observed=True).size()
+    names = list(columns) + ['rows']
+    values = pins[names].to_numpy(dtype=float).T                           # columns x PIN codes
+
+    groups = pins.index.droplevel('pincode')
+    sizes = pd.Series(1, index=groups).groupby(level=list(range(len(by)))).size().to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    keys = groups.unique()
+
+    observed = score(dict(zip(names, np.add.reduceat(values, offsets, axis=1))))
+    per_block = max(1, BLOCK_CELLS // values.shape[1])
+    blocks = [min(per_block, replicates - b) for b in range(0, replicates, per_block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    sums = np.concatenate(Parallel(n_jobs=BOOTSTRAP_WORKERS)(
+        delayed(_block_sums)(values, offsets, sizes, n, s) for n, s in zip(blocks, seeds)), axis=1)
+    ranks = _ranks(score(dict(zip(names, sums))), ascending)
+
+    tail = (1 - confidence) / 2
+    table = pd.DataFrame({
+        'score': observed,
+        'rank': _ranks(observed[None, :], ascending)[0],
+        'rank_ci_low': np.floor(np.quantile(ranks, tail, axis=0)).astype(int),
+        'rank_ci_high': np.ceil(np.quantile(ranks, 1 - tail, axis=0)).astype(int),
+        'p_top': (ranks <= top).mean(axis=0),
+    }, index=keys)
+    table.index.names = by
+    return table.sort_values('rank').reset_index()
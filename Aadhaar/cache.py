@@ -0,0 +1,138 @@
+"""Goal: Don't redo an analysis on unchanged data. Results are memoized under a content-addressed key.
+
+key = sha256(analysis name + parameters + input manifest + code of the analysis and the shared
+pipeline modules). A hit returns the stored tables (and the rendered figure) instantly; any
+change to the workbooks, the script or its parameters produces a new key. Entries live in
+Output/cache/<key>/ and the least recently used ones are evicted once the cache grows past
+CACHE_MAX_BYTES or CACHE_MAX_ENTRIES.
+Every run also exports the tables to Output/<name>_<table>.csv and the figure to Output/<name>.png."""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import pandas as pd
+import matplotlib.pyplot as plt
+from ingest import OUTPUT_DIR
+from rollups import data_manifest
+
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+CACHE_MAX_ENTRIES = 200
+
+# Shared modules whose code changes results of every analysis
+PIPELINE_MODULES = ['ingest.py', 'readers.py', 'rollups.py', 'sketches.py', 'cohorts.py', 'forecast.py', 'similarity.py',
+                    'timeindex.py', 'specs.py', 'pyramid.py', 'spacetime.py']
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def code_version(code_file):
+    """Digest of the analysis script plus the shared pipeline modules."""
+    files = [code_file] + [os.path.join(MODULE_DIR, m) for m in PIPELINE_MODULES]
+    return [_file_digest(f) for f in files]
+
+
+class AnalysisCache:
+    """
+    Cache entry of one analysis run.
+
+        cache = AnalysisCache('biometric_friction', {'top_n': 10}, __file__)
+        tables = cache.tables(compute)      # compute() -> {'name': DataFrame}
+        if not cache.show_figure():
+            ...plot...
+            cache.save_figure()
+            plt.show()
+    """
+
+    def __init__(self, name, params, code_file, data_dir='.', inputs=()):
+        """inputs: extra files the analysis reads besides the workbooks (e.g. hospital locations)."""
+        self.name = name
+        self.output_dir = os.path.join(data_dir, OUTPUT_DIR)
+        self.cache_dir = os.path.join(self.output_dir, 'cache')
+
+        payload = {
+            'name': name,
+            'params': params,
+            'manifest': sorted(data_manifest(data_dir).items()),
+            'inputs': [(f, os.path.getsize(f), os.path.getmtime(f)) for f in inputs],
+            'code': code_version(code_file),
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+        self.key = hashlib.sha256(encoded).hexdigest()[:32]
+        self.path = os.path.join(self.cache_dir, self.key)
+
+    # --- TABLES ---
+
+    def tables(self, compute):
+        """compute()'s tables from the cache, or computed, stored and returned."""
+        done = os.path.join(self.path, 'tables.json')
+        if os.path.exists(done):
+            with open(done) as f:
+                names = json.load(f)
+            self._touch()
+            print(f"✔ {self.name}: cache hit ({self.key[:8]})")
+            return {n: pd.read_pickle(os.path.join(self.path, f'{n}.pkl')) for n in names}
+
+        tables = compute()
+        os.makedirs(self.path, exist_ok=True)
+        for n, table in tables.items():
+            table.to_pickle(os.path.join(self.path, f'{n}.pkl'))
+            table.to_csv(os.path.join(self.output_dir, f'{self.name}_{n}.csv'), index=False)
+        # Written last: marks the entry complete
+        with open(done, 'w') as f:
+            json.dump(list(tables), f)
+        self._touch()
+        evict(self.cache_dir, keep=self.key)
+        return tables
+
+    # --- FIGURE ---
+
+    def show_figure(self):
+        """Shows the cached PNG and returns True, or returns False if none was stored."""
+        png = os.path.join(self.path, 'figure.png')
+        if not os.path.exists(png):
+            return False
+        image = plt.imread(png)
+        plt.figure(figsize=(image.shape[1] / 100, image.shape[0] / 100))
+        plt.imshow(image)
+        plt.axis('off')
+        plt.tight_layout(pad=0)
+        plt.show()
+        return True
+
+    def save_figure(self, fig=None):
+        """Stores the current figure in the entry and exports it to Output/<name>.png."""
+        fig = fig or plt.gcf()
+        os.makedirs(self.path, exist_ok=True)
+        fig.savefig(os.path.join(self.path, 'figure.png'), dpi=100, bbox_inches='tight')
+        shutil.copyfile(os.path.join(self.path, 'figure.png'), os.path.join(self.output_dir, f'{self.name}.png'))
+
+    def _touch(self):
+        now = time.time()
+        os.utime(self.path, (now, now))
+
+
+def evict(cache_dir, keep=None):
+    """Deletes least recently used entries until the cache fits both limits."""
+    entries = []
+    for key in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, key)
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        entries.append((os.path.getmtime(path), size, key, path))
+
+    entries.sort()   # oldest use first
+    total = sum(e[1] for e in entries)
+    count = len(entries)
+    for _, size, key, path in entries:
+        if total <= CACHE_MAX_BYTES and count <= CACHE_MAX_ENTRIES:
+            break
+        if key == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        count -= 1
@@ -0,0 +1,103 @@
+"""Goal: Cohort joins across years as aligned array lookups instead of re-loading old workbooks.
+
+The rollups keep a (district x year x measure) cube of yearly totals. A cohort question like
+"children enrolled at age 0-5 in Y-5 vs biometric updates in Y" is then values[:, Y-5] next
+to values[:, Y] for every district and every year Y at once; any lag (5 for the age-5
+update, 15 for the age-15 update) or year range is just a different offset into the same
+array. Years missing from the data are NaN, so a lag that reaches before the archive
+starts shows up as such instead of silently comparing the wrong years."""
+
+import numpy as np
+import pandas as pd
+
+COHORT_GROUP = ['state', 'district']
+COHORT_MEASURES = ['age_0_5', 'age_5_17', 'age_18_greater', 'bio_age_5_17', 'bio_age_17_',
+                   'n_enrolment', 'n_biometric']
+
+
+def build_cohorts(daily):
+    """
+    Yearly totals per (state, district) over one continuous year range, from one groupby.
+    Returns {'index': DataFrame of districts, 'years': array, 'measures': list,
+    'values': (districts x years x measures) int64 array}.
+    """
+    year = daily['date'].dt.year.to_numpy()
+    years = np.arange(year.min(), year.max() + 1) if len(year) else np.empty(0, dtype=int)
+    district_ids, districts = pd.factorize(pd.MultiIndex.from_frame(daily[COHORT_GROUP]), sort=True)
+
+    values = np.zeros((len(districts), len(years), len(COHORT_MEASURES)), dtype=np.int64)
+    np.add.at(values, (district_ids, year - years[0] if len(years) else year),
+              daily[COHORT_MEASURES].to_numpy(dtype=np.int64))
+    return {
+        'index': districts.to_frame(index=False, name=COHORT_GROUP),
+        'years': years,
+        'measures': list(COHORT_MEASURES),
+        'values': values,
+    }
+
+
+def merge_cohorts(a, b):
+    """Combines two cubes (e.g. of different PIN-code shards) over the union of districts and years."""
+    years = np.concatenate([a['years'], b['years']])
+    years = np.arange(years.min(), years.max() + 1) if len(years) else years
+    index = pd.concat([a['index'], b['index']], ignore_index=True)
+    district_ids, districts = pd.factorize(pd.MultiIndex.from_frame(index), sort=True)
+
+    values = np.zeros((len(districts), len(years), len(COHORT_MEASURES)), dtype=np.int64)
+    for cube, ids in [(a, district_ids[:len(a['index'])]), (b, district_ids[len(a['index']):])]:
+        if len(cube['years']):
+            offset = cube['years'][0] - years[0]
+            values[ids, offset:offset + len(cube['years'])] += cube['values']
+    return {
+        'index': districts.to_frame(index=False, name=COHORT_GROUP),
+        'years': years,
+        'measures': list(COHORT_MEASURES),
+        'values': values,
+    }
+
+
+def cohort_lookup(cohorts, measure, years=None, lag=0):
+    """
+    (districts x len(years)) totals of `measure` in year Y - lag for every requested Y
+    (default: every year in the cube). NaN where Y - lag is outside the archive.
+    """
+    all_years = cohorts['years']
+    years = all_years if years is None else np.asarray(years)
+    source = years - lag - (all_years[0] if len(all_years) else 0)
+    inside = (source >= 0) & (source < len(all_years))
+
+    column = cohorts['values'][:, :, cohorts['measures'].index(measure)]
+    out = np.full((column.shape[0], len(years)), np.nan)
+    out[:, inside] = column[:, source[inside]]
+    return out
+
+
+def cohort_table(cohorts, base, target, lags, years=None):
+    """
+    Long table of every (district, year, lag) cohort join: `base` counted in Y - lag next to
+    `target` counted in Y. Districts are kept only where the base year has enrolment rows
+    and the target year has biometric rows (the old inner-merge semantics).
+    """
+    years = cohorts['years'] if years is None else np.asarray(years)
+    index = cohorts['index']
+    target_values = cohort_lookup(cohorts, target, years)
+    bio_rows = cohort_lookup(cohorts, 'n_biometric', years)
+
+    frames = []
+    for lag in lags:
+        base_values = cohort_lookup(cohorts, base, years, lag)
+        enrol_rows = cohort_lookup(cohorts, 'n_enrolment', years, lag)
+        frame = pd.DataFrame({
+            **{col: np.repeat(index[col].to_numpy(), len(years)) for col in COHORT_GROUP},
+            'year': np.tile(years, len(index)),
+            'lag': lag,
+            'base_year': np.tile(years - lag, len(index)),
+            base: base_values.ravel(),
+            target: target_values.ravel(),
+            'base_present': (enrol_rows > 0).ravel(),
+            'target_present': (bio_rows > 0).ravel(),
+        })
+        frames.append(frame)
+    table = pd.concat(frames, ignore_index=True)
+    table = table[table['base_present'] & table['target_present']].drop(columns=['base_present', 'target_present'])
+    return table.astype({base: 'int64', target: 'int64'}).reset_index(drop=True)
@@ -0,0 +1,237 @@
+"""Goal: Build the ASISI / compliance dashboard as a static HTML page from the rollups.
+
+Output/dashboard/index.html only carries the state list and national totals. Each state's
+payload (district rankings, monthly series, ASISI scores) is a small file in
+Output/dashboard/states/ that the page loads on demand when the state is selected. Payloads
+are .js files (JSONP-style) rather than .json, because browsers block fetch() on file:// pages;
+this way the folder opens instantly straight from a file share, no web server and no raw data.
+
+Usage: python dashboard.py (from the folder holding the data folders)"""
+
+import os
+import re
+import sys
+import json
+from ingest import OUTPUT_DIR, normalize_states
+from rollups import load_rollups, MEASURES
+
+DISTRICT_MEASURES = ['age_0_5', 'age_18_greater', 'demo_age_17_', 'bio_age_5_17', 'bio_age_17_']
+
+
+def slug(name):
+    return re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-')
+
+
+def payload_files(states):
+    """{state: states/<slug>.js}, with -2, -3... where two names share a slug."""
+    files, used = {}, set()
+    for state in states:
+        name, n = slug(state) or 'state', 1
+        while name in used:
+            n += 1
+            name = f'{slug(state) or "state"}-{n}'
+        used.add(name)
+        files[state] = f'states/{name}.js'
+    return files
+
+
+def _ratio(num, den):
+    return (num / den.where(den > 0)).round(4)
+
+
+# --- 1. PAYLOADS (all states in one groupby pass each) ---
+
+def district_rankings(daily):
+    """Per-district totals + compliance ratios, grouped by state."""
+    table = daily.groupby(['state', 'district'], as_index=False).agg(
+        pincodes=('pincode', 'nunique'),
+        **{m: (m, 'sum') for m in MEASURES},
+    )
+    table['child_compliance_ratio'] = _ratio(table['bio_age_5_17'], table['bio_age_17_'])
+    table['bio_demo_ratio'] = _ratio(table['bio_age_5_17'], table['demo_age_5_17'])
+    table['migration_ratio'] = _ratio(table['demo_age_17_'], table['age_18_greater'] + 1)
+    return table
+
+
+def monthly_series(daily):
+    """Per-state monthly totals of every measure."""
+    monthly = daily.assign(month=daily['date'].dt.to_period('M').astype(str))
+    return monthly.groupby(['state', 'month'], as_index=False)[MEASURES].sum()
+
+
+def asisi_scores():
+    """ASISI district scores from hola/asisi.py, or None if it cannot run here."""
+    hola_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'hola')
+    sys.path.insert(0, hola_dir)
+    try:
+        from asisi import run_asisi_analysis
+        scores = run_asisi_analysis()
+    except Exception as exc:   # optional section - the dashboard still builds without it
+        print(f"ASISI scores skipped: {exc}")
+        return None
+    scores = scores[['State name', 'District name', 'ASISI_Score', 'Status']].copy()
+    scores['state_key'] = normalize_states(scores['State name']).str.lower().to_numpy()
+    scores['ASISI_Score'] = scores['ASISI_Score'].round(3)
+    return scores
+
+
+def build_payloads(rollups, asisi=None):
+    """Returns (index payload, {state: state payload}); the index maps each state to its payload file."""
+    # One entry per state, whatever its spelling in the workbooks
+    daily = rollups['daily'].assign(state=lambda d: normalize_states(d['state']).to_numpy())
+    districts = district_rankings(daily)
+    monthly = monthly_series(daily)
+
+    payloads = {}
+    for state, table in districts.groupby('state'):
+        series = monthly[monthly['state'] == state]
+        payload = {
+            'state': state,
+            # NaN ratios -> null
+            'districts': table.drop(columns='state').astype(object).where(table.notna(), None).to_dict(orient='list'),
+            'monthly': {'months': series['month'].tolist(),
+                        **{m: series[m].tolist() for m in DISTRICT_MEASURES}},
+            'asisi': [],
+        }
+        if asisi is not None:
+            rows = asisi[asisi['state_key'] == str(state).lower().strip()]
+            payload['asisi'] = rows[['District name', 'ASISI_Score', 'Status']].to_dict(orient='records')
+        payloads[state] = payload
+
+    totals = districts.groupby('state')[DISTRICT_MEASURES].sum()
+    files = payload_files(totals.index)
+    index = {
+        'states': [{'name': s, 'file': files[s], 'districts': int((districts['state'] == s).sum()),
+                    **{m: int(totals.loc[s, m]) for m in DISTRICT_MEASURES}} for s in totals.index],
+        'measures': DISTRICT_MEASURES,
+        'period': [str(daily['date'].min().date()), str(daily['date'].max().date())],
+    }
+    return index, payloads
+
+
+# --- 2. WRITE ---
+
+def write_dashboard(index, payloads, out_dir):
+    os.makedirs(os.path.join(out_dir, 'states'), exist_ok=True)
+    for entry in index['states']:
+        payload = payloads[entry['name']]
+        with open(os.path.join(out_dir, *entry['file'].split('/')), 'w', encoding='utf-8') as f:
+            f.write('dashboardLoaded(' + json.dumps(payload, separators=(',', ':'), default=_json_default) + ');\n')
+
+    # '</' escaped so no name can close the inline <script>
+    html = PAGE.replace('/*INDEX*/null', json.dumps(index, separators=(',', ':')).replace('</', '<\\/'))
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def _json_default(value):
+    # numpy scalars -> Python numbers
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def build_dashboard(data_dir='.'):
+    index, payloads = build_payloads(load_rollups(data_dir), asisi_scores())
+    out_dir = os.path.join(data_dir, OUTPUT_DIR, 'dashboard')
+    write_dashboard(index, payloads, out_dir)
+    print(f"✔ Dashboard: {os.path.join(out_dir, 'index.html')} ({len(payloads)} states)")
+    return out_dir
+
+
+# --- 3. PAGE TEMPLATE (no external libraries) ---
+PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>Aadhaar Analytics Dashboard</title>
+<style>
+body{font-family:Segoe UI,Arial,sans-serif;margin:0;background:#f4f6f8;color:#222}
+header{background:#1f3b57;color:#fff;padding:14px 24px}header h1{margin:0;font-size:20px}
+main{padding:16px 24px}section{background:#fff;border-radius:6px;padding:12px 16px;margin-bottom:16px;box-shadow:0 1px 3px #0002}
+table{border-collapse:collapse;width:100%;font-size:13px}th,td{padding:4px 8px;border-bottom:1px solid #eee;text-align:right}
+th:first-child,td:first-child{text-align:left}th{cursor:pointer;background:#fafafa;position:sticky;top:0}
+.RED{color:#c0392b;font-weight:bold}.YELLOW{color:#b7950b;font-weight:bold}.GREEN{color:#1e8449}
+select{font-size:14px;padding:4px}.muted{color:#777;font-size:12px}
+</style></head><body>
+<header><h1>Aadhaar Analytics Dashboard</h1><div class="muted" id="period" style="color:#cfd8e3"></div></header>
+<main>
+<section><label>State: <select id="state"><option value="">-- select a state --</option></select></label>
+<span class="muted" id="status"></span></section>
+<section id="overview"><h3>National overview</h3><div id="overview-table"></div></section>
+<section id="detail" hidden><h3 id="detail-title"></h3>
+<div id="chart"></div><h4>ASISI scores</h4><div id="asisi"></div><h4>District ranking</h4><div id="districts"></div></section>
+</main>
+<script>
+var INDEX = /*INDEX*/null;
+var cache = {};
+var fmt = function(v){return v === null || v === undefined ? '-' : (typeof v === 'number' ? v.toLocaleString() : v);};
+// Names from the workbooks go into markup: escape them
+var esc = function(v){return String(v).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+  .replace(/"/g, '&quot;').replace(/'/g, '&#39;');};
+
+function table(columns, rows){
+  var html = '<table><tr>' + columns.map(function(c, i){return '<th data-i="'+i+'">'+esc(c)+'</th>';}).join('') + '</tr>';
+  rows.forEach(function(r){html += '<tr>' + r.map(function(v){return '<td>'+esc(fmt(v))+'</td>';}).join('') + '</tr>';});
+  return html + '</table>';
+}
+function sortable(el, columns, rows){
+  var desc = true;
+  el.innerHTML = table(columns, rows);
+  el.onclick = function(e){
+    if (e.target.tagName !== 'TH') return;
+    var i = +e.target.dataset.i; desc = !desc;
+    rows.sort(function(a, b){var x = a[i], y = b[i]; if (x === y) return 0; if (x === null) return 1; if (y === null) return -1;
+      return (x < y ? -1 : 1) * (desc ? -1 : 1);});
+    el.innerHTML = table(columns, rows);
+  };
+}
+function lineChart(months, series){
+  var w = 900, h = 220, pad = 40, colors = ['#1f77b4','#ff7f0e','#2ca02c','#d62728','#9467bd'];
+  var names = Object.keys(series), max = 1;
+  names.forEach(function(n){series[n].forEach(function(v){max = Math.max(max, v);});});
+  var x = function(i){return pad + i * (w - 2*pad) / Math.max(months.length - 1, 1);};
+  var y = function(v){return h - pad + 10 - v * (h - pad) / max;};
+  var svg = '<svg width="'+w+'" height="'+(h+20)+'">';
+  months.forEach(function(m, i){svg += '<text x="'+x(i)+'" y="'+(h+10)+'" font-size="10" text-anchor="middle">'+esc(m)+'</text>';});
+  names.forEach(function(n, k){
+    svg += '<polyline fill="none" stroke="'+colors[k % 5]+'" stroke-width="2" points="' +
+      series[n].map(function(v, i){return x(i)+','+y(v);}).join(' ') + '"/>';
+    svg += '<text x="'+(w - pad)+'" y="'+(14 + 14*k)+'" font-size="11" text-anchor="end" fill="'+colors[k % 5]+'">'+esc(n)+'</text>';
+  });
+  return svg + '</svg>';
+}
+function render(p){
+  document.getElementById('detail').hidden = false;
+  document.getElementById('detail-title').textContent = p.state;
+  var series = {}; INDEX.measures.forEach(function(m){series[m] = p.monthly[m];});
+  document.getElementById('chart').innerHTML = lineChart(p.monthly.months, series);
+  var asisi = document.getElementById('asisi');
+  if (p.asisi.length){
+    asisi.innerHTML = '<table><tr><th>District</th><th>ASISI score</th><th>Status</th></tr>' + p.asisi.map(function(r){
+      return '<tr><td>'+esc(r['District name'])+'</td><td>'+esc(r.ASISI_Score)+'</td><td class="'+esc(r.Status.split(' ')[0])+'">'+esc(r.Status)+'</td></tr>';}).join('') + '</table>';
+  } else { asisi.innerHTML = '<span class="muted">No ASISI scores for this state.</span>'; }
+  var cols = Object.keys(p.districts), n = p.districts[cols[0]].length, rows = [];
+  for (var i = 0; i < n; i++) rows.push(cols.map(function(c){return p.districts[c][i];}));
+  sortable(document.getElementById('districts'), cols, rows);
+}
+function dashboardLoaded(p){cache[p.state] = p; document.getElementById('status').textContent = ''; render(p);}
+function selectState(name){
+  if (!name) return;
+  if (cache[name]) return render(cache[name]);
+  var entry = INDEX.states.filter(function(s){return s.name === name;})[0];
+  document.getElementById('status').textContent = 'loading...';
+  var tag = document.createElement('script'); tag.src = entry.file; document.body.appendChild(tag);
+}
+(function(){
+  document.getElementById('period').textContent = 'Data period: ' + INDEX.period[0] + ' to ' + INDEX.period[1];
+  var select = document.getElementById('state');
+  INDEX.states.forEach(function(s){var o = document.createElement('option'); o.value = o.textContent = s.name; select.appendChild(o);});
+  select.onchange = function(){selectState(select.value);};
+  var cols = ['state', 'districts'].concat(INDEX.measures);
+  sortable(document.getElementById('overview-table'), cols, INDEX.states.map(function(s){
+    return [s.name, s.districts].concat(INDEX.measures.map(function(m){return s[m];}));}));
+})();
+</script></body></html>
+"""
+
+
+if __name__ == "__main__":
+    build_dashboard()
@@ -1,49 +1,52 @@
 """Goal: Distinguish between Family Zones (Kids updating) and Worker/Transient Zones (Adults updating)."""
 
 
-import pandas as pd
-import glob
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-
-# --- 1. LOAD DEMOGRAPHIC DATA (Adult Activity) ---
-demo_files = glob.glob('demographic_data/*.xlsx')
-df_demo_list = []
-for file in demo_files:
-    temp = pd.read_excel(file, usecols=['pincode', 'demo_age_17_'])
-    df_demo_list.append(temp)
-df_demo = pd.concat(df_demo_list).groupby('pincode')['demo_age_17_'].sum().reset_index()
-
-# --- 2. LOAD BIOMETRIC DATA (Child Activity) ---
-bio_files = glob.glob('biometric_data/*.xlsx')
-df_bio_list = []
-for file in bio_files:
-    temp = pd.read_excel(file, usecols=['pincode', 'bio_age_5_17'])
-    df_bio_list.append(temp)
-df_bio = pd.concat(df_bio_list).groupby('pincode')['bio_age_5_17'].sum().reset_index()
-
-# --- 3. MERGE & CALCULATE DRIFT SCORE ---
-merged_df = pd.merge(df_demo, df_bio, on='pincode', how='inner')
-
-# Formula: Drift Score = Adult Updates / (Child Updates + 1)
-# (+1 prevents division by zero if an area has 0 child updates)
-merged_df['drift_score'] = merged_df['demo_age_17_'] / (merged_df['bio_age_5_17'] + 1)
-
-# Filter: We only want significant PIN codes (e.g., at least 100 activities) to avoid noise
-merged_df = merged_df[merged_df['demo_age_17_'] > 100]
-
-# Get Top 10 "Transient/Worker Zones" (High Drift Score)
-transient_zones = merged_df.sort_values(by='drift_score', ascending=False).head(10)
-transient_zones['pincode'] = transient_zones['pincode'].astype(str)
+from matplotlib.colors import LogNorm
+from specs import SPECS, run_specs
+
+LEVEL = 6  # PIN prefix level: 6 = PIN code, 3 = sorting district, 2 = sub-zone, 1 = zone
+RENDER_MODE = 'density'  # 'density' = binned log-log grid (constant render time), 'scatter' = one dot per area
+GRID_BINS = 120          # density grid resolution per axis
+
+# --- 1, 2 & 3. PRE-AGGREGATED ADULT (Demographic) + CHILD (Biometric) ACTIVITY -> DRIFT SCORE ---
+# (spec 'demographic_drift' in specs.py)
+# - Areas present in both sources only (same as the old inner merge)
+# - Drift Score = Adult Updates / (Child Updates + 1), +1 prevents division by zero
+# - Only significant PIN codes (more than 100 adult updates) to avoid noise
+# Every area (for the density plot) and the Top 10 "Transient/Worker Zones" share one groupby
+SPEC = dict(SPECS['demographic_drift'], level=LEVEL)
+tables = run_specs({'all': dict(SPEC, top=None), 'top': SPEC})
+merged_df, transient_zones = tables['all'], tables['top']
 
 # --- 4. VISUALIZATION ---
 plt.figure(figsize=(12, 6))
 
-# We use a Scatter Plot to show the separation
-sns.scatterplot(data=merged_df, x='bio_age_5_17', y='demo_age_17_', alpha=0.5, size='drift_score', sizes=(20, 200))
-
-# Highlight the Top 10 Transient Zones
-plt.scatter(transient_zones['bio_age_5_17'], transient_zones['demo_age_17_'], color='red', s=100, label='High Drift (Worker Zones)')
+if RENDER_MODE == 'density':
+    # Bin every area into a log-spaced 2-D grid with NumPy first, then draw ONE image:
+    # render time depends on GRID_BINS, not on how many PINs (or PIN x month points) there are.
+    # +1 keeps zero counts on the log axes.
+    x = merged_df['bio_age_5_17'].to_numpy() + 1
+    y = merged_df['demo_age_17_'].to_numpy() + 1
+    x_edges = np.logspace(np.log10(x.min()), np.log10(x.max()) + 0.01, GRID_BINS + 1)
+    y_edges = np.logspace(np.log10(y.min()), np.log10(y.max()) + 0.01, GRID_BINS + 1)
+    density, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+
+    mesh = plt.pcolormesh(x_edges, y_edges, np.ma.masked_equal(density.T, 0), cmap='Blues', norm=LogNorm())
+    plt.colorbar(mesh, label='Number of areas')
+    plt.xscale('log')
+    plt.yscale('log')
+
+    # Only the Top 10 Transient Zones are drawn as individual markers
+    plt.scatter(transient_zones['bio_age_5_17'] + 1, transient_zones['demo_age_17_'] + 1, color='red', s=100, label='High Drift (Worker Zones)')
+else:
+    # We use a Scatter Plot to show the separation
+    sns.scatterplot(data=merged_df, x='bio_age_5_17', y='demo_age_17_', alpha=0.5, size='drift_score', sizes=(20, 200))
+
+    # Highlight the Top 10 Transient Zones
+    plt.scatter(transient_zones['bio_age_5_17'], transient_zones['demo_age_17_'], color='red', s=100, label='High Drift (Worker Zones)')
 
 plt.title('Demographic Drift: Family Zones (Low Drift) vs. Worker Zones (High Drift)', fontsize=16)
 plt.xlabel('Child Biometric Updates (Family Indicator)', fontsize=12)
@@ -0,0 +1,113 @@
+"""Goal: Forecast next season's monthly volume for EVERY district at once.
+
+Series are laid out as one (district x month) array and all models run as array operations
+over the district axis, so thousands of districts cost about the same as one.
+- Holt-Winters (additive level + trend + 12-month seasonality) when at least two full
+  seasons of history exist; the smoothing parameters are picked per district from a small
+  grid by one-step-ahead error, with every grid point evaluated in the same pass.
+- Seasonal naive (same month last year) otherwise. Calendar months never observed stay NaN."""
+
+import itertools
+import numpy as np
+import pandas as pd
+
+SEASON = 12                          # months per season
+ALPHAS = [0.1, 0.3, 0.5]             # level smoothing candidates
+BETAS = [0.0, 0.05]                  # trend smoothing candidates
+GAMMAS = [0.1, 0.3, 0.5]             # seasonal smoothing candidates
+
+
+# --- 1. LAYOUT ---
+
+def monthly_matrix(frame, value_col, by=('state', 'district'), date_col='date'):
+    """
+    Monthly totals as a (groups x months) float array over one continuous month range
+    (months without rows are 0). Returns (index DataFrame of groups, PeriodIndex, array).
+    """
+    by = list(by)
+    month = frame[date_col].dt.to_period('M')
+    months = pd.period_range(month.min(), month.max(), freq='M')
+    group_ids, groups = pd.factorize(pd.MultiIndex.from_frame(frame[by]), sort=True)
+
+    values = np.zeros((len(groups), len(months)))
+    offsets = month.array.asi8 - months[0].ordinal
+    np.add.at(values, (group_ids, offsets), frame[value_col].to_numpy())
+    return groups.to_frame(index=False, name=by), months, values
+
+
+# --- 2. MODELS ---
+
+def seasonal_naive(values, horizon=SEASON, season=SEASON):
+    """Each future month = the latest observed value of the same calendar position (NaN if never seen)."""
+    n, t = values.shape
+    steps = np.arange(t, t + horizon)
+    # Latest past index with the same position in the season (< 0: not in the history)
+    last = steps - season * ((steps - t) // season + 1)
+    forecast = np.full((n, horizon), np.nan)
+    seen = last >= 0
+    forecast[:, seen] = values[:, last[seen]]
+    return forecast
+
+
+def holt_winters(values, horizon=SEASON, season=SEASON):
+    """
+    Additive Holt-Winters for every row, with (alpha, beta, gamma) chosen per row from
+    the candidate grid by in-sample one-step squared error. Needs >= 2 seasons.
+    Returns (forecast (rows x horizon), chosen parameters (rows x 3)).
+    """
+    grid = np.array(list(itertools.product(ALPHAS, BETAS, GAMMAS)))      # (G, 3)
+    alpha, beta, gamma = (grid[:, i, None] for i in range(3))            # (G, 1) each
+    n, t = values.shape
+
+    # Initial state from the first two seasons, broadcast to (G, rows)
+    first, second = values[:, :season].mean(axis=1), values[:, season:2 * season].mean(axis=1)
+    level = np.broadcast_to(first, (len(grid), n)).copy()
+    trend = np.broadcast_to((second - first) / season, (len(grid), n)).copy()
+    seasonal = np.broadcast_to(values[:, :season] - first[:, None], (len(grid), n, season)).copy()
+
+    sse = np.zeros((len(grid), n))
+    for step in range(t):
+        y = values[:, step]
+        s = seasonal[:, :, step % season]
+        sse += (y - (level + trend + s)) ** 2
+        prev_level = level
+        level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev_level) + (1 - beta) * trend
+        seasonal[:, :, step % season] = gamma * (y - level) + (1 - gamma) * s
+
+    best = sse.argmin(axis=0)                                            # per row
+    rows = np.arange(n)
+    h = np.arange(1, horizon + 1)
+    positions = (t + h - 1) % season
+    forecast = (level[best, rows, None] + h * trend[best, rows, None]
+                + seasonal[best, rows][:, positions])
+    return np.clip(forecast, 0, None), grid[best]
+
+
+def seasonal_forecast(values, horizon=SEASON, season=SEASON):
+    """Holt-Winters with enough history, seasonal naive otherwise. Returns (forecast, method name)."""
+    if values.shape[1] >= 2 * season:
+        return holt_winters(values, horizon, season)[0], 'holt_winters'
+    return seasonal_naive(values, horizon, season), 'seasonal_naive'
+
+
+# --- 3. PEAKS ---
+
+def next_season_peaks(index, months, values, horizon=SEASON):
+    """
+    Expected peak month and volume of the next season for every group.
+    Returns the group index with next_peak_month, next_peak_volume, next_season_total
+    (over the months that have a forecast) and the method used, plus the full
+    (groups x horizon) forecast as a DataFrame.
+    """
+    forecast, method = seasonal_forecast(values, horizon)
+    future = pd.period_range(months[-1] + 1, periods=horizon, freq='M')
+
+    known = ~np.isnan(forecast).all(axis=1)
+    peak = np.nanargmax(np.where(known[:, None], forecast, 0), axis=1)
+    peaks = index.copy()
+    peaks['next_peak_month'] = np.where(known, future[peak].astype(str), None)
+    peaks['next_peak_volume'] = np.where(known, forecast[np.arange(len(forecast)), peak], np.nan).round()
+    peaks['next_season_total'] = np.nansum(forecast, axis=1).round()
+    peaks['method'] = method
+    return peaks, pd.DataFrame(forecast, columns=future.astype(str))
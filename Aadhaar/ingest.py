@@ -0,0 +1,284 @@
+"""Goal: Load the UIDAI workbooks ONCE, validate every row in a single vectorized pass and hand clean, typed columns to the analyses.
+
+Every file goes through the same rules. Each rule sets one bit in a `dq_flags` bitmask,
+bad rows are written to Output/quarantine/ and a per-rule summary is printed, so the
+analysis scripts no longer need their own sanity filters."""
+
+import os
+import glob
+import socket
+import numpy as np
+import pandas as pd
+from readers import read_workbook
+
+# --- 1. SOURCE DEFINITIONS ---
+SOURCES = {
+    'biometric': {'folder': 'biometric_data', 'measures': ['bio_age_5_17', 'bio_age_17_']},
+    'demographic': {'folder': 'demographic_data', 'measures': ['demo_age_5_17', 'demo_age_17_']},
+    'enrolment': {'folder': 'enrolment_data', 'measures': ['age_0_5', 'age_5_17', 'age_18_greater']},
+}
+
+KEY_COLUMNS = ['date', 'state', 'district', 'pincode']
+OUTPUT_DIR = 'Output'
+
+# --- 2. VALIDATION RULES (one bit each) ---
+BAD_PINCODE = 1      # missing, non-numeric or not a 6-digit PIN (100000-999999)
+NEGATIVE_COUNT = 2   # any measure below zero
+MISSING_COUNT = 4    # measure empty or non-numeric
+BAD_DATE = 8         # date cannot be parsed (DD-MM-YYYY)
+MISSING_AREA = 16    # blank state or district
+
+RULES = {
+    BAD_PINCODE: 'bad_pincode',
+    NEGATIVE_COUNT: 'negative_count',
+    MISSING_COUNT: 'missing_count',
+    BAD_DATE: 'bad_date',
+    MISSING_AREA: 'missing_area',
+}
+
+
+# State spellings differ between workbooks (and years): one canonical name each
+STATE_MAP = {
+    'west bengal': 'West Bengal',
+    'westbengal': 'West Bengal',
+    'west bangal': 'West Bengal',
+    'uttaranchal': 'Uttarakhand',
+    'uttarakhand': 'Uttarakhand',
+    'orissa': 'Odisha',
+    'odisha': 'Odisha',
+    'dadra & nagar haveli': 'Dadra And Nagar Haveli And Daman And Diu',
+    'daman & diu': 'Dadra And Nagar Haveli And Daman And Diu',
+    'dadra and nagar haveli and daman and diu': 'Dadra And Nagar Haveli And Daman And Diu',
+    'nct of delhi': 'Delhi',
+    'delhi nct': 'Delhi',
+    'delhi': 'Delhi',
+    'jammu & kashmir': 'Jammu And Kashmir',
+    'jammu and kashmir': 'Jammu And Kashmir',
+}
+
+
+def normalize_states(states):
+    """Canonical state names: whitespace and case folded, then STATE_MAP, then Title Case."""
+    key = (
+        pd.Series(states)
+        .astype(str)
+        .str.replace('\xa0', ' ', regex=False)      # non-breaking spaces
+        .str.replace(r'\s+', ' ', regex=True)       # collapse multiple spaces
+        .str.strip()
+        .str.lower()
+    )
+    return key.replace(STATE_MAP).str.title()
+
+
+def source_files(source, data_dir='.'):
+    """Sorted list of workbooks for one source folder."""
+    folder = os.path.join(data_dir, SOURCES[source]['folder'])
+    return sorted(glob.glob(os.path.join(folder, '*.xlsx')))
+
+
+def validate_frame(df, measures):
+    """
+    Applies every rule to the frame at once.
+    Returns (clean_df, bad_df, counts) where counts maps rule name -> rows failing it.
+    Only the columns present in df are checked.
+    """
+    flags = np.zeros(len(df), dtype=np.uint8)
+
+    if 'pincode' in df.columns:
+        pin = pd.to_numeric(df['pincode'], errors='coerce')
+        bad = pin.isna() | (pin % 1 != 0) | (pin < 100000) | (pin > 999999)
+        flags |= np.where(bad, BAD_PINCODE, 0).astype(np.uint8)
+        df['pincode'] = pin.fillna(0).astype('int32')
+
+    for col in measures:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        flags |= np.where(values.isna(), MISSING_COUNT, 0).astype(np.uint8)
+        flags |= np.where(values < 0, NEGATIVE_COUNT, 0).astype(np.uint8)
+        df[col] = values.fillna(0).astype('int32')
+
+    if 'date' in df.columns:
+        dates = pd.to_datetime(df['date'], dayfirst=True, errors='coerce')
+        flags |= np.where(dates.isna(), BAD_DATE, 0).astype(np.uint8)
+        df['date'] = dates
+
+    for col in ['state', 'district']:
+        if col not in df.columns:
+            continue
+        blank = df[col].isna() | (df[col].astype(str).str.strip() == '')
+        flags |= np.where(blank, MISSING_AREA, 0).astype(np.uint8)
+
+    counts = {name: int(((flags & bit) != 0).sum()) for bit, name in RULES.items()}
+    bad_rows = flags != 0
+
+    bad_df = df[bad_rows].copy()
+    bad_df['dq_flags'] = flags[bad_rows]
+    return df[~bad_rows], bad_df, counts
+
+
+# --- 3. CROSS-FILE DEDUPLICATION ---
+# The Drive extracts overlap: the same (date, state, district, pincode) row can appear in
+# several workbooks. Every row key gets a 64-bit fingerprint and the first workbook that
+# delivered a key "owns" it. Ownership is persisted in Output/dedup/<source>.npz, so later
+# runs only hash the rows they read instead of re-running drop_duplicates on all history.
+DEDUP_VERSION = 2   # bump when row_fingerprints changes so old indexes are dropped
+
+def file_id(path):
+    """64-bit id of a workbook (by file name, so the same file in another folder matches)."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return pd.util.hash_array(np.array([name], dtype=object))[0]
+
+
+def row_fingerprints(df):
+    """
+    Vectorized uint64 hash of the row key (date, state, district, pincode). The state is
+    hashed by its normalize_states() name, so 'Orissa' and 'Odisha' rows share a key.
+    """
+    # Normalized once per distinct spelling, not per row
+    codes, names = pd.factorize(df['state'])
+    state = normalize_states(names).to_numpy()[codes]
+    return pd.util.hash_pandas_object(df[KEY_COLUMNS].assign(state=state), index=False).to_numpy()
+
+
+def load_dedup_index(path):
+    """Returns (fingerprints, owner file ids) from disk, or empty arrays on first run (or an old DEDUP_VERSION)."""
+    if os.path.exists(path):
+        saved = np.load(path)
+        if 'version' in saved.files and int(saved['version']) == DEDUP_VERSION:
+            return saved['keys'], saved['owners']
+    return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)
+
+
+def save_dedup_index(path, keys, owners):
+    """Writes the index under a temp name, then renames: readers see the old or the new index, never half of one."""
+    tmp = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'   # several processes / hosts may write at once
+    with open(tmp, 'wb') as f:
+        np.savez(f, keys=keys, owners=owners, version=DEDUP_VERSION)
+    os.replace(tmp, path)
+
+
+def live_dedup_index(path, live_owners):
+    """The saved index without the owners whose workbook no longer exists."""
+    hist_keys, hist_owners = load_dedup_index(path)
+    alive = np.isin(hist_owners, live_owners)
+    return hist_keys[alive], hist_owners[alive]
+
+
+def dedup_owners(fingerprints, owners, hist_keys, hist_owners):
+    """
+    Decides which rows to keep: a row survives only if its own file owns its key.
+    Keys already in the index keep their recorded owner; new keys go to the first file
+    (in load order) that delivered them. Only cross-file duplicates are dropped: rows of
+    one workbook that repeat a key share its owner and are all kept (summed downstream). Hash lookups and a hashed groupby keep this
+    O(rows read). Returns (keep mask, newly seen keys, their owners).
+    Every row of a key must be passed together (a shard of whole keys is enough).
+    """
+    pos = pd.Index(hist_keys).get_indexer(fingerprints)
+    known = pos >= 0
+
+    # First file (in load order) wins for keys never seen before
+    first_owner = pd.Series(owners).groupby(fingerprints, sort=False).transform('first').to_numpy()
+    # pos == -1 lands on the appended 0 sentinel
+    recorded = np.append(hist_owners, np.uint64(0))[pos]
+    winner = np.where(known, recorded, first_owner)
+    keep = winner == owners
+
+    # One entry per newly seen key
+    fresh = ~known & keep
+    fresh_keys, first_idx = np.unique(fingerprints[fresh], return_index=True)
+    return keep, fresh_keys, owners[fresh][first_idx]
+
+
+def dedup_mask(fingerprints, owners, index_path, live_owners):
+    """
+    dedup_owners() against the index in index_path (owners of removed workbooks are
+    forgotten). Writes the updated index back - old entries + the newly seen keys - only
+    when it changed.
+    """
+    saved_keys, saved_owners = load_dedup_index(index_path)
+    alive = np.isin(saved_owners, live_owners)
+    hist_keys, hist_owners = saved_keys[alive], saved_owners[alive]
+    keep, fresh_keys, fresh_owners = dedup_owners(fingerprints, owners, hist_keys, hist_owners)
+    if len(fresh_keys) or not alive.all():
+        save_dedup_index(
+            index_path,
+            np.concatenate([hist_keys, fresh_keys]),
+            np.concatenate([hist_owners, fresh_owners]),
+        )
+    return keep
+
+
+def read_source_file(source, file, columns, quarantine_dir=None, reader=None):
+    """
+    Reads and validates one workbook. Bad rows go to <quarantine_dir>/<source>/<file>.csv
+    (None = not written). Returns (clean rows, summary row: file, rows, clean_rows, rule counts).
+    """
+    measures = SOURCES[source]['measures']
+    temp = read_workbook(file, columns, numeric=['pincode'] + measures, reader=reader)
+    clean, bad, counts = validate_frame(temp, measures)
+    name = os.path.splitext(os.path.basename(file))[0]
+    if quarantine_dir is not None and len(bad):
+        bad.to_csv(os.path.join(quarantine_dir, source, f'{name}.csv'), index=False)
+    return clean, {'file': name, 'rows': len(temp), 'clean_rows': len(clean), **counts}
+
+
+def load_source(source, columns=None, data_dir='.', quarantine=True, dedup=True, reader=None):
+    """
+    Reads every workbook of a source (biometric / demographic / enrolment),
+    validates each file and returns one clean DataFrame.
+
+    columns: columns the analysis needs (default: keys + all measures).
+    Bad rows go to <data_dir>/Output/quarantine/<source>/<file>.csv and the rule
+    counts to <data_dir>/Output/quarantine/<source>_summary.csv.
+    dedup: drop rows whose (date, state, district, pincode) key is owned by
+    another workbook (see dedup_mask).
+    reader: 'stream' or 'pandas' (default readers.READER).
+    """
+    measures = SOURCES[source]['measures']
+    if columns is None:
+        columns = KEY_COLUMNS + measures
+    # Keys are always read: they are validated and fingerprinted
+    read_cols = KEY_COLUMNS + [c for c in columns if c not in KEY_COLUMNS]
+
+    files = source_files(source, data_dir)
+    if not files:
+        raise FileNotFoundError(f"No Excel files found in {SOURCES[source]['folder']}")
+
+    quarantine_dir = os.path.join(data_dir, OUTPUT_DIR, 'quarantine')
+    if quarantine:
+        os.makedirs(os.path.join(quarantine_dir, source), exist_ok=True)
+
+    clean_list = []
+    owner_list = []
+    summary = []
+    for file in files:
+        clean, row = read_source_file(source, file, read_cols, quarantine_dir if quarantine else None, reader)
+        clean_list.append(clean)
+        owner_list.append(np.full(len(clean), file_id(file), dtype=np.uint64))
+        summary.append(row)
+
+    df = pd.concat(clean_list, ignore_index=True)
+    summary = pd.DataFrame(summary)
+
+    if dedup:
+        dedup_dir = os.path.join(data_dir, OUTPUT_DIR, 'dedup')
+        os.makedirs(dedup_dir, exist_ok=True)
+        owners = np.concatenate(owner_list)
+        keep = dedup_mask(
+            row_fingerprints(df), owners,
+            os.path.join(dedup_dir, f'{source}.npz'),
+            np.array([file_id(f) for f in files], dtype=np.uint64),
+        )
+        dropped = pd.Series(owners[~keep]).value_counts()
+        summary['duplicates'] = [int(dropped.get(file_id(f), 0)) for f in files]
+        df = df[keep].reset_index(drop=True)
+
+    if quarantine:
+        summary.to_csv(os.path.join(quarantine_dir, f'{source}_summary.csv'), index=False)
+
+    rejected = int(summary['rows'].sum() - summary['clean_rows'].sum())
+    duplicates = int(summary['duplicates'].sum()) if dedup else 0
+    print(f"✔ {source}: {len(files)} files | {len(df)} clean rows | {rejected} quarantined | {duplicates} duplicates dropped")
+
+    return df[columns]
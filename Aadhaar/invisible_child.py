@@ -1,63 +1,72 @@
 """Goal: Identify districts where the number of children updating biometrics (Age 5/15) is suspiciously low compared to the number of children enrolled at birth.
 
-Note on Data: Since we only have 2025 data, this script compares Current Enrolments (0-5) vs Current Updates (5-17).
+Cohort logic: children enrolled at age 0-5 in year Y-5 are due for the age-5 biometric update
+in year Y, and those enrolled in Y-15 for the age-15 update. The rollups keep yearly
+district totals (cohorts.py), so both lags are array lookups - no older workbooks to load.
 
-Ideally: we would load a "2020 Enrolment File" for the age_0_5 part.
+Note on Data: if the archive does not reach back far enough for any lag (e.g. only 2025
+data), the script falls back to comparing same-year enrolments (0-5) vs updates (5-17)
+as a proxy and says so."""
 
-Current Fix: We use the current file as a placeholder so the code works."""
 
-
-import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
+from rollups import load_rollups
+from cohorts import cohort_table
+from cache import AnalysisCache
+
+TOP_N = 10
+LAGS = [5, 15]       # years between enrolment (age 0-5) and the age-5 / age-15 update
+TARGET_YEAR = None   # update year to check (None = latest year in the data)
+
+
+def compute():
+    # --- 1. LOAD YEARLY DISTRICT COHORTS (enrolment + biometric, from the rollups) ---
+    cohorts = load_rollups()['cohorts']
+    year = TARGET_YEAR or int(cohorts['years'].max())
+
+    # --- 2. JOIN EVERY COHORT: age_0_5 in Y - lag vs bio_age_5_17 in Y (all years, all lags) ---
+    all_cohorts = cohort_table(cohorts, 'age_0_5', 'bio_age_5_17', LAGS)
+    joins = all_cohorts[all_cohorts['year'] == year]
+    if joins.empty:
+        print(f"No enrolment archive {LAGS} years before {year}: comparing same-year enrolments as a proxy.")
+        joins = cohort_table(cohorts, 'age_0_5', 'bio_age_5_17', [0], years=[year])
+
+    # --- 3. ANALYZE ---
+    # Expected updates = children enrolled in every resolvable cohort year
+    merged_df = joins.groupby(['state', 'district'], as_index=False).agg(
+        age_0_5=('age_0_5', 'sum'),
+        bio_age_5_17=('bio_age_5_17', 'first'),
+        lags_used=('lag', lambda lags: ','.join(map(str, lags))),
+    )
+    merged_df['year'] = year
+
+    # Calculate the "Gap"
+    # Logic: If Enrolments (Past cohort) > Updates (Current), we have a drop-off.
+    merged_df['missing_children_gap'] = merged_df['age_0_5'] - merged_df['bio_age_5_17']
+
+    # Filter for "Red Flag" Districts (Positive Gap = Missing Kids)
+    red_flags = merged_df[merged_df['missing_children_gap'] > 0].sort_values(by='missing_children_gap', ascending=False).head(TOP_N)
+    return {'red_flags': red_flags, 'cohorts': all_cohorts}
+
 
-# --- 1. LOAD ENROLMENT DATA (The "Birth Cohort") ---
-# Ideally, this should be data from 5 years ago. 
-# We are using current data as a placeholder for the code structure.
-enrol_files = glob.glob('enrolment_data/*.xlsx')
-df_enrol_list = []
-for file in enrol_files:
-    # We sum by District
-    temp = pd.read_excel(file, usecols=['state', 'district', 'age_0_5'])
-    df_enrol_list.append(temp)
-    
-df_enrol = pd.concat(df_enrol_list)
-# Group by District to get total infants enrolled
-dist_enrol = df_enrol.groupby(['state', 'district'])['age_0_5'].sum().reset_index()
-
-# --- 2. LOAD BIOMETRIC DATA (The "Update Cohort") ---
-bio_files = glob.glob('biometric_data/*.xlsx')
-df_bio_list = []
-for file in bio_files:
-    temp = pd.read_excel(file, usecols=['state', 'district', 'bio_age_5_17'])
-    df_bio_list.append(temp)
-
-df_bio = pd.concat(df_bio_list)
-# Group by District to get total children updating
-dist_bio = df_bio.groupby(['state', 'district'])['bio_age_5_17'].sum().reset_index()
-
-# --- 3. MERGE & ANALYZE ---
-# Combine datasets on State and District
-merged_df = pd.merge(dist_enrol, dist_bio, on=['state', 'district'], how='inner')
-
-# Calculate the "Gap"
-# Logic: If Enrolments (Past/Proxy) > Updates (Current), we have a drop-off.
-merged_df['missing_children_gap'] = merged_df['age_0_5'] - merged_df['bio_age_5_17']
-
-# Filter for "Red Flag" Districts (Positive Gap = Missing Kids)
-red_flags = merged_df[merged_df['missing_children_gap'] > 0].sort_values(by='missing_children_gap', ascending=False).head(10)
+# Unchanged data + code + parameters -> results straight from Output/cache
+cache = AnalysisCache('invisible_child', {'top_n': TOP_N, 'lags': LAGS, 'target_year': TARGET_YEAR}, __file__)
+red_flags = cache.tables(compute)['red_flags']
 
 # --- 4. VISUALIZATION ---
-plt.figure(figsize=(12, 6))
+# (a cache hit shows the stored PNG instead of re-rendering)
+if not cache.show_figure():
+    plt.figure(figsize=(12, 6))
 
-# Plotting the Gap
-sns.barplot(data=red_flags, x='missing_children_gap', y='district', palette='Reds_r')
+    # Plotting the Gap
+    sns.barplot(data=red_flags, x='missing_children_gap', y='district', palette='Reds_r')
 
-plt.title('The "Invisible Child": Districts with Highest Drop-off (Enrolment vs Updates)', fontsize=16)
-plt.xlabel('Estimated Number of Missing Updates', fontsize=12)
-plt.ylabel('District', fontsize=12)
-plt.grid(axis='x', linestyle='--', alpha=0.6)
+    plt.title('The "Invisible Child": Districts with Highest Drop-off (Enrolment vs Updates)', fontsize=16)
+    plt.xlabel('Estimated Number of Missing Updates', fontsize=12)
+    plt.ylabel('District', fontsize=12)
+    plt.grid(axis='x', linestyle='--', alpha=0.6)
 
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+    plt.tight_layout()
+    cache.save_figure()
+    plt.show()
@@ -1,30 +1,16 @@
 """Goal: Find PIN codes with high new enrolments for adults (age_18_greater). These are "Digital Dark Zones" just coming online."""
 
-import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
+from specs import SPECS, run_spec
 
-# --- 1. LOAD ENROLMENT DATA ---
-enrol_files = glob.glob('enrolment_data/*.xlsx')
-df_enrol_list = []
+LEVEL = 6  # PIN prefix level: 6 = PIN code, 3 = sorting district, 2 = sub-zone, 1 = zone
+START, END = None, None  # date window to rank over, e.g. '2025-03-15', '2025-06-30' (None = open)
 
-for file in enrol_files:
-    # Focus strictly on Adult New Enrolments
-    temp = pd.read_excel(file, usecols=['pincode', 'age_18_greater'])
-    df_enrol_list.append(temp)
-
-df_enrol = pd.concat(df_enrol_list)
-
-# --- 2. AGGREGATE ---
-# Sum by PIN Code to find hotspots
-pin_enrol = df_enrol.groupby('pincode')['age_18_greater'].sum().reset_index()
-
-# Find Top 15 "Late Adopter" PIN Codes
-top_late_adopters = pin_enrol.sort_values(by='age_18_greater', ascending=False).head(15)
-
-# Convert PIN to string for better plotting
-top_late_adopters['pincode'] = top_late_adopters['pincode'].astype(str)
+# --- 1 & 2. RANK PRE-AGGREGATED ENROLMENT TOTALS (spec 'late' in specs.py) ---
+# Focus strictly on Adult New Enrolments (summed by PIN / PIN prefix from the rollups;
+# 'pincode' holds the PIN, or a label like '560xxx' at coarser levels) -> Top 15 "Late Adopter" PIN Codes
+top_late_adopters = run_spec(dict(SPECS['late'], level=LEVEL, window=(START, END)))
 
 # --- 3. VISUALIZATION ---
 plt.figure(figsize=(14, 7))
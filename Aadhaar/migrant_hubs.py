@@ -1,45 +1,18 @@
 #Goal: Find PIN codes with High Adult Updates (demo_age_17_) but Low New Enrolments (age_18_greater).
 
-import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
+from specs import SPECS, run_spec
 
-# --- LOAD DEMOGRAPHIC DATA (Updates) ---
-demo_files = glob.glob('demographic_data/*.xlsx')
-df_demo_list = []
-for file in demo_files:
-    temp = pd.read_excel(file, usecols=['pincode', 'demo_age_17_'])
-    df_demo_list.append(temp)
-df_demo = pd.concat(df_demo_list)
+LEVEL = 6  # PIN prefix level: 6 = PIN code, 3 = sorting district, 2 = sub-zone, 1 = zone
+START, END = None, None  # date window to rank over, e.g. '2025-03-15', '2025-06-30' (None = open)
 
-# Group by PINCODE to get total updates per area
-demo_grouped = df_demo.groupby('pincode')['demo_age_17_'].sum().reset_index()
-
-# --- LOAD ENROLMENT DATA (New Entries) ---
-enrol_files = glob.glob('enrolment_data/*.xlsx')
-df_enrol_list = []
-for file in enrol_files:
-    temp = pd.read_excel(file, usecols=['pincode', 'age_18_greater'])
-    df_enrol_list.append(temp)
-df_enrol = pd.concat(df_enrol_list)
-
-# Group by PINCODE to get total new enrolments per area
-enrol_grouped = df_enrol.groupby('pincode')['age_18_greater'].sum().reset_index()
-
-# --- MERGE DATASETS ---
-# Combine them on PIN Code
-merged_df = pd.merge(demo_grouped, enrol_grouped, on='pincode', how='inner')
-
-# Calculate the "Migration Ratio" (Updates / New Enrolments)
-# Adding +1 to denominator to avoid division by zero errors
-merged_df['migration_ratio'] = merged_df['demo_age_17_'] / (merged_df['age_18_greater'] + 1)
-
-# Sort to find the Top 10 "Migrant Hubs" (High Updates, Low Enrolment)
-top_hubs = merged_df.sort_values(by='migration_ratio', ascending=False).head(10)
-
-# Make PIN code a string so it doesn't look like a number on the chart
-top_hubs['pincode'] = top_hubs['pincode'].astype(str)
+# --- RANK PRE-AGGREGATED TOTALS (Updates + New Entries), spec 'migrant_hubs' in specs.py ---
+# Demographic and enrolment totals per PIN / PIN prefix from the rollups, only areas present
+# in BOTH sources (same as the old inner merge).
+# "Migration Ratio" = Updates / (New Enrolments + 1) (+1 avoids division by zero)
+# -> the Top 10 "Migrant Hubs" (High Updates, Low Enrolment)
+top_hubs = run_spec(dict(SPECS['migrant_hubs'], level=LEVEL, window=(START, END)))
 
 """if want to see green bar(log values)
 # --- VISUALIZATION WITH LOG SCALE ---
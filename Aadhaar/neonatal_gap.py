@@ -1,53 +1,103 @@
-"""Goal: Identify PINs with high infant enrolment (age_0_5) but zero healthcare access. Note: Since you don't have the external hospital file yet, I have included a few lines to create a "Dummy Hospital Dataset" so the code runs immediately."""
+"""Goal: Identify PINs with high infant enrolment (age_0_5) but zero healthcare access.
 
+Needs two local files next to the data folders: hospital_locations.csv (latitude, longitude of each
+facility) and pincode_centroids.csv (pincode, latitude, longitude); the script stops with their
+names and columns if either is missing. A haversine BallTree answers "nearest facility" and
+"facilities within RADIUS_KM" for every PIN in one batched query."""
 
+
+import os
 import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+from sklearn.neighbors import BallTree
+from ingest import load_source
+from cache import AnalysisCache
+
+# --- EXTERNAL LOCATION DATA ---
+# Hospitals / PHCs with coordinates, and one or more (lat, lon) points per PIN code
+# (e.g. the India Post office directory; several offices per PIN are averaged into a centroid).
+HOSPITAL_FILE = 'hospital_locations.csv'
+PINCODE_FILE = 'pincode_centroids.csv'
+REQUIRED_COLUMNS = {HOSPITAL_FILE: ['latitude', 'longitude'], PINCODE_FILE: ['pincode', 'latitude', 'longitude']}
+RADIUS_KM = 10                             # "access" = a facility within this distance
+EARTH_RADIUS_KM = 6371.0
+TOP_N = 10
+
+
+def read_table(path):
+    """CSV or Excel, by extension; only the REQUIRED_COLUMNS of the file."""
+    table = pd.read_excel(path) if path.endswith('.xlsx') else pd.read_csv(path)
+    missing = [c for c in REQUIRED_COLUMNS[path] if c not in table.columns]
+    if missing:
+        raise ValueError(f"{path} has no column(s) {missing}; expected: {', '.join(REQUIRED_COLUMNS[path])}")
+    return table[REQUIRED_COLUMNS[path]]
+
+
+def check_location_files():
+    """Fails before any analysis (or cache lookup) runs if a location file is missing."""
+    missing = [f"{path} (columns: {', '.join(columns)})" for path, columns in REQUIRED_COLUMNS.items()
+               if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError("neonatal_gap needs these files next to the data folders: " + '; '.join(missing))
+
+
+def compute():
+    # --- 1. LOAD ENROLMENT DATA (Infants) ---
+    df_enrol = load_source('enrolment', ['pincode', 'age_0_5'])
+    df_enrol = df_enrol.groupby('pincode')['age_0_5'].sum().reset_index()
+
+    # --- 2. LOAD EXTERNAL LOCATION DATA ---
+    df_hospitals = read_table(HOSPITAL_FILE).dropna()
+    df_pins = (
+        read_table(PINCODE_FILE)
+        .dropna()
+        .groupby('pincode', as_index=False)[['latitude', 'longitude']].mean()
+    )
+
+    # --- 3. SPATIAL JOIN: NEAREST FACILITY & FACILITIES WITHIN RADIUS ---
+    # One BallTree over all facilities, then ONE batched query for every PIN centroid.
+    tree = BallTree(np.radians(df_hospitals[['latitude', 'longitude']].to_numpy()), metric='haversine')
+    pin_coords = np.radians(df_pins[['latitude', 'longitude']].to_numpy())
+
+    dist, _ = tree.query(pin_coords, k=1)
+    df_pins['nearest_hospital_km'] = dist[:, 0] * EARTH_RADIUS_KM
+    df_pins['hospital_count'] = tree.query_radius(pin_coords, r=RADIUS_KM / EARTH_RADIUS_KM, count_only=True)
+
+    merged_df = pd.merge(df_enrol, df_pins[['pincode', 'nearest_hospital_km', 'hospital_count']], on='pincode', how='inner')
+    print(f"PINs with location data: {len(merged_df)} / {len(df_enrol)}")
+
+    # LOGIC: High Kids (> 500) AND Zero Hospitals within RADIUS_KM
+    risk_zones = merged_df[(merged_df['age_0_5'] > 500) & (merged_df['hospital_count'] == 0)]
+    top_risk_zones = risk_zones.sort_values(by='age_0_5', ascending=False).head(TOP_N)
+    top_risk_zones['pincode'] = top_risk_zones['pincode'].astype(str)
+    return {'top_risk_zones': top_risk_zones}
+
+
+check_location_files()
 
-# --- 1. LOAD ENROLMENT DATA (Infants) ---
-files = glob.glob('enrolment_data/*.xlsx')
-df_list = []
-for file in files:
-    temp = pd.read_excel(file, usecols=['pincode', 'age_0_5'])
-    df_list.append(temp)
-df_enrol = pd.concat(df_list).groupby('pincode')['age_0_5'].sum().reset_index()
-
-# --- 2. LOAD/CREATE EXTERNAL HOSPITAL DATA ---
-# Since you likely don't have this file yet, we will SIMULATE it for the code to work.
-# In reality, you would do: df_hospitals = pd.read_excel('hospital_locations.xlsx')
-
-# [SIMULATION START]
-unique_pins = df_enrol['pincode'].unique()
-# Randomly assign 0 or 1 hospital to PINs for demonstration
-hospital_data = {'pincode': unique_pins, 'hospital_count': np.random.choice([0, 1, 2], size=len(unique_pins), p=[0.7, 0.2, 0.1])}
-df_hospitals = pd.DataFrame(hospital_data)
-# [SIMULATION END]
-
-# --- 3. MERGE & IDENTIFY "RISK ZONES" ---
-merged_df = pd.merge(df_enrol, df_hospitals, on='pincode', how='left').fillna(0)
-
-# LOGIC: High Kids (> 500) AND Zero Hospitals
-risk_zones = merged_df[(merged_df['age_0_5'] > 500) & (merged_df['hospital_count'] == 0)]
-top_risk_zones = risk_zones.sort_values(by='age_0_5', ascending=False).head(10)
-top_risk_zones['pincode'] = top_risk_zones['pincode'].astype(str)
+# Unchanged data + code + parameters -> results straight from Output/cache
+cache = AnalysisCache('neonatal_gap', {'radius_km': RADIUS_KM, 'top_n': TOP_N}, __file__, inputs=[HOSPITAL_FILE, PINCODE_FILE])
+top_risk_zones = cache.tables(compute)['top_risk_zones']
 
 # --- 4. VISUALIZATION ---
-plt.figure(figsize=(12, 6))
+# (a cache hit shows the stored PNG instead of re-rendering)
+if not cache.show_figure():
+    plt.figure(figsize=(12, 6))
 
-# We plot the number of infants in these "Medical Deserts"
-sns.barplot(data=top_risk_zones, x='pincode', y='age_0_5', palette='Reds_r')
+    # We plot the number of infants in these "Medical Deserts"
+    sns.barplot(data=top_risk_zones, x='pincode', y='age_0_5', palette='Reds_r')
 
-plt.title('The "Neonatal Gap": Top Areas with High Infant Enrolment but ZERO Hospitals', fontsize=16)
-plt.ylabel('Infant Count (Age 0-5)', fontsize=12)
-plt.xlabel('PIN Code (Risk Zone)', fontsize=12)
-plt.axhline(0, color='black', linewidth=1)
+    plt.title(f'The "Neonatal Gap": Top Areas with High Infant Enrolment but ZERO Hospitals within {RADIUS_KM} km', fontsize=16)
+    plt.ylabel('Infant Count (Age 0-5)', fontsize=12)
+    plt.xlabel('PIN Code (Risk Zone)', fontsize=12)
+    plt.axhline(0, color='black', linewidth=1)
 
-# Add Annotation
-plt.figtext(0.5, 0.01, "Action: Deploy Mobile Medical Vans to these PIN codes immediately.", 
-            ha="center", fontsize=10, bbox={"facecolor":"yellow", "alpha":0.3})
+    # Add Annotation
+    plt.figtext(0.5, 0.01, "Action: Deploy Mobile Medical Vans to these PIN codes immediately.", 
+                ha="center", fontsize=10, bbox={"facecolor":"yellow", "alpha":0.3})
 
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+    plt.tight_layout()
+    cache.save_figure()
+    plt.show()
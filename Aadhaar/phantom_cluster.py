@@ -1,67 +1,104 @@
-"""Goal: Detect suspicious spikes in Adult Demographic Updates (demo_age_17_) within short time windows (e.g., specific months)."""
+"""Goal: Detect suspicious spikes in Adult Demographic Updates (demo_age_17_) within short time windows (days, ISO weeks or months).
 
+The per-PIN series at every resolution come pre-aggregated from the rollup time pyramid
+(pyramid.py), so a three-day burst is caught at day level instead of being diluted across its month.
+A space-time scan (spacetime.py) then looks for groups of neighbouring PINs that are in excess
+together in the same weeks, even when none of them crosses the per-PIN threshold."""
 
+
+import os
 import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
+from rollups import load_rollups
+from pyramid import scan_spikes, pyramid_series
+from cache import AnalysisCache
+from similarity import similar_pincodes, load_index, NEIGHBOR_COLUMNS
+from spacetime import cluster_scan, load_centroids, PINCODE_FILE
+
+SPIKE_MULTIPLIER = 5    # period > 5x the PIN's average period (same resolution) = spike
+MIN_AVG_UPDATES = 50    # ignore PINs with tiny baselines (per month; scaled down for weeks and days)
+RESOLUTIONS = ['day', 'week', 'month']
+TOP_N = 5
+SIMILAR_K = 10          # PINs with the most similar monthly shape to the worst offender
+SCAN_WINDOW = 4         # longest space-time window, in weeks
+SCAN_NEIGHBOURS = 8     # largest region = a PIN + this many neighbours (centroids if present, else PIN prefix)
+SCAN_REPLICATES = 99    # Monte Carlo datasets for the cluster p-values
 
-# --- 1. LOAD DEMOGRAPHIC DATA ---
-files = glob.glob('demographic_data/*.xlsx')
-df_list = []
 
-for file in files:
-    # We need Date and PIN Code
-    temp = pd.read_excel(file, usecols=['date', 'pincode', 'demo_age_17_'])
-    df_list.append(temp)
+def compute():
+    # --- 1. LOAD THE TIME PYRAMID (demographic totals per PIN per day / ISO week / month) ---
+    rollups = load_rollups()
+    pyramid = rollups['pyramid']
 
-df_demo = pd.concat(df_list)
+    # --- 2 & 3. ANALYSIS: SPIKES AT EVERY RESOLUTION ---
+    # TRIGGER: activity > SPIKE_MULTIPLIER x the PIN's average period at that resolution
+    # (5x = 400% spike), only for meaningful volume (ignore spikes from 1 to 5)
+    spikes = scan_spikes(pyramid, 'demo_age_17_', SPIKE_MULTIPLIER, MIN_AVG_UPDATES, resolutions=RESOLUTIONS)
+    spikes = spikes.rename(columns={'value': 'demo_age_17_', 'avg': 'avg_updates'})
 
-# --- 2. PREPROCESSING ---
-# Convert date column to datetime
-df_demo['date'] = pd.to_datetime(df_demo['date'], dayfirst=True)
-# Extract Month-Year for grouping (e.g., "2025-02")
-df_demo['month_year'] = df_demo['date'].dt.to_period('M')
+    # Sort by the size of the spike relative to its own baseline (comparable across resolutions)
+    top_phantom_clusters = spikes.sort_values(by='spike_ratio', ascending=False).head(TOP_N)
 
-# --- 3. ANALYSIS: CALCULATE VELOCITY ---
-# Sum updates by PIN Code and Month
-monthly_activity = df_demo.groupby(['pincode', 'month_year'])['demo_age_17_'].sum().reset_index()
+    # The worst offender's series at the resolution it spiked at, for the chart
+    activity = pd.DataFrame(columns=['pincode', 'resolution', 'period', 'demo_age_17_'])
+    if not top_phantom_clusters.empty:
+        worst = top_phantom_clusters.iloc[0]
+        series = pyramid_series(pyramid, worst['pincode'], worst['resolution'], 'demo_age_17_')
+        activity = series.reset_index().assign(pincode=worst['pincode'], resolution=worst['resolution'])
+        activity = activity[['pincode', 'resolution', 'period', 'demo_age_17_']]
 
-# Calculate the "Average Monthly Activity" per PIN to find the baseline
-pin_baseline = monthly_activity.groupby('pincode')['demo_age_17_'].mean().reset_index()
-pin_baseline.rename(columns={'demo_age_17_': 'avg_updates'}, inplace=True)
+    # --- 4. LOOK-ALIKES: coordinated fraud tends to repeat the same monthly pattern ---
+    # (answered from the persisted index in similarity.py, not a pass over all series)
+    similar = pd.DataFrame(columns=NEIGHBOR_COLUMNS)
+    if not top_phantom_clusters.empty:
+        similar = similar_pincodes(top_phantom_clusters.iloc[0]['pincode'], SIMILAR_K,
+                                   index=load_index(rollups=rollups))
 
-# Merge back to compare current month vs average
-analysis_df = pd.merge(monthly_activity, pin_baseline, on='pincode')
+    # --- 5. SPACE-TIME CLUSTERS: neighbouring PINs in excess together ---
+    spatial = cluster_scan(pyramid, 'demo_age_17_', 'week', SCAN_WINDOW, SCAN_NEIGHBOURS, SCAN_REPLICATES,
+                           TOP_N, centroids=load_centroids())
+    return {'activity': activity, 'top_phantom_clusters': top_phantom_clusters,
+            'similar_pincodes': similar, 'spatial_clusters': spatial}
 
-# TRIGGER: Find instances where activity is > 5x the average (400% spike)
-# Filter for meaningful volume (ignore spikes from 1 to 5)
-analysis_df = analysis_df[analysis_df['avg_updates'] > 50] 
-spikes = analysis_df[analysis_df['demo_age_17_'] > (analysis_df['avg_updates'] * 5)]
 
-# Sort by the magnitude of the spike
-top_phantom_clusters = spikes.sort_values(by='demo_age_17_', ascending=False).head(5)
+# Unchanged data + code + parameters -> results straight from Output/cache
+params = {'spike_multiplier': SPIKE_MULTIPLIER, 'min_avg_updates': MIN_AVG_UPDATES, 'resolutions': RESOLUTIONS,
+          'top_n': TOP_N, 'similar_k': SIMILAR_K, 'scan_window': SCAN_WINDOW, 'scan_neighbours': SCAN_NEIGHBOURS,
+          'scan_replicates': SCAN_REPLICATES}
+cache = AnalysisCache('phantom_cluster', params, __file__, inputs=[PINCODE_FILE] if os.path.exists(PINCODE_FILE) else [])
+tables = cache.tables(compute)
+activity, top_phantom_clusters = tables['activity'], tables['top_phantom_clusters']
 
-print("--- ALERT: TOP 5 PHANTOM CLUSTERS DETECTED ---")
+print(f"--- ALERT: TOP {TOP_N} PHANTOM CLUSTERS DETECTED ---")
 print(top_phantom_clusters)
 
-# --- 4. VISUALIZATION ---
 if not top_phantom_clusters.empty:
+    print(f"\n--- PIN CODES WITH THE SAME MONTHLY PATTERN AS {top_phantom_clusters.iloc[0]['pincode']} ---")
+    print(tables['similar_pincodes'].to_string(index=False))
+
+print(f"\n--- TOP {TOP_N} SPACE-TIME CLUSTERS (neighbouring PINs, weekly windows) ---")
+print(tables['spatial_clusters'].to_string(index=False))
+
+# --- 6. VISUALIZATION ---
+if top_phantom_clusters.empty:
+    print("No suspicious clusters found with current threshold.")
+# (a cache hit shows the stored PNG instead of re-rendering)
+elif not cache.show_figure():
     # Pick the #1 worst offender PIN code to visualize
-    target_pin = top_phantom_clusters.iloc[0]['pincode']
-    
-    # Filter data for just that PIN
-    pin_data = monthly_activity[monthly_activity['pincode'] == target_pin]
-    pin_data['month_year'] = pin_data['month_year'].astype(str)
+    target_pin, resolution = top_phantom_clusters.iloc[0][['pincode', 'resolution']]
+
+    # Its series at the resolution of the spike (already filtered to that PIN in compute)
+    pin_data = activity.astype({'period': 'datetime64[ns]', 'demo_age_17_': 'int64'})
 
     plt.figure(figsize=(10, 5))
-    sns.lineplot(data=pin_data, x='month_year', y='demo_age_17_', marker='o', color='red', linewidth=3)
-    
-    plt.title(f'Phantom Cluster Detection: Suspicious Spike in PIN {target_pin}', fontsize=16)
+    sns.lineplot(data=pin_data, x='period', y='demo_age_17_', marker='o', color='red', linewidth=3)
+
+    plt.title(f'Phantom Cluster Detection: Suspicious {resolution.title()} Spike in PIN {target_pin}', fontsize=16)
     plt.xlabel('Timeline', fontsize=12)
     plt.ylabel('Adult Demographic Updates', fontsize=12)
     plt.grid(True, linestyle='--', alpha=0.6)
+    plt.xticks(rotation=45)
     plt.tight_layout()
+    cache.save_figure()
     plt.show()
-else:
-    print("No suspicious clusters found with current threshold.")
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Goal: Spikes at day, ISO-week and month resolution without re-aggregating the raw rows.
+
+A month-level rule dilutes a three-day burst across the whole month. The rollups keep a
+time pyramid: every measure (and the per-source row counts) per (pincode, period) at three
+resolutions - day, ISO week (keyed by its Monday) and month (keyed by its first day).
+- build_pyramid() derives all three levels from ONE pass over the daily table: the day
+  level is one groupby, the week and month levels are sums of the (much smaller) day level.
+- update_pyramid() adds a signed delta (rows of one changed workbook) to the affected
+  periods only, so the watcher keeps it current without a rebuild.
+- scan_spikes() applies the phantom_cluster rule (period > multiplier x the PIN's average
+  period) at every resolution in one vectorized pass per level."""
+
+import pandas as pd
+from ingest import SOURCES
+
+RESOLUTIONS = ['day', 'week', 'month']
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30.4}   # to scale a monthly volume floor
+
+
+def period_start(dates, resolution):
+    """First day of the period each date falls in (ISO weeks start on Monday)."""
+    dates = pd.DatetimeIndex(dates)
+    if resolution == 'day':
+        return dates.normalize()
+    if resolution == 'week':
+        return dates.normalize() - pd.to_timedelta(dates.weekday, unit='D')
+    return dates.values.astype('datetime64[M]').astype('datetime64[ns]')
+
+
+def _levels_from_days(days):
+    """{'day', 'week', 'month'} tables from a (pincode, period) day-level table."""
+    levels = {'day': days}
+    pins = days.index.get_level_values('pincode')
+    dates = days.index.get_level_values('period')
+    for resolution in RESOLUTIONS[1:]:
+        levels[resolution] = days.groupby([pins, pd.Index(period_start(dates, resolution), name='period')]).sum()
+    return levels
+
+
+def build_pyramid(daily, measures):
+    """{'measures': list, 'levels': {resolution: DataFrame indexed (pincode, period)}}."""
+    days = daily.groupby([daily['pincode'], daily['date'].rename('period')])[measures].sum()
+    return {'measures': list(measures), 'levels': _levels_from_days(days)}
+
+
+def update_pyramid(pyramid, delta):
+    """
+    Adds `delta` (rows with pincode, date and signed measure values) to every level in
+    place, touching only the affected (pincode, period) rows. Rows left without any
+    source rows (all n_* counts 0) are dropped, as in the daily table.
+    """
+    measures = pyramid['measures']
+    delta = delta.reindex(columns=['pincode', 'date'] + measures, fill_value=0)
+    days = delta.groupby([delta['pincode'], delta['date'].rename('period')])[measures].sum()
+    counts = [f'n_{source}' for source in SOURCES if f'n_{source}' in measures]
+
+    for resolution, part in _levels_from_days(days).items():
+        level = pyramid['levels'][resolution]
+        known = part.index.isin(level.index)
+        level.loc[part.index[known], measures] += part[known].to_numpy()
+        if (~known).any():
+            level = pd.concat([level, part[~known]])
+        touched = level.loc[part.index, counts]
+        empty = touched.index[(touched == 0).all(axis=1).to_numpy()]
+        pyramid['levels'][resolution] = level.drop(empty)
+    return pyramid
+
+
+def merge_pyramids(pyramids):
+    """One pyramid from pyramids of disjoint PIN codes (e.g. the shards of shards.py)."""
+    return {'measures': pyramids[0]['measures'],
+            'levels': {resolution: pd.concat([p['levels'][resolution] for p in pyramids]).sort_index()
+                       for resolution in RESOLUTIONS}}
+
+
+def scan_spikes(pyramid, measure, multiplier, min_avg_month, pincodes=None, resolutions=RESOLUTIONS):
+    """
+    Every (pincode, period) whose `measure` exceeds multiplier x the PIN's average over its
+    active periods (periods with rows in the measure's source) at each resolution.
+    min_avg_month: ignore PINs whose average is below this monthly volume, scaled to the
+    period length. Returns resolution, pincode, period, value, avg, spike_ratio.
+    """
+    source = next(s for s, spec in SOURCES.items() if measure in spec['measures'])
+    frames = []
+    for resolution in resolutions:
+        level = pyramid['levels'][resolution]
+        if pincodes is not None:
+            level = level[level.index.get_level_values('pincode').isin(pincodes)]
+        level = level[level[f'n_{source}'] > 0]
+        values = level[measure]
+        avg = values.groupby(level='pincode').transform('mean')
+        floor = min_avg_month * PERIOD_DAYS[resolution] / PERIOD_DAYS['month']
+        hits = (avg > floor) & (values > avg * multiplier)
+        frames.append(pd.DataFrame({'resolution': resolution, 'value': values[hits], 'avg': avg[hits]}).reset_index())
+    spikes = pd.concat(frames, ignore_index=True)
+    spikes['spike_ratio'] = spikes['value'] / spikes['avg']
+    return spikes[['resolution', 'pincode', 'period', 'value', 'avg', 'spike_ratio']]
+
+
+def pyramid_series(pyramid, pincode, resolution, measure):
+    """One PIN's series of `measure` at one resolution, by period."""
+    level = pyramid['levels'][resolution]
+    return level.xs(pincode, level='pincode')[measure].sort_index()
@@ -0,0 +1,320 @@
+"""Goal: Read the workbook columns an analysis needs without pd.read_excel's per-cell overhead.
+
+pd.read_excel builds an openpyxl cell object for every cell of every column and then runs
+the rows through pandas' text parser, even with usecols. Two faster backends write only the
+selected columns straight into preallocated NumPy arrays (float64 for numeric columns, with
+NaN for blanks and text, cast to int64 when every value is whole - the dtypes pd.read_excel
+gives; object for the rest):
+- 'stream': parses the sheet XML inside the .xlsx with iterparse, one row at a time
+- 'openpyxl': openpyxl in read-only mode, iterating plain values (values_only=True)
+Odd files fall back down the chain stream -> openpyxl -> pd.read_excel (e.g. date-formatted
+cells in a text column, which need the workbook styles, or a missing header column).
+
+Text in a numeric column becomes NaN (pd.read_excel keeps such a column as object); ingest
+validation treats both the same.
+
+Benchmark: python readers.py [workbook.xlsx ...]  (default: every workbook of every source)
+Measured on synthetic workbooks in the biometric layout (date, state, district, pincode + 2
+measures), best of 3 on one core, pandas 3.0, openpyxl 3.1, Python 3.11; all three readers
+gave the same dtypes and clean rows:
+    rows      stream   openpyxl   pandas   speedup
+    100,000    3.0 s     7.5 s    10.6 s     3.5x
+    250,000    8.0 s    22.7 s    24.5 s     3.0x"""
+
+import os
+import sys
+import time
+import zipfile
+import posixpath
+import numpy as np
+import pandas as pd
+from xml.etree.ElementTree import iterparse, fromstring
+from openpyxl import load_workbook
+
+READER = 'stream'   # 'stream', 'openpyxl' or 'pandas'
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+class UnsupportedWorkbook(ValueError):
+    """The workbook uses a feature a fast reader does not handle; use the next reader."""
+
+
+# --- 1. SHARED HELPERS ---
+
+def _alloc(size, is_num):
+    """Empty column: NaN-filled float64 or None-filled object (blank cells need no write)."""
+    return np.full(size, np.nan) if is_num else np.empty(size, dtype=object)
+
+
+def _grow(targets, capacity):
+    """Doubles every column array of (array, ..., is_num) targets."""
+    return [(np.concatenate([t[0], _alloc(capacity, t[-1])]),) + tuple(t[1:]) for t in targets]
+
+
+def _to_float(value):
+    """Slow path for cells that are not plain numbers (blank, text, bool)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _column(array, is_num):
+    """Numeric columns with no blanks and only whole numbers -> int64, as pd.read_excel returns them."""
+    if is_num and not np.isnan(array).any() and (array == np.floor(array)).all():
+        return array.astype(np.int64)
+    return array
+
+
+def _frame(columns, targets, n_rows):
+    # Trailing blank rows are dropped, like pd.read_excel does
+    return pd.DataFrame({c: _column(t[0][:n_rows], t[-1]) for c, t in zip(columns, targets)})
+
+
+# --- 2. READERS ---
+
+def read_pandas(path, columns, numeric=()):
+    """The original path: pd.read_excel on the first sheet."""
+    return pd.read_excel(path, usecols=list(columns))
+
+
+def read_openpyxl(path, columns, numeric=()):
+    """Streams the first sheet through openpyxl (read-only, values only) into typed arrays."""
+    workbook = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook.worksheets[0]
+        # The sheet dimension gives the row count up front; grow if it was understated
+        # (reset so iteration does not stop at a wrong dimension, as pd.read_excel does)
+        capacity = max((sheet.max_row or 1) - 1, 1)
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise UnsupportedWorkbook(f"columns not found in header: {missing}")
+
+        targets = [(_alloc(capacity, c in numeric), header.index(c), c in numeric) for c in columns]
+        width = max(pos for _, pos, _ in targets) + 1
+
+        n = 0
+        last_filled = 0
+        for row in rows:
+            if n == capacity:
+                targets = _grow(targets, capacity)
+                capacity *= 2
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+
+            filled = False
+            for array, pos, is_num in targets:
+                value = row[pos]
+                if value is None:
+                    continue
+                filled = True
+                if is_num:
+                    try:
+                        array[n] = value
+                    except (TypeError, ValueError):
+                        array[n] = _to_float(value)
+                else:
+                    array[n] = value
+            n += 1
+            if filled:
+                last_filled = n
+    finally:
+        workbook.close()
+    return _frame(columns, targets, last_filled)
+
+
+def _part_path(target, base='xl'):
+    """Relationship target -> path inside the zip."""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(base, target))
+
+
+def _workbook_parts(archive):
+    """(first worksheet path, shared strings path or None)."""
+    workbook = fromstring(archive.read('xl/workbook.xml'))
+    rels = {r.get('Id'): r for r in fromstring(archive.read('xl/_rels/workbook.xml.rels'))}
+    sheet_id = workbook.find(f'{_NS}sheets/{_NS}sheet').get(f'{_REL_NS}id')
+    shared = [r.get('Target') for r in rels.values() if r.get('Type', '').endswith('/sharedStrings')]
+    return _part_path(rels[sheet_id].get('Target')), (_part_path(shared[0]) if shared else None)
+
+
+def _shared_strings(archive, path):
+    if path is None:
+        return []
+    strings = []
+    with archive.open(path) as f:
+        for _, el in iterparse(f):
+            if el.tag == f'{_NS}si':
+                # Plain <t> or rich text <r><t> runs; phonetic hints (<rPh>) are skipped
+                runs = el.findall(f'{_NS}t') + el.findall(f'{_NS}r/{_NS}t')
+                strings.append(''.join(t.text or '' for t in runs))
+                el.clear()
+    return strings
+
+
+def _column_letters(ref):
+    end = 0
+    while end < len(ref) and ref[end].isalpha():
+        end += 1
+    return ref[:end], int(ref[end:])
+
+
+def read_stream(path, columns, numeric=()):
+    """
+    Parses the first sheet's XML directly into preallocated typed arrays.
+    Raises UnsupportedWorkbook for anything it does not handle (missing header column,
+    cells without references, numbers in a text column - possibly dates that need styles).
+    """
+    c_tag, v_tag, is_tag, t_tag, row_tag = (f'{_NS}{t}' for t in ('c', 'v', 'is', 't', 'row'))
+    dim_tag = f'{_NS}dimension'
+
+    with zipfile.ZipFile(path) as archive:
+        sheet_path, shared_path = _workbook_parts(archive)
+        shared = _shared_strings(archive, shared_path)
+
+        def cell_value(el):
+            kind = el.get('t', 'n')
+            if kind == 'inlineStr':
+                node = el.find(is_tag)
+                return ''.join(t.text or '' for t in node.iter(t_tag)) if node is not None else None
+            v = el.find(v_tag)
+            if v is None or v.text is None:
+                return None
+            if kind == 's':
+                return shared[int(v.text)]
+            if kind == 'n':
+                number = float(v.text)
+                return int(number) if number.is_integer() else number
+            if kind == 'b':
+                return v.text == '1'
+            return v.text   # 'str' (formula result), 'e' (error), 'd' (ISO date)
+
+        targets = None      # [(array, is_num)] once the header is known
+        by_letter = {}      # column letter -> (array index, is_num)
+        capacity = 1
+        header_row = None
+        last_filled = 0
+
+        with archive.open(sheet_path) as f:
+            for _, el in iterparse(f):
+                if el.tag == dim_tag:
+                    last = el.get('ref', 'A1').split(':')[-1]
+                    capacity = max(_column_letters(last)[1] - 1, 1)
+                elif el.tag == row_tag:
+                    cells = el.findall(c_tag)
+                    if any(c.get('r') is None for c in cells):
+                        raise UnsupportedWorkbook("cells without references")
+                    row_number = int(el.get('r') or _column_letters(cells[0].get('r'))[1]) if cells else None
+                    if row_number is None:
+                        el.clear()
+                        continue
+
+                    if targets is None:
+                        # First non-empty row is the header
+                        header_row = row_number
+                        header = {str(cell_value(c)).strip(): _column_letters(c.get('r'))[0] for c in cells}
+                        missing = [c for c in columns if c not in header]
+                        if missing:
+                            raise UnsupportedWorkbook(f"columns not found in header: {missing}")
+                        targets = [(_alloc(capacity, c in numeric), c in numeric) for c in columns]
+                        by_letter = {header[c]: (i, c in numeric) for i, c in enumerate(columns)}
+                        el.clear()
+                        continue
+
+                    n = row_number - header_row - 1
+                    while n >= capacity:
+                        targets = _grow(targets, capacity)
+                        capacity *= 2
+                    for c in cells:
+                        letters = _column_letters(c.get('r'))[0]
+                        if letters not in by_letter:
+                            continue
+                        i, is_num = by_letter[letters]
+                        value = cell_value(c)
+                        if value is None:
+                            continue
+                        last_filled = max(last_filled, n + 1)
+                        if is_num:
+                            targets[i][0][n] = value if isinstance(value, (int, float)) else _to_float(value)
+                        elif c.get('t', 'n') == 'n':
+                            raise UnsupportedWorkbook(f"numeric cell {c.get('r')} in text column")
+                        else:
+                            targets[i][0][n] = value
+                    el.clear()
+
+    if targets is None:
+        raise UnsupportedWorkbook("empty sheet")
+    return _frame(columns, targets, last_filled)
+
+
+READERS = {'stream': read_stream, 'openpyxl': read_openpyxl, 'pandas': read_pandas}
+FALLBACK = ['stream', 'openpyxl', 'pandas']
+
+
+def read_workbook(path, columns, numeric=(), reader=None):
+    """
+    Reads the given columns of a workbook with the configured reader.
+    A fast reader that cannot handle the file hands it to the next one in FALLBACK;
+    pd.read_excel is always last, so real errors surface exactly as before.
+    """
+    reader = reader or READER
+    if reader not in READERS:
+        raise ValueError(f"reader must be one of {list(READERS)}")
+    chain = FALLBACK[FALLBACK.index(reader):]
+    for name in chain[:-1]:
+        try:
+            return READERS[name](path, columns, numeric)
+        except Exception as exc:   # odd file - try the next reader
+            print(f"{name} reader skipped {os.path.basename(path)} ({exc})")
+    return READERS[chain[-1]](path, columns, numeric)
+
+
+# --- 3. BENCHMARK ---
+
+def benchmark(files, columns=None, numeric=(), measures=(), repeat=3):
+    """
+    Best-of-`repeat` seconds per reader for each file, with checks that every reader
+    gives the same column dtypes as pd.read_excel and the same clean rows after validation.
+    """
+    from ingest import validate_frame
+
+    results = []
+    for path in files:
+        cols = columns or list(pd.read_excel(path, nrows=0).columns)
+        row = {'file': os.path.basename(path)}
+        clean, dtypes = {}, {}
+        for name, read in READERS.items():
+            best = np.inf
+            for _ in range(repeat):
+                start = time.perf_counter()
+                frame = read(path, cols, numeric)
+                best = min(best, time.perf_counter() - start)
+            row[f'{name}_s'] = round(best, 3)
+            dtypes[name] = frame.dtypes.to_dict()
+            clean[name] = validate_frame(frame, list(measures))[0].reset_index(drop=True)
+        row['rows'] = len(frame)
+        row['speedup'] = round(row['pandas_s'] / row['stream_s'], 1)
+        row['same_dtypes'] = all(dtypes[name] == dtypes['pandas'] for name in READERS)
+        row['same_values'] = all(clean[name].equals(clean['pandas']) for name in READERS)
+        results.append(row)
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    from ingest import SOURCES, KEY_COLUMNS, source_files
+
+    if len(sys.argv) > 1:
+        print(benchmark(sys.argv[1:]).to_string(index=False))
+    else:
+        for source, spec in SOURCES.items():
+            files = source_files(source)
+            if files:
+                print(f"\n{source}:")
+                print(benchmark(files, KEY_COLUMNS + spec['measures'], numeric=['pincode'] + spec['measures'],
+                                measures=spec['measures']).to_string(index=False))
@@ -0,0 +1,273 @@
+"""Goal: Pre-aggregate the three sources ONCE so the ranking scripts can query any level instantly.
+
+The store holds:
+- daily: one row per (state, district, pincode, date) with every measure of every source
+- prefix: totals per PIN-code prefix level (1 = zone, 2 = sub-zone, 3 = sorting district, 6 = PIN)
+- hll: per-source HyperLogLog sketches of distinct PIN codes per (state, district, month)
+- quantiles: per-(state, district) quantile sketches of child_compliance_ratio
+  (bio 5-17 / bio 17+) and bio_demo_ratio (bio 5-17 / demo 5-17), from the daily PIN rows
+- cohorts: (district x year x measure) yearly totals for lagged cohort joins (see cohorts.py)
+- time: per-pincode prefix sums over the dates, for any date-range total in two lookups
+  (see timeindex.py). Not pickled: Output/rollups/time-<build>.npy, memory-mapped and built
+  on first use by time_index()
+- pyramid: per-pincode totals at day, ISO-week and month resolution for spike scans (see pyramid.py)
+
+It is pickled to Output/rollups/rollups.pkl together with a manifest of the workbooks it was
+built from, and rebuilt automatically when a workbook is added, removed or changed.
+Every pickled table is a sum / union over PIN codes, so stores of disjoint
+PIN-code shards merge into the full store (merge_rollups, used by shards.py)."""
+
+import os
+import glob
+import uuid
+import pickle
+from functools import reduce
+import numpy as np
+import pandas as pd
+from ingest import SOURCES, KEY_COLUMNS, OUTPUT_DIR, load_source, source_files
+from sketches import build_hll, build_quantiles, merge_hll, merge_quantiles, subtract_quantiles
+from cohorts import build_cohorts, merge_cohorts
+from timeindex import time_axes, build_time_index, range_totals
+from pyramid import build_pyramid, merge_pyramids
+
+# --- 1. LEVELS & COLUMNS ---
+LEVELS = {1: 'zone', 2: 'sub_zone', 3: 'sorting_district', 6: 'pincode'}
+MEASURES = [m for spec in SOURCES.values() for m in spec['measures']]
+ROW_COUNTS = [f'n_{source}' for source in SOURCES]   # raw rows per source (0 = PIN absent there)
+ROLLUP_VERSION = 7   # bump when the store layout changes so old pickles get rebuilt
+
+
+def rollup_path(data_dir='.'):
+    return os.path.join(data_dir, OUTPUT_DIR, 'rollups', 'rollups.pkl')
+
+
+def data_manifest(data_dir='.'):
+    """(file name -> (size, mtime)) for every workbook of every source."""
+    manifest = {}
+    for source in SOURCES:
+        for file in source_files(source, data_dir):
+            stat = os.stat(file)
+            manifest[os.path.relpath(file, data_dir)] = (stat.st_size, stat.st_mtime_ns)
+    return manifest
+
+
+# --- 2. BUILD ---
+
+def build_daily(data_dir='.'):
+    """
+    Loads every source once and sums it to (state, district, pincode, date).
+    A source without workbooks in data_dir is skipped (its columns stay 0).
+    """
+    frames = {}
+    for source, spec in SOURCES.items():
+        if not source_files(source, data_dir):
+            print(f"No {spec['folder']} workbooks, skipping {source}")
+            continue
+        frames[source] = load_source(source, data_dir=data_dir)
+    if not frames:
+        raise FileNotFoundError("No Excel files found for any source")
+    return combine_sources(frames)
+
+
+def combine_sources(frames):
+    """The daily table from {source: clean, deduplicated rows} (missing sources stay 0)."""
+    daily = None
+    for source, df in frames.items():
+        measures = SOURCES[source]['measures']
+        grouped = df.assign(**{f'n_{source}': 1}).groupby(KEY_COLUMNS, as_index=False)[measures + [f'n_{source}']].sum()
+        daily = grouped if daily is None else pd.merge(daily, grouped, on=KEY_COLUMNS, how='outer')
+    daily = daily.reindex(columns=KEY_COLUMNS + MEASURES + ROW_COUNTS)
+    daily[MEASURES + ROW_COUNTS] = daily[MEASURES + ROW_COUNTS].fillna(0).astype('int64')
+    return daily.sort_values(['pincode', 'date'], ignore_index=True)
+
+
+def build_prefix_rollups(daily):
+    """
+    Totals at every prefix level from a single pass over the rows:
+    the PIN level is aggregated from the daily table, every coarser level is
+    integer division of the PIN (pincode // 10**(6 - level)) over those totals.
+    """
+    pin_totals = daily.groupby('pincode')[MEASURES + ROW_COUNTS].sum()
+    prefix = {}
+    for level in LEVELS:
+        table = pin_totals.groupby(pin_totals.index // 10 ** (6 - level)).sum()
+        table.index.name = 'prefix'
+        prefix[level] = table
+    return prefix
+
+
+def daily_ratios(daily):
+    """Per-row compliance ratios (NaN where the denominator is missing or zero)."""
+    bio = daily[daily['bio_age_17_'] > 0]
+    both = daily[(daily['demo_age_5_17'] > 0) & (daily['n_biometric'] > 0)]
+    return {
+        'child_compliance_ratio': bio.assign(
+            child_compliance_ratio=bio['bio_age_5_17'] / bio['bio_age_17_']),
+        'bio_demo_ratio': both.assign(
+            bio_demo_ratio=both['bio_age_5_17'] / both['demo_age_5_17']),
+    }
+
+
+def build_rollups(data_dir='.'):
+    return rollups_from_daily(build_daily(data_dir), data_manifest(data_dir))
+
+
+def partial_rollups(daily, pyramid=None):
+    """The mergeable tables of the store (all but the time index) from a daily table."""
+    return {
+        'daily': daily,
+        'prefix': build_prefix_rollups(daily),
+        'hll': {source: build_hll(daily, source) for source in SOURCES},
+        'quantiles': {name: build_quantiles(frame, name) for name, frame in daily_ratios(daily).items()},
+        'cohorts': build_cohorts(daily),
+        'pyramid': pyramid if pyramid is not None else build_pyramid(daily, MEASURES + ROW_COUNTS),
+    }
+
+
+def rollups_from_daily(daily, manifest, pyramid=None):
+    """
+    Every derived table of the store from an up-to-date daily table (no workbook reads).
+    pyramid: an incrementally maintained time pyramid to store instead of rebuilding it.
+    """
+    return {
+        'version': ROLLUP_VERSION,
+        'build': uuid.uuid4().hex,   # names this store's time index file
+        'manifest': manifest,
+        **partial_rollups(daily, pyramid),
+    }
+
+
+def merge_rollups(parts, manifest):
+    """
+    The full store from partial_rollups() of shards with disjoint PIN codes: daily rows and
+    pyramid rows are concatenated, totals added, sketches merged. The time index is built on
+    first use from the merged daily table (its date axis spans every shard).
+    """
+    daily = pd.concat([p['daily'] for p in parts], ignore_index=True).sort_values(['pincode', 'date'], ignore_index=True)
+    return {
+        'version': ROLLUP_VERSION,
+        'build': uuid.uuid4().hex,
+        'manifest': manifest,
+        'daily': daily,
+        'prefix': {level: pd.concat([p['prefix'][level] for p in parts]).groupby(level='prefix').sum()
+                   for level in LEVELS},
+        'hll': {source: reduce(merge_hll, [p['hll'][source] for p in parts]) for source in SOURCES},
+        'quantiles': {name: reduce(merge_quantiles, [p['quantiles'][name] for p in parts])
+                      for name in parts[0]['quantiles']},
+        'cohorts': reduce(merge_cohorts, [p['cohorts'] for p in parts]),
+        'pyramid': merge_pyramids([p['pyramid'] for p in parts]),
+    }
+
+
+def update_rollups(rollups, daily, manifest, added, before, after, pyramid=None):
+    """
+    The store with new rows added, without re-deriving it from the whole daily table.
+    added: the new rows (KEY_COLUMNS + measures + row counts) - their totals are added to
+    prefix and cohorts and their sketches merged into hll. before / after: the daily rows
+    at the keys they touched, before and after (the quantile sketches hold one ratio per
+    daily row, so those rows' ratios are swapped). Only for rows added: distinct-PIN
+    sketches cannot take rows back out, so removals go through rollups_from_daily.
+    """
+    prefix = build_prefix_rollups(added)
+    quantiles = dict(rollups['quantiles'])
+    old, new = daily_ratios(before), daily_ratios(after)
+    for name in quantiles:
+        quantiles[name] = subtract_quantiles(merge_quantiles(quantiles[name], build_quantiles(new[name], name)),
+                                             build_quantiles(old[name], name))
+    return {
+        'version': ROLLUP_VERSION,
+        'build': uuid.uuid4().hex,
+        'manifest': manifest,
+        'daily': daily,
+        'prefix': {level: pd.concat([rollups['prefix'][level], prefix[level]]).groupby(level='prefix').sum()
+                   for level in LEVELS},
+        'hll': {source: merge_hll(rollups['hll'][source], build_hll(added, source))
+                if (added[f'n_{source}'] > 0).any() else rollups['hll'][source] for source in SOURCES},
+        'quantiles': quantiles,
+        'cohorts': merge_cohorts(rollups['cohorts'], build_cohorts(added)),
+        'pyramid': pyramid if pyramid is not None else rollups['pyramid'],
+    }
+
+
+# --- 3. LOAD / QUERY ---
+
+def cached_rollups(data_dir='.', manifest=None):
+    """The pickled store if it was built from the current workbooks with this layout, else None."""
+    path = rollup_path(data_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        rollups = pickle.load(f)
+    if rollups.get('version') == ROLLUP_VERSION and rollups['manifest'] == (manifest or data_manifest(data_dir)):
+        return rollups
+    print("Workbooks or rollup layout changed, rebuilding rollups...")
+    return None
+
+
+def load_rollups(data_dir='.', rebuild=False):
+    """Returns the cached store, rebuilding it only when the workbooks changed."""
+    rollups = None if rebuild else cached_rollups(data_dir)
+    if rollups is not None:
+        return rollups
+    rollups = build_rollups(data_dir)
+    save_rollups(rollups, data_dir)
+    return rollups
+
+
+def save_rollups(rollups, data_dir='.'):
+    path = rollup_path(data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written to a temp file first so readers never see a half-written store
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(rollups, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+    # Time indexes of older builds are stale
+    for old in glob.glob(os.path.join(os.path.dirname(path), 'time-*.npy')):
+        if old != time_index_path(rollups, data_dir):
+            os.remove(old)
+
+
+def time_index_path(rollups, data_dir='.'):
+    return os.path.join(data_dir, OUTPUT_DIR, 'rollups', f"time-{rollups['build']}.npy")
+
+
+def time_index(rollups, data_dir='.'):
+    """
+    The store's per-PIN prefix sums (timeindex.py), memory-mapped from the .npy next to
+    rollups.pkl. Built from the daily table and saved the first time it is needed after a
+    rebuild, so stores that are never queried by date (e.g. the watcher's) never pay for it.
+    """
+    path = time_index_path(rollups, data_dir)
+    if not os.path.exists(path):
+        index = build_time_index(rollups['daily'], MEASURES + ROW_COUNTS)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'   # several processes may build it at once
+        with open(tmp, 'wb') as f:
+            np.save(f, index['cumsum'])
+        os.replace(tmp, path)
+    return time_axes(rollups['daily'], MEASURES + ROW_COUNTS, np.load(path, mmap_mode='r'))
+
+
+def prefix_table(level, rollups=None, data_dir='.', start=None, end=None):
+    """
+    Totals at one prefix level as a DataFrame with a 'pincode' column holding the
+    prefix label (e.g. '560xxx' at level 3) so existing charts keep working.
+    start / end: only count dates in that window (inclusive), from the prefix sums.
+    """
+    if level not in LEVELS:
+        raise ValueError(f"level must be one of {list(LEVELS)}")
+    if rollups is None:
+        rollups = load_rollups(data_dir)
+    if start is None and end is None:
+        table = rollups['prefix'][level].reset_index()
+    else:
+        totals = range_totals(time_index(rollups, data_dir), start, end, MEASURES + ROW_COUNTS)
+        table = totals.groupby(totals['pincode'] // 10 ** (6 - level))[MEASURES + ROW_COUNTS].sum()
+        table = table.rename_axis('prefix').reset_index()
+    table['pincode'] = prefix_label(table.pop('prefix'), level)
+    return table
+
+
+def prefix_label(prefix, level):
+    """560 at level 3 -> '560xxx'; full PIN codes are returned unchanged as strings."""
+    return prefix.astype(str) + 'x' * (6 - level)
@@ -0,0 +1,140 @@
+"""Goal: Preview runs in seconds - rankings and ratios from a stratified sample, with error bars.
+
+A full run reads every workbook. A preview reads a sample in two stages:
+1. files: a random PREVIEW_FILES share of each source's workbooks (at least one),
+2. rows: inside every (workbook, state, month) cell, a random PREVIEW_ROWS share of the
+   validated rows (at least MIN_CELL_ROWS), so every state and month present in the
+   sampled workbooks is represented.
+Each sampled row stands for (F / f) * (N / n) rows (F workbooks of which f were read, N rows
+in its cell of which n were kept). Totals per area are the weighted sums, and the two-stage
+variance (between workbooks + within cells) gives a normal confidence interval at CONFIDENCE.
+Ratios use the linearized variance of ratio-of-totals estimators.
+
+Preview rows are not checked against the dedup index (it describes the full archive), and
+nothing is quarantined: use a full run for final reports."""
+
+import math
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+from ingest import SOURCES, KEY_COLUMNS, source_files, validate_frame
+from readers import read_workbook
+
+PREVIEW_FILES = 0.2     # share of each source's workbooks read
+PREVIEW_ROWS = 0.25     # share of the rows kept in every (workbook, state, month) cell
+MIN_CELL_ROWS = 2       # rows kept per cell at least (2 = its variance can be estimated)
+CONFIDENCE = 0.95
+SAMPLE_SEED = 42
+STRATA = ['state', 'month']
+
+
+# --- 1. DRAW ---
+
+def preview_source(source, columns, files=PREVIEW_FILES, rows=PREVIEW_ROWS, data_dir='.', seed=SAMPLE_SEED):
+    """
+    Stratified two-stage sample of one source.
+    Returns {'rows': DataFrame of the sampled rows (KEY_COLUMNS + columns + 'month',
+    'file', 'cell_rows', 'cell_sample', 'weight'), 'files_total': F, 'files_read': f}.
+    """
+    rng = np.random.default_rng(seed)
+    paths = source_files(source, data_dir)
+    if not paths:
+        raise FileNotFoundError(f"No Excel files found in {SOURCES[source]['folder']}")
+    picked = np.sort(rng.choice(len(paths), size=max(1, math.ceil(files * len(paths))), replace=False))
+
+    measures = SOURCES[source]['measures']
+    read_cols = KEY_COLUMNS + [c for c in columns if c not in KEY_COLUMNS]
+    frames = []
+    for i in picked:
+        frame = read_workbook(paths[i], read_cols, numeric=['pincode'] + measures)
+        clean, _, _ = validate_frame(frame, measures)
+        frames.append(clean.assign(file=i))
+    frame = pd.concat(frames, ignore_index=True)
+    frame['month'] = frame['date'].dt.to_period('M')
+
+    # Random order, then the first n rows of every cell = a simple random sample per cell
+    frame = frame.iloc[rng.permutation(len(frame))]
+    cells = frame.groupby(['file'] + STRATA, sort=False, observed=True)
+    size = cells['file'].transform('size').to_numpy()
+    take = np.minimum(size, np.maximum(np.ceil(rows * size), MIN_CELL_ROWS)).astype(np.int64)
+    keep = cells.cumcount().to_numpy() < take
+
+    sample = frame[keep].assign(cell_rows=size[keep], cell_sample=take[keep]).reset_index(drop=True)
+    sample['weight'] = len(paths) / len(picked) * sample['cell_rows'] / sample['cell_sample']
+    print(f"✔ {source} preview: {len(picked)}/{len(paths)} files | {len(sample)} of {len(frame)} rows sampled")
+    return {'rows': sample, 'files_total': len(paths), 'files_read': len(picked)}
+
+
+# --- 2. ESTIMATE ---
+
+def _values(rows, values):
+    return rows[values].to_numpy(dtype=float) if isinstance(values, str) else np.asarray(values, dtype=float)
+
+
+def _z():
+    return NormalDist().inv_cdf(0.5 + CONFIDENCE / 2)
+
+
+def total_variance(sample, by, values):
+    """
+    Estimated totals of `values` (a column name or a per-row array) per `by` group and their
+    two-stage variance. Returns a DataFrame indexed by `by` with 'total' and 'variance'.
+    """
+    rows = sample['rows']
+    F, f = sample['files_total'], sample['files_read']
+    y = _values(rows, values)
+
+    # Per (group, workbook, cell): sum and sum of squares of y over the sampled rows
+    parts = pd.DataFrame({'y': y, 'y2': y * y, 'N': rows['cell_rows'], 'n': rows['cell_sample']})
+    keys = [rows[c] for c in by] + [rows['file']] + [rows[c] for c in STRATA]
+    cell = parts.groupby(keys, observed=True).agg(y=('y', 'sum'), y2=('y2', 'sum'), N=('N', 'first'), n=('n', 'first'))
+
+    # Within-cell variance of y * 1{group} (rows of other groups count as zeros)
+    n, N = cell['n'], cell['N']
+    s2 = ((cell['y2'] - cell['y'] ** 2 / n) / (n - 1)).where(n > 1, 0).clip(lower=0)
+    cell['est'] = N / n * cell['y']
+    cell['within'] = N ** 2 * (1 - n / N) * s2 / n
+
+    group = list(range(len(by)))
+    per_file = cell.groupby(level=group + [len(by)])[['est', 'within']].sum()
+    per_file['est2'] = per_file['est'] ** 2
+    per_group = per_file.groupby(level=group).agg(s=('est', 'sum'), s2=('est2', 'sum'), within=('within', 'sum'))
+    # Between-workbook variance of the per-file estimates (files without the group are zeros)
+    between = ((per_group['s2'] - per_group['s'] ** 2 / f) / (f - 1)).clip(lower=0) if f > 1 else 0
+    result = pd.DataFrame({
+        'total': F / f * per_group['s'],
+        'variance': F ** 2 * (1 - f / F) * between / f + F / f * per_group['within'],
+    })
+    result.index.names = by
+    return result
+
+
+def estimate_totals(sample, by, column):
+    """Estimated total of `column` per group with its standard error and confidence interval."""
+    est = total_variance(sample, by, column)
+    se = np.sqrt(est['variance'])
+    return pd.DataFrame({'estimate': est['total'], 'se': se,
+                         'ci_low': (est['total'] - _z() * se).clip(lower=0), 'ci_high': est['total'] + _z() * se})
+
+
+def estimate_ratio(sample, by, numerator, denominator):
+    """
+    Ratio of estimated totals sum(numerator) / sum(denominator) per group (e.g. a mean of
+    per-row ratios with denominator = 1) with the linearized standard error and interval.
+    """
+    rows = sample['rows']
+    num = total_variance(sample, by, numerator)['total']
+    den = total_variance(sample, by, denominator)['total']
+    ratio = num / den
+    # Residual y - R * x of every row against its own group's ratio
+    keys = rows[by[0]] if len(by) == 1 else pd.MultiIndex.from_frame(rows[by])
+    row_ratio = ratio.reindex(keys).to_numpy()
+    y, x = _values(rows, numerator), _values(rows, denominator)
+    se = np.sqrt(total_variance(sample, by, y - row_ratio * x)['variance']) / den
+    return pd.DataFrame({'estimate': ratio, 'se': se,
+                         'ci_low': ratio - _z() * se, 'ci_high': ratio + _z() * se})
+
+
+def with_interval(estimate, se):
+    """Normal confidence interval bounds for an estimate derived outside this module."""
+    return estimate - _z() * se, estimate + _z() * se
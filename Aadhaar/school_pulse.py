@@ -1,53 +1,77 @@
-#Goal: Track bio_age_5_17 over time to find "Admission Season" spikes.
+#Goal: Track bio_age_5_17 over time to find "Admission Season" spikes, and forecast next season's peak per district.
 
-import pandas as pd
-import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
+from ingest import load_source
+from cache import AnalysisCache
+from forecast import monthly_matrix, next_season_peaks
 
-# 1. Load ALL Excel files from the Biometric folder
-file_list = glob.glob('biometric_data/*.xlsx') 
+STATE = 'Gujarat'  # Set to None to see overall
+TOP_N = 10         # districts listed with the largest expected peaks
 
-# Efficiently combine them into one DataFrame
-df_list = []
-for file in file_list:
-    # Read only columns we need to save memory
-    temp_df = pd.read_excel(file, usecols=['date', 'state', 'district', 'bio_age_5_17'])
-    df_list.append(temp_df)
 
-df_bio = pd.concat(df_list, ignore_index=True)
-df_bio = df_bio[df_bio['state'] == 'Gujarat'] #Comment this line if want to see overall
+def compute():
+    # 1. Load ALL Excel files from the Biometric folder
+    # Read only columns we need to save memory (dates arrive already parsed and validated)
+    df_bio = load_source('biometric', ['date', 'state', 'district', 'bio_age_5_17'])
 
-# 2. Preprocessing
-# Convert date column to datetime objects (assuming DD/MM/YYYY format)
-df_bio['date'] = pd.to_datetime(df_bio['date'], dayfirst=True)
+    # 2. Forecast: every district's monthly series as one (district x month) array,
+    # fitted in a single batch (see forecast.py) - all states, for camp capacity planning
+    index, months, values = monthly_matrix(df_bio, 'bio_age_5_17')
+    peaks, district_forecast = next_season_peaks(index, months, values)
+    district_forecast = index.join(district_forecast)
 
-# Extract Month-Year for aggregation (e.g., "2025-03")
-df_bio['month_year'] = df_bio['date'].dt.to_period('M')
+    if STATE:
+        df_bio = df_bio[df_bio['state'] == STATE]
 
-# 3. Aggregation
-# Group by Month and sum the updates
-monthly_trend = df_bio.groupby('month_year')['bio_age_5_17'].sum().reset_index()
+    # 3. Preprocessing
+    # Extract Month-Year for aggregation (e.g., "2025-03")
+    df_bio['month_year'] = df_bio['date'].dt.to_period('M')
 
-# Convert month_year back to string for plotting
-monthly_trend['month_year'] = monthly_trend['month_year'].astype(str)
+    # 4. Aggregation
+    # Group by Month and sum the updates
+    monthly_trend = df_bio.groupby('month_year')['bio_age_5_17'].sum().reset_index()
+
+    # Convert month_year back to string for plotting
+    monthly_trend['month_year'] = monthly_trend['month_year'].astype(str)
+
+    # Expected next season for the plotted area = sum of its districts' forecasts
+    selected = district_forecast[district_forecast['state'] == STATE] if STATE else district_forecast
+    forecast_trend = selected.drop(columns=['state', 'district']).sum(min_count=1).rename_axis('month_year')
+    forecast_trend = forecast_trend.rename('bio_age_5_17').reset_index()
+    return {'monthly_trend': monthly_trend, 'forecast_trend': forecast_trend,
+            'peaks': peaks, 'district_forecast': district_forecast}
 
-# --- VISUALIZATION ---
-plt.figure(figsize=(12, 6))
-sns.lineplot(data=monthly_trend, x='month_year', y='bio_age_5_17', marker='o', linewidth=2.5, color='blue')
 
-plt.title('The "School Compliance" Pulse: Mandatory Biometric Updates (Age 5-17)', fontsize=16)
-plt.ylabel('Number of Updates', fontsize=12)
-plt.xlabel('Timeline', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.xticks(rotation=45)
+# Unchanged data + code + parameters -> results straight from Output/cache
+cache = AnalysisCache('school_pulse', {'state': STATE}, __file__)
+tables = cache.tables(compute)
+monthly_trend, forecast_trend, peaks = tables['monthly_trend'], tables['forecast_trend'], tables['peaks']
+
+print(f"\nNext-season forecast ({peaks['method'].iloc[0]}) - top {TOP_N} districts by expected peak:")
+print(peaks.sort_values('next_peak_volume', ascending=False).head(TOP_N).to_string(index=False))
+
+# --- VISUALIZATION ---
+# (a cache hit shows the stored PNG instead of re-rendering)
+if not cache.show_figure():
+    plt.figure(figsize=(12, 6))
+    sns.lineplot(data=monthly_trend, x='month_year', y='bio_age_5_17', marker='o', linewidth=2.5, color='blue', label='Actual')
+    sns.lineplot(data=forecast_trend.dropna(), x='month_year', y='bio_age_5_17', marker='o', linewidth=2.5,
+                 color='orange', linestyle='--', label='Forecast (next season)')
 
-plt.tight_layout()
-plt.show()
+    plt.title('The "School Compliance" Pulse: Mandatory Biometric Updates (Age 5-17)', fontsize=16)
+    plt.ylabel('Number of Updates', fontsize=12)
+    plt.xlabel('Timeline', fontsize=12)
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.xticks(rotation=45)
 
+    plt.tight_layout()
+    cache.save_figure()
+    plt.show()
 
 
 
 """How to Read the Graph:
 The Spike: You are looking for a sharp peak around April, May, June.
-The Flatline: If the line is flat during these months, that is your anomaly."""
\ No newline at end of file
+The Flatline: If the line is flat during these months, that is your anomaly.
+The Forecast (dashed): expected next season; plan update-camp capacity for its peak month."""
@@ -0,0 +1,318 @@
+"""Goal: Build the rollups on several machines at once through a work queue in a shared folder.
+
+One build is split into tasks, each a JSON file in Output/queue/tasks/, run in three stages
+(a stage starts once the previous one is complete):
+1. map-<source>-<n>: read and validate ONE workbook (bad rows quarantined as in load_source)
+   and split its clean rows into PARTITIONS shards by PIN code (pincode % PARTITIONS),
+2. part-<p>: for ONE shard, deduplicate every source (same ownership rule and index as
+   load_source - a key's rows all share its PIN code, so they share a shard) and build the
+   partial rollups of its PIN codes,
+3. reduce: merge the partial rollups into the store (merge_rollups), then write the dedup
+   index and the quarantine summaries.
+Workers need nothing but the shared folder. A task is claimed by creating its lock file in
+claims/ with O_CREAT | O_EXCL (atomic, also on NFS v3+); the worker touches it every
+HEARTBEAT_SECONDS while the task runs, and a claim left untouched for LEASE_SECONDS is taken
+as a dead worker and handed out again. Claim ages are measured on the file server's clock
+(the mtime of a file the worker has just written), never against the local clock, so clock
+skew between hosts does not make live claims look stale.
+
+A task CAN run more than once: a slow worker taken for dead, two workers freeing the same
+stale claim at once (the second removes the first one's fresh lock), or a worker that dies
+after its work but before marking it done. Every task is therefore safe to re-run: results
+are written under a temp name and renamed (same content each run, never half-read), and
+the reduce step writes the dedup index as a set (each key once, first owner kept), so
+running it again changes nothing.
+
+Usage (from the folder holding the data folders, on a filesystem every host mounts):
+    python shards.py plan [partitions]   # once: lay out the tasks
+    python shards.py work                # on every host, once per core to use
+    python shards.py run [workers]       # plan + that many local workers + wait (one machine)"""
+
+import os
+import sys
+import glob
+import json
+import time
+import pickle
+import shutil
+import socket
+import threading
+import traceback
+import subprocess
+import numpy as np
+import pandas as pd
+from ingest import (SOURCES, KEY_COLUMNS, OUTPUT_DIR, source_files, read_source_file, file_id,
+                    row_fingerprints, live_dedup_index, dedup_owners, save_dedup_index)
+from rollups import data_manifest, combine_sources, partial_rollups, merge_rollups, save_rollups
+
+PARTITIONS = 16           # PIN-code shards (pincode % PARTITIONS)
+LEASE_SECONDS = 120       # claim untouched this long = dead worker, the task is handed out again
+HEARTBEAT_SECONDS = 10    # claims are touched this often while their task runs
+POLL_SECONDS = 1.0        # idle worker waiting for the next stage
+LOCAL_WORKERS = os.cpu_count()
+STAGES = ['map', 'part', 'reduce']
+
+
+def queue_dir(data_dir='.'):
+    return os.path.join(data_dir, OUTPUT_DIR, 'queue')
+
+
+def _publish(path, payload):
+    """Writes bytes under a temp name, then renames: readers see the whole file or none."""
+    tmp = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _pickle(obj):
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# --- 1. PLAN ---
+
+def plan(data_dir='.', partitions=PARTITIONS):
+    """Lays out the tasks of one build. Any previous queue is removed: run it once, before the workers."""
+    files = {source: [os.path.relpath(f, data_dir) for f in source_files(source, data_dir)] for source in SOURCES}
+    if not any(files.values()):
+        raise FileNotFoundError("No Excel files found for any source")
+
+    queue = queue_dir(data_dir)
+    shutil.rmtree(queue, ignore_errors=True)
+    for sub in ['tasks', 'claims', 'done', 'failed', 'results']:
+        os.makedirs(os.path.join(queue, sub))
+
+    tasks = [{'id': f'map-{source}-{n:05d}', 'stage': 'map', 'source': source, 'file': path}
+             for source, paths in files.items() for n, path in enumerate(paths)]
+    tasks += [{'id': f'part-{p:04d}', 'stage': 'part', 'partition': p} for p in range(partitions)]
+    tasks.append({'id': 'reduce', 'stage': 'reduce'})
+
+    meta = {'partitions': partitions, 'files': files, 'manifest': data_manifest(data_dir),
+            'counts': {stage: sum(t['stage'] == stage for t in tasks) for stage in STAGES}}
+    # The plan first: a worker that sees a task can always read it
+    _publish(os.path.join(queue, 'plan.json'), json.dumps(meta).encode())
+    for task in tasks:
+        _publish(os.path.join(queue, 'tasks', f"{task['id']}.json"), json.dumps(task).encode())
+    print(f"✔ Queue ready in {queue}: {meta['counts']['map']} workbooks, {partitions} shards")
+    return meta
+
+
+# --- 2. TASKS ---
+
+def run_map(task, meta, data_dir):
+    """One workbook -> validated rows, one pickle per shard + its quarantine summary row."""
+    source = task['source']
+    quarantine_dir = os.path.join(data_dir, OUTPUT_DIR, 'quarantine')
+    os.makedirs(os.path.join(quarantine_dir, source), exist_ok=True)
+    clean, summary = read_source_file(source, os.path.join(data_dir, task['file']),
+                                      KEY_COLUMNS + SOURCES[source]['measures'], quarantine_dir)
+
+    out = os.path.join(queue_dir(data_dir), 'results', task['id'])
+    os.makedirs(out, exist_ok=True)
+    shard = clean['pincode'].to_numpy() % meta['partitions']
+    for p in range(meta['partitions']):
+        _publish(os.path.join(out, f'{p:04d}.pkl'), _pickle(clean[shard == p]))
+    _publish(os.path.join(out, 'summary.json'), json.dumps(summary).encode())
+
+
+def run_partition(task, meta, data_dir):
+    """One shard of every source -> deduplicated daily rows -> partial rollups."""
+    p = task['partition']
+    results = os.path.join(queue_dir(data_dir), 'results')
+    frames, dedup = {}, {}
+    for source, paths in meta['files'].items():
+        if not paths:
+            continue
+        # Load order = file order, as in load_source (first delivering file wins a new key)
+        parts = [_load(os.path.join(results, f'map-{source}-{n:05d}', f'{p:04d}.pkl')) for n in range(len(paths))]
+        owners = np.concatenate([np.full(len(part), file_id(path), dtype=np.uint64) for part, path in zip(parts, paths)])
+        rows = pd.concat(parts, ignore_index=True)
+
+        # The saved ownership index is only read here; the reduce step writes it
+        live = np.array([file_id(path) for path in paths], dtype=np.uint64)
+        hist_keys, hist_owners = live_dedup_index(os.path.join(data_dir, OUTPUT_DIR, 'dedup', f'{source}.npz'), live)
+        keep, fresh_keys, fresh_owners = dedup_owners(row_fingerprints(rows), owners, hist_keys, hist_owners)
+        frames[source] = rows[keep]
+        dedup[source] = {'keys': fresh_keys, 'owners': fresh_owners,
+                         'dropped': pd.Series(owners[~keep]).value_counts().to_dict()}
+
+    daily = combine_sources(frames)
+    result = {'rollups': partial_rollups(daily) if len(daily) else None, 'dedup': dedup}
+    _publish(os.path.join(results, f"{task['id']}.pkl"), _pickle(result))
+
+
+def run_reduce(task, meta, data_dir):
+    """Partial rollups -> the store; fresh dedup keys -> the index; map summaries -> quarantine summaries."""
+    results = os.path.join(queue_dir(data_dir), 'results')
+    parts = [_load(os.path.join(results, f'part-{p:04d}.pkl')) for p in range(meta['partitions'])]
+
+    for source, paths in meta['files'].items():
+        if not paths:
+            continue
+        index_path = os.path.join(data_dir, OUTPUT_DIR, 'dedup', f'{source}.npz')
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        hist_keys, hist_owners = live_dedup_index(index_path, np.array([file_id(f) for f in paths], dtype=np.uint64))
+        fresh = [part['dedup'][source] for part in parts]
+        # Each key once, its earliest owner kept: a second reduce finds its keys already
+        # recorded and writes the same index
+        keys, first = np.unique(np.concatenate([hist_keys] + [f['keys'] for f in fresh]), return_index=True)
+        owners = np.concatenate([hist_owners] + [f['owners'] for f in fresh])[first]
+        save_dedup_index(index_path, keys, owners)
+
+        dropped = pd.concat([pd.Series(f['dropped'], dtype='int64') for f in fresh]).groupby(level=0).sum()
+        summary = []
+        for n in range(len(paths)):
+            with open(os.path.join(results, f'map-{source}-{n:05d}', 'summary.json')) as f:
+                summary.append(json.load(f))
+        summary = pd.DataFrame(summary)
+        summary['duplicates'] = [int(dropped.get(file_id(path), 0)) for path in paths]
+        summary.to_csv(os.path.join(data_dir, OUTPUT_DIR, 'quarantine', f'{source}_summary.csv'), index=False)
+
+        rejected = int(summary['rows'].sum() - summary['clean_rows'].sum())
+        duplicates = int(summary['duplicates'].sum())
+        print(f"✔ {source}: {len(paths)} files | {int(summary['clean_rows'].sum()) - duplicates} clean rows | "
+              f"{rejected} quarantined | {duplicates} duplicates dropped")
+
+    manifest = {path: tuple(stat) for path, stat in meta['manifest'].items()}
+    rollups = merge_rollups([part['rollups'] for part in parts if part['rollups'] is not None], manifest)
+    save_rollups(rollups, data_dir)
+    print(f"✔ Rollups merged from {meta['partitions']} shards: {len(rollups['daily'])} daily rows")
+
+
+RUNNERS = {'map': run_map, 'part': run_partition, 'reduce': run_reduce}
+
+
+# --- 3. WORKER ---
+
+def _server_now(queue):
+    """The file server's current time: the mtime of a file this worker has just written."""
+    probe = os.path.join(queue, 'claims', f'.clock-{socket.gethostname()}-{os.getpid()}')
+    with open(probe, 'w') as f:
+        f.write('now\n')
+    return os.stat(probe).st_mtime
+
+
+def _claim(path, now):
+    """Creates the task's lock file unless a live worker holds it. True = the task is ours."""
+    try:
+        if now - os.path.getmtime(path) > LEASE_SECONDS:
+            os.remove(path)   # its worker stopped touching it: free the task
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(f'{socket.gethostname()} {os.getpid()}\n')
+    return True
+
+
+def _heartbeat(path, stop):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def work(data_dir='.'):
+    """
+    Claims and runs tasks until the build is complete. Returns the number of tasks this
+    worker ran, or None if a task failed (its traceback is in Output/queue/failed/).
+    """
+    queue = queue_dir(data_dir)
+    with open(os.path.join(queue, 'plan.json')) as f:
+        meta = json.load(f)
+    tasks = {}
+    for path in sorted(glob.glob(os.path.join(queue, 'tasks', '*.json'))):
+        with open(path) as f:
+            task = json.load(f)
+        tasks[task['id']] = task
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+
+    ran = 0
+    while True:
+        done = set(os.listdir(os.path.join(queue, 'done')))
+        failed = sorted(os.listdir(os.path.join(queue, 'failed')))
+        if failed:
+            print(f"⚠️  Worker {worker} stopping: task {os.path.splitext(failed[0])[0]} failed "
+                  f"(see {os.path.join(queue, 'failed')}; re-plan to retry)")
+            return None
+        if len(done) == len(tasks):
+            break
+
+        # Only stages whose predecessors are complete
+        finished = {stage: sum(tasks[t]['stage'] == stage for t in done) for stage in STAGES}
+        open_stages = set()
+        for stage in STAGES:
+            open_stages.add(stage)
+            if finished[stage] < meta['counts'][stage]:
+                break
+        claimed, now = None, _server_now(queue)
+        for task_id, task in tasks.items():
+            if task_id in done or task['stage'] not in open_stages:
+                continue
+            if _claim(os.path.join(queue, 'claims', task_id), now):
+                claimed = task
+                break
+        if claimed is None:
+            time.sleep(POLL_SECONDS)
+            continue
+
+        task_id = claimed['id']
+        claim = os.path.join(queue, 'claims', task_id)
+        if os.path.exists(os.path.join(queue, 'done', task_id)):   # finished since the listing
+            os.remove(claim)
+            continue
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(claim, stop), daemon=True).start()
+        try:
+            RUNNERS[claimed['stage']](claimed, meta, data_dir)
+            _publish(os.path.join(queue, 'done', task_id), worker.encode())
+            ran += 1
+        except Exception:
+            _publish(os.path.join(queue, 'failed', f'{task_id}.txt'), f'{worker}\n{traceback.format_exc()}'.encode())
+        finally:
+            stop.set()
+            try:
+                os.remove(claim)
+            except FileNotFoundError:
+                pass
+
+    try:
+        os.remove(os.path.join(queue, 'claims', f'.clock-{socket.gethostname()}-{os.getpid()}'))
+    except FileNotFoundError:
+        pass
+    print(f"✔ Worker {worker} finished ({ran} tasks)")
+    return ran
+
+
+def run_local(workers=LOCAL_WORKERS, data_dir='.', partitions=PARTITIONS):
+    """Plans a build and runs it with `workers` independent local worker processes."""
+    plan(data_dir, partitions)
+    started = time.time()
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'work'], cwd=data_dir)
+             for _ in range(workers)]
+    for proc in procs:
+        proc.wait()
+    if not os.path.exists(os.path.join(queue_dir(data_dir), 'done', 'reduce')):
+        raise RuntimeError(f"Sharded build did not complete (see {os.path.join(queue_dir(data_dir), 'failed')})")
+    print(f"✔ Sharded build with {workers} workers done in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'plan':
+        plan(partitions=int(sys.argv[2]) if len(sys.argv) > 2 else PARTITIONS)
+    elif command == 'work':
+        sys.exit(0 if work() is not None else 1)
+    elif command == 'run':
+        run_local(int(sys.argv[2]) if len(sys.argv) > 2 else LOCAL_WORKERS)
+    else:
+        print(__doc__)
@@ -0,0 +1,102 @@
+"""Goal: Find the PIN codes whose monthly activity has the same SHAPE as a suspicious PIN.
+
+Every PIN code's monthly series of one measure (default demo_age_17_) is z-normalized
+(mean 0, std 1), so the Euclidean distance between two vectors depends only on their
+correlation (d^2 = 2 * months * (1 - r)), not on volume. A scikit-learn NearestNeighbors
+index over those vectors is built once from the rollups, pickled to
+Output/similarity/<measure>.pkl and rebuilt only when the rollups change, so
+"k most similar PINs to X" is one index query instead of a pass over every series.
+
+Usage: python similarity.py <pincode> [k]"""
+
+import os
+import sys
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+from ingest import OUTPUT_DIR
+from rollups import load_rollups
+from forecast import monthly_matrix
+
+PROFILE_MEASURE = 'demo_age_17_'
+SIMILAR_K = 10
+NEIGHBOR_COLUMNS = ['pincode', 'distance', 'correlation']
+INDEX_VERSION = 1   # bump when the index layout changes
+
+
+def index_path(measure=PROFILE_MEASURE, data_dir='.'):
+    return os.path.join(data_dir, OUTPUT_DIR, 'similarity', f'{measure}.pkl')
+
+
+# --- 1. BUILD ---
+
+def profile_vectors(daily, measure=PROFILE_MEASURE):
+    """
+    z-normalized monthly vectors of every PIN with any activity.
+    Returns (pincodes, months, (pins x months) float32 array). Flat series are dropped:
+    they have no shape to compare.
+    """
+    index, months, values = monthly_matrix(daily, measure, by=['pincode'])
+    std = values.std(axis=1)
+    keep = std > 0
+    vectors = (values[keep] - values[keep].mean(axis=1, keepdims=True)) / std[keep, None]
+    return index['pincode'].to_numpy()[keep], months, vectors.astype(np.float32)
+
+
+def build_index(rollups, measure=PROFILE_MEASURE):
+    pincodes, months, vectors = profile_vectors(rollups['daily'], measure)
+    return {
+        'version': INDEX_VERSION,
+        'manifest': rollups['manifest'],
+        'measure': measure,
+        'pincodes': pincodes,
+        'months': months,
+        'vectors': vectors,
+        'model': NearestNeighbors().fit(vectors),
+    }
+
+
+def load_index(measure=PROFILE_MEASURE, data_dir='.', rollups=None, rebuild=False):
+    """The pickled index, rebuilt only when the rollups (i.e. the workbooks) changed."""
+    rollups = rollups or load_rollups(data_dir)
+    path = index_path(measure, data_dir)
+    if not rebuild and os.path.exists(path):
+        with open(path, 'rb') as f:
+            index = pickle.load(f)
+        if index.get('version') == INDEX_VERSION and index['manifest'] == rollups['manifest']:
+            return index
+
+    index = build_index(rollups, measure)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"✔ Similarity index: {len(index['pincodes'])} PIN codes x {len(index['months'])} months ({measure})")
+    return index
+
+
+# --- 2. QUERY ---
+
+def similar_pincodes(pincode, k=SIMILAR_K, index=None, measure=PROFILE_MEASURE, data_dir='.'):
+    """
+    The k PIN codes whose monthly shape is closest to `pincode`, nearest first,
+    with the distance and the equivalent correlation. Empty if the PIN is not indexed.
+    """
+    index = index or load_index(measure, data_dir)
+    pos = np.flatnonzero(index['pincodes'] == int(pincode))
+    if not len(pos):
+        return pd.DataFrame(columns=NEIGHBOR_COLUMNS)
+
+    n_neighbors = min(k + 1, len(index['pincodes']))
+    distances, neighbors = index['model'].kneighbors(index['vectors'][pos[:1]], n_neighbors=n_neighbors)
+    result = pd.DataFrame({'pincode': index['pincodes'][neighbors[0]], 'distance': distances[0]})
+    result = result[result['pincode'] != int(pincode)].head(k).reset_index(drop=True)
+    result['correlation'] = 1 - result['distance'] ** 2 / (2 * len(index['months']))
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__.splitlines()[-1])
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else SIMILAR_K
+    print(similar_pincodes(sys.argv[1], k).to_string(index=False))
@@ -0,0 +1,205 @@
+"""Goal: Mergeable sketches stored alongside the rollups, so distinct counts and percentiles don't need the raw rows.
+
+HyperLogLog: one register array per (state, district, month). The distinct PIN codes of any
+district / state / date range are estimated by taking the element-wise max of the selected
+register rows, in memory that depends only on the number of registers, not on the row count.
+
+Quantile sketch: log-bucket counts of a ratio per (state, district). Percentile thresholds for
+any district, state or the whole country come from summing bucket counts."""
+
+import numpy as np
+import pandas as pd
+
+# --- 1. HYPERLOGLOG ---
+HLL_PRECISION = 10                 # 2**10 = 1024 registers -> ~3% standard error
+HLL_GROUP = ['state', 'district', 'month']
+
+
+def _bit_length(x):
+    """Exact bit length of a uint64 array (frexp is exact below 2**53, so split in halves)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+def hll_registers(values, groups, p=HLL_PRECISION):
+    """
+    Builds the register arrays for many groups at once.
+    values: array of items to count (e.g. PIN codes), groups: integer group id per item.
+    Returns a (n_groups, 2**p) uint8 array.
+    """
+    h = pd.util.hash_array(np.asarray(values))
+    idx = (h >> np.uint64(64 - p)).astype(np.int64)
+    # Remaining bits, with a sentinel bit so the rank is capped at 64 - p + 1
+    w = (h << np.uint64(p)) | np.uint64(1 << (p - 1))
+    rank = (65 - _bit_length(w)).astype(np.uint8)
+
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    registers = np.zeros((n_groups, 1 << p), dtype=np.uint8)
+    np.maximum.at(registers, (groups, idx), rank)
+    return registers
+
+
+def hll_estimate(registers):
+    """Cardinality estimate for each register row (or a single row)."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+
+    # Small-range correction (linear counting) - typical for a district's PIN codes
+    zeros = np.sum(registers == 0, axis=1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def build_hll(daily, source, p=HLL_PRECISION):
+    """
+    Distinct-PIN sketches per (state, district, month) for one source.
+    Returns {'index': DataFrame of groups, 'registers': (n_groups, 2**p) uint8 array}.
+    """
+    rows = daily[daily[f'n_{source}'] > 0]
+    keys = pd.DataFrame({
+        'state': rows['state'].to_numpy(),
+        'district': rows['district'].to_numpy(),
+        'month': rows['date'].dt.to_period('M').to_numpy(),
+    })
+    group_ids = keys.groupby(HLL_GROUP, sort=True).ngroup().to_numpy()
+    index = keys.drop_duplicates(HLL_GROUP).sort_values(HLL_GROUP, ignore_index=True)
+    return {'index': index, 'registers': hll_registers(rows['pincode'].to_numpy(dtype='int64'), group_ids, p)}
+
+
+def merge_hll(a, b):
+    """Combines two distinct-PIN sketches (register-wise max per group)."""
+    index = pd.concat([a['index'], b['index']], ignore_index=True)
+    group_ids, merged_index = pd.factorize(pd.MultiIndex.from_frame(index), sort=True)
+    registers = np.zeros((len(merged_index), a['registers'].shape[1]), dtype=np.uint8)
+    np.maximum.at(registers, group_ids, np.vstack([a['registers'], b['registers']]))
+    return {'index': merged_index.to_frame(index=False, name=HLL_GROUP), 'registers': registers}
+
+
+def distinct_pincodes(sketch, by=None, state=None, district=None, start=None, end=None):
+    """
+    Estimated distinct PIN codes from a sketch built by build_hll.
+
+    state / district / start / end ('2025-03' etc.) select sketch rows.
+    by: None for one overall number, column name(s) of the index (e.g. 'state' or
+    ['state', 'district']) or an array of labels aligned with sketch['index'] to merge
+    rows into custom groups.
+    """
+    index = sketch['index']
+    mask = np.ones(len(index), dtype=bool)
+    if state is not None:
+        mask &= (index['state'] == state).to_numpy()
+    if district is not None:
+        mask &= (index['district'] == district).to_numpy()
+    if start is not None:
+        mask &= (index['month'] >= pd.Period(start, 'M')).to_numpy()
+    if end is not None:
+        mask &= (index['month'] <= pd.Period(end, 'M')).to_numpy()
+
+    registers = sketch['registers'][mask]
+    if by is None:
+        return float(hll_estimate(registers.max(axis=0, initial=0))[0])
+
+    if isinstance(by, str):
+        labels = index[by].to_numpy()
+    elif isinstance(by, list):
+        labels = pd.MultiIndex.from_frame(index[by])
+    else:
+        labels = np.asarray(by)
+    codes, uniques = pd.factorize(labels[mask])
+    merged = np.zeros((len(uniques), registers.shape[1]), dtype=np.uint8)
+    np.maximum.at(merged, codes, registers)
+    return pd.Series(hll_estimate(merged), index=uniques)
+
+
+# --- 2. QUANTILE SKETCH ---
+# DDSketch-style log buckets: a value x lands in bucket ceil(log_gamma(x)), so any quantile
+# read back is within QUANTILE_ALPHA relative error. Counts add up, which makes the sketch
+# mergeable (district -> state -> country, or old archive + new month) and lets all groups
+# be built with one np.add.at instead of per-group loops.
+QUANTILE_ALPHA = 0.01                        # 1% relative error
+QUANTILE_MIN, QUANTILE_MAX = 1e-4, 1e4       # ratios outside are clamped; 0 has its own bucket
+QUANTILE_GROUP = ['state', 'district']
+_GAMMA = (1 + QUANTILE_ALPHA) / (1 - QUANTILE_ALPHA)
+_KEY_MIN = int(np.floor(np.log(QUANTILE_MIN) / np.log(_GAMMA)))
+_KEY_MAX = int(np.ceil(np.log(QUANTILE_MAX) / np.log(_GAMMA)))
+N_BUCKETS = _KEY_MAX - _KEY_MIN + 2          # bucket 0 holds zeros
+
+
+def quantile_counts(values, groups, n_groups):
+    """(n_groups, N_BUCKETS) bucket counts for non-negative values."""
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        keys = np.ceil(np.log(np.clip(values, QUANTILE_MIN, QUANTILE_MAX)) / np.log(_GAMMA))
+    buckets = np.where(values <= 0, 0, keys.astype(np.int64) - _KEY_MIN + 1)
+
+    counts = np.zeros((n_groups, N_BUCKETS), dtype=np.int64)
+    np.add.at(counts, (groups, buckets), 1)
+    return counts
+
+
+def quantile_values(counts, q):
+    """Value at quantile q (0-1) for every row of bucket counts (NaN for empty rows)."""
+    counts = np.atleast_2d(counts)
+    total = counts.sum(axis=1)
+    cum = np.cumsum(counts, axis=1)
+    rank = np.ceil(q * total).clip(min=1)
+    bucket = np.argmax(cum >= rank[:, None], axis=1)
+
+    # Bucket midpoint in the relative-error sense: 2 * gamma**k / (gamma + 1)
+    key = bucket + _KEY_MIN - 1
+    values = np.where(bucket == 0, 0.0, 2 * np.power(_GAMMA, key) / (_GAMMA + 1))
+    return np.where(total > 0, values, np.nan)
+
+
+def build_quantiles(frame, value_col):
+    """
+    Quantile sketch of one ratio column per (state, district).
+    Returns {'index': DataFrame of groups, 'counts': (n_groups, N_BUCKETS) array}.
+    """
+    frame = frame[np.isfinite(frame[value_col])]
+    group_ids, index = pd.factorize(pd.MultiIndex.from_frame(frame[QUANTILE_GROUP]), sort=True)
+    return {
+        'index': index.to_frame(index=False, name=QUANTILE_GROUP),
+        'counts': quantile_counts(frame[value_col].to_numpy(), group_ids, len(index)),
+    }
+
+
+def merge_quantiles(a, b):
+    """Combines two quantile sketches (e.g. the archive and a newly ingested file)."""
+    index = pd.concat([a['index'], b['index']], ignore_index=True)
+    group_ids, merged_index = pd.factorize(pd.MultiIndex.from_frame(index), sort=True)
+    counts = np.zeros((len(merged_index), N_BUCKETS), dtype=np.int64)
+    np.add.at(counts, group_ids, np.vstack([a['counts'], b['counts']]))
+    return {'index': merged_index.to_frame(index=False, name=QUANTILE_GROUP), 'counts': counts}
+
+
+def subtract_quantiles(a, b):
+    """Takes b's counts back out of a (b must be part of a); groups left empty are dropped."""
+    merged = merge_quantiles(a, {'index': b['index'], 'counts': -b['counts']})
+    left = merged['counts'].any(axis=1)
+    return {'index': merged['index'][left].reset_index(drop=True), 'counts': merged['counts'][left]}
+
+
+def sketch_quantile(sketch, q, by=None, state=None):
+    """
+    Quantile q of the sketched ratio.
+    by: None for the whole country, 'state' or ['state', 'district'] for one value per group.
+    """
+    index = sketch['index']
+    mask = np.ones(len(index), dtype=bool)
+    if state is not None:
+        mask &= (index['state'] == state).to_numpy()
+
+    counts = sketch['counts'][mask]
+    if by is None:
+        return float(quantile_values(counts.sum(axis=0), q)[0])
+
+    labels = index[by].to_numpy() if isinstance(by, str) else pd.MultiIndex.from_frame(index[by])
+    codes, uniques = pd.factorize(labels[mask])
+    merged = np.zeros((len(uniques), N_BUCKETS), dtype=np.int64)
+    np.add.at(merged, codes, counts)
+    return pd.Series(quantile_values(merged, q), index=uniques)
@@ -0,0 +1,195 @@
+"""Goal: Find phantom clusters spread over several NEIGHBOURING PIN codes, each under the per-PIN spike threshold.
+
+A Kulldorff-style space-time scan. A candidate cluster is a cylinder:
+- a region: a PIN code and its k nearest neighbours (k = 0..SCAN_NEIGHBOURS), where
+  "nearest" is by centroid distance when a pincode_centroids.csv is available, otherwise
+  by PIN number within the same 3-digit sorting district (PIN prefix adjacency),
+- crossed with a time window of 1..SCAN_WINDOW consecutive periods of the time pyramid.
+Its observed count is compared with the count expected if activity were spread over areas
+and periods independently (region total x window total / grand total), by the Poisson
+log-likelihood ratio. Every cylinder is evaluated, but never enumerated one by one: region
+series are cumulative sums grown one neighbour at a time for all centres at once, so each
+(k, window length) step is one vectorized array operation over (centres x window starts).
+p-values come from SCAN_REPLICATES Monte Carlo datasets with the same area and period
+totals (scanned in parallel); the most likely clusters without shared PIN codes are reported.
+
+Usage: python spacetime.py (writes Output/spacetime/clusters.csv)"""
+
+import os
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.special import xlogy
+from sklearn.neighbors import BallTree
+from ingest import SOURCES, OUTPUT_DIR
+from rollups import load_rollups
+
+SCAN_MEASURE = 'demo_age_17_'
+SCAN_RESOLUTION = 'week'    # pyramid level the time windows are made of
+SCAN_WINDOW = 4             # longest window, in periods
+SCAN_NEIGHBOURS = 8         # largest region = a PIN + this many neighbours
+SCAN_REPLICATES = 99        # Monte Carlo datasets for the p-values (0 = skip)
+SCAN_SEED = 42
+SCAN_WORKERS = -1           # processes for the replicates (-1 = all cores)
+TOP_N = 10
+PINCODE_FILE = 'pincode_centroids.csv'   # columns: pincode, latitude, longitude (optional)
+FREQUENCIES = {'day': 'D', 'week': '7D', 'month': 'MS'}
+
+
+# --- 1. INPUTS ---
+
+def count_matrix(pyramid, measure=SCAN_MEASURE, resolution=SCAN_RESOLUTION):
+    """(pincodes, periods, (pins x periods) int64 counts) over a gap-free period axis."""
+    source = next(s for s, spec in SOURCES.items() if measure in spec['measures'])
+    level = pyramid['levels'][resolution]
+    series = level.loc[level[f'n_{source}'] > 0, measure].unstack('period', fill_value=0)
+    periods = pd.date_range(series.columns.min(), series.columns.max(), freq=FREQUENCIES[resolution])
+    series = series.reindex(columns=periods, fill_value=0)
+    return series.index.to_numpy(), periods, series.to_numpy(dtype=np.int64)
+
+
+def neighbour_matrix(pincodes, k=SCAN_NEIGHBOURS, centroids=None):
+    """
+    (pins x k + 1) positions into `pincodes`: each PIN itself, then its k nearest
+    neighbours; -1 where a PIN has fewer. centroids: DataFrame(pincode, latitude, longitude);
+    PINs without a centroid keep only themselves.
+    """
+    n = len(pincodes)
+    nbrs = np.full((n, k + 1), -1, dtype=np.int64)
+    nbrs[:, 0] = np.arange(n)
+    if centroids is not None:
+        points = centroids.groupby('pincode')[['latitude', 'longitude']].mean().reindex(pincodes)
+        located = np.flatnonzero(points['latitude'].notna().to_numpy())
+        coords = np.radians(points.iloc[located].to_numpy())
+        kk = min(k + 1, len(located))
+        if kk:
+            _, idx = BallTree(coords, metric='haversine').query(coords, k=kk)
+            nbrs[located, :kk] = located[idx]
+        return nbrs
+
+    # Prefix adjacency: within a sorting district, the numerically closest PIN codes
+    district = pincodes // 1000
+    for members in pd.Series(np.arange(n)).groupby(district).indices.values():
+        gap = np.abs(pincodes[members][:, None] - pincodes[members][None, :])
+        order = np.argsort(gap, axis=1, kind='stable')[:, :k + 1]
+        nbrs[members, :order.shape[1]] = members[order]
+    return nbrs
+
+
+# --- 2. SCAN ---
+
+def poisson_llr(observed, expected, total):
+    """Kulldorff's Poisson log-likelihood ratio, 0 where the cylinder is not in excess."""
+    expected = np.broadcast_to(expected, observed.shape)
+    excess = observed > expected
+    o, e = observed[excess], expected[excess]
+    llr = np.zeros(observed.shape)
+    # Logs only for the cylinders in excess (usually a minority)
+    llr[excess] = xlogy(o, o / e) + xlogy(total - o, (total - o) / np.maximum(total - e, 1e-12))
+    return llr
+
+
+def scan(counts, nbrs, max_window=SCAN_WINDOW):
+    """
+    Best cylinder per (centre, region size): (llr, start, length) arrays of shape
+    (pins x regions). Regions grow one neighbour at a time on the cumulative sums.
+    """
+    n, T = counts.shape
+    total = counts.sum()
+    cum = np.zeros((n, T + 1))
+    np.cumsum(counts, axis=1, out=cum[:, 1:])
+    overall = np.concatenate([[0], np.cumsum(counts.sum(axis=0))])
+
+    shape = nbrs.shape
+    best = np.zeros(shape)
+    start = np.zeros(shape, dtype=np.int64)
+    length = np.zeros(shape, dtype=np.int64)
+    region = np.zeros_like(cum)
+    rows = np.arange(n)
+    for k in range(shape[1]):
+        valid = nbrs[:, k] >= 0
+        region[valid] += cum[nbrs[valid, k]]
+        for w in range(1, min(max_window, T) + 1):
+            observed = region[:, w:] - region[:, :-w]                          # centres x starts
+            expected = region[:, -1:] * (overall[w:] - overall[:-w]) / total
+            llr = poisson_llr(observed, expected, total)
+            j = llr.argmax(axis=1)
+            value = np.where(valid, llr[rows, j], 0.0)
+            better = value > best[:, k]
+            best[better, k], start[better, k], length[better, k] = value[better], j[better], w
+    return best, start, length
+
+
+def replicate_max(p, total, shape, nbrs, max_window, seed):
+    """Highest LLR of one Monte Carlo dataset (cell probabilities p, `total` counts)."""
+    simulated = np.random.default_rng(seed).multinomial(total, p).reshape(shape)
+    return scan(simulated, nbrs, max_window)[0].max()
+
+
+def replicate_maxima(counts, nbrs, max_window, replicates, seed=SCAN_SEED):
+    """
+    Highest LLR of each Monte Carlo dataset drawn with the observed area and period margins,
+    across SCAN_WORKERS processes (independent seeds: same result for any worker count).
+    """
+    total = int(counts.sum())
+    p = np.outer(counts.sum(axis=1), counts.sum(axis=0)).ravel() / total ** 2
+    seeds = np.random.SeedSequence(seed).spawn(replicates)
+    return np.array(Parallel(n_jobs=SCAN_WORKERS)(
+        delayed(replicate_max)(p, total, counts.shape, nbrs, max_window, s) for s in seeds))
+
+
+def cluster_scan(pyramid, measure=SCAN_MEASURE, resolution=SCAN_RESOLUTION, max_window=SCAN_WINDOW,
+                 neighbours=SCAN_NEIGHBOURS, replicates=SCAN_REPLICATES, top_n=TOP_N, centroids=None):
+    """The top_n most likely space-time clusters without shared PIN codes, most likely first."""
+    pincodes, periods, counts = count_matrix(pyramid, measure, resolution)
+    nbrs = neighbour_matrix(pincodes, neighbours, centroids)
+    best, start, length = scan(counts, nbrs, max_window)
+    maxima = replicate_maxima(counts, nbrs, max_window, replicates) if replicates else None
+
+    total = counts.sum()
+    cum = np.concatenate([np.zeros((len(pincodes), 1)), np.cumsum(counts, axis=1)], axis=1)
+    overall = np.concatenate([[0], np.cumsum(counts.sum(axis=0))])
+    taken, rows = set(), []
+    for flat in np.argsort(best, axis=None)[::-1]:
+        centre, k = np.unravel_index(flat, best.shape)
+        if len(rows) == top_n or best[centre, k] <= 0:
+            break
+        members = nbrs[centre, :k + 1]
+        members = members[members >= 0]
+        if taken.intersection(members.tolist()):
+            continue
+        taken.update(members.tolist())
+        s, w = start[centre, k], length[centre, k]
+        observed = (cum[members, s + w] - cum[members, s]).sum()
+        expected = cum[members, -1].sum() * (overall[s + w] - overall[s]) / total
+        rows.append({
+            'centre': pincodes[centre],
+            'pincodes': ','.join(map(str, sorted(pincodes[members]))),
+            'n_pincodes': len(members),
+            'start': periods[s],
+            'end': periods[s + w - 1],
+            'observed': int(observed),
+            'expected': round(expected, 1),
+            'obs_exp': round(observed / expected, 2),
+            'llr': round(best[centre, k], 2),
+            'p_value': (1 + (maxima >= best[centre, k]).sum()) / (1 + replicates) if replicates else np.nan,
+        })
+    return pd.DataFrame(rows, columns=['centre', 'pincodes', 'n_pincodes', 'start', 'end', 'observed',
+                                       'expected', 'obs_exp', 'llr', 'p_value'])
+
+
+def load_centroids(path=PINCODE_FILE):
+    """The PIN centroid table if it is present (centroid adjacency), else None (prefix adjacency)."""
+    if not os.path.exists(path):
+        return None
+    table = pd.read_excel(path) if path.endswith('.xlsx') else pd.read_csv(path)
+    return table[['pincode', 'latitude', 'longitude']].dropna()
+
+
+if __name__ == "__main__":
+    clusters = cluster_scan(load_rollups()['pyramid'], centroids=load_centroids())
+    out = os.path.join(OUTPUT_DIR, 'spacetime', 'clusters.csv')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    clusters.to_csv(out, index=False)
+    print(f"--- TOP {TOP_N} SPACE-TIME CLUSTERS ({SCAN_MEASURE}, {SCAN_RESOLUTION} windows) ---")
+    print(clusters.to_string(index=False))
@@ -0,0 +1,187 @@
+"""Goal: Ranking analyses as small declarative specs, run together in fused passes.
+
+Most scripts are the same pipeline: read columns -> filter -> group and sum -> ratio ->
+floor -> top N. A spec states only those choices:
+
+    'late': {
+        'columns': ['age_18_greater'],        # measures summed per group
+        'by': 'pincode', 'level': 6,          # group keys ('pincode' + prefix level, or columns)
+        'present': ['n_enrolment'],           # keep groups with rows in these sources
+        'where': [('state', '==', 'Gujarat')],# row filters (pushed down, before grouping)
+        'window': (None, None),               # date window (inclusive, None = open)
+        'ratios': {'score': ('a', 'b', 1)},   # score = a / (b + 1), on the group totals
+        'floors': {'a': 1000},                # keep groups with a > 1000
+        'rank': 'age_18_greater', 'ascending': False, 'top': 15,
+    }
+
+run_specs() plans every spec it is given together:
+- one scan per (window, row filters): PIN-level specs without row filters read the per-PIN
+  window totals from the rollup prefix sums (timeindex.py) instead of the daily rows, and
+  each distinct filter mask is evaluated once,
+- one groupby per (scan, group keys), summing the union of the columns its specs need,
+- top N by np.argpartition on the ranking column, then a sort of only those N rows.
+
+Usage: python specs.py (runs every spec in SPECS and writes Output/specs/<name>.csv)"""
+
+import os
+import operator
+import numpy as np
+import pandas as pd
+from ingest import OUTPUT_DIR
+from rollups import load_rollups, prefix_label, time_index
+from timeindex import range_totals
+
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '>': operator.gt, '>=': operator.ge,
+             '<': operator.lt, '<=': operator.le, 'in': lambda col, values: col.isin(values)}
+
+# The rollup-based rankings of the analysis scripts, with their default parameters
+SPECS = {
+    'late': {
+        'columns': ['age_18_greater'], 'by': 'pincode', 'level': 6, 'present': ['n_enrolment'],
+        'rank': 'age_18_greater', 'top': 15,
+    },
+    'migrant_hubs': {
+        'columns': ['demo_age_17_', 'age_18_greater'], 'by': 'pincode', 'level': 6,
+        'present': ['n_demographic', 'n_enrolment'],
+        'ratios': {'migration_ratio': ('demo_age_17_', 'age_18_greater', 1)},
+        'rank': 'migration_ratio', 'top': 10,
+    },
+    'workforce_magnet': {
+        'columns': ['demo_age_17_', 'age_18_greater'], 'by': 'pincode', 'level': 6,
+        'present': ['n_demographic', 'n_enrolment'],
+        'ratios': {'migration_score': ('demo_age_17_', 'age_18_greater', 1)},
+        'floors': {'demo_age_17_': 1000},
+        'rank': 'migration_score', 'top': 10,
+    },
+    'demographic_drift': {
+        'columns': ['demo_age_17_', 'bio_age_5_17'], 'by': 'pincode', 'level': 6,
+        'present': ['n_demographic', 'n_biometric'],
+        'ratios': {'drift_score': ('demo_age_17_', 'bio_age_5_17', 1)},
+        'floors': {'demo_age_17_': 100},
+        'rank': 'drift_score', 'top': 10,
+    },
+    'biometric_friction': {
+        'columns': ['bio_age_17_'], 'by': ['state', 'district'], 'present': ['n_biometric'],
+        'rank': 'bio_age_17_', 'top': 10,
+    },
+}
+
+
+# --- 1. PLAN ---
+
+def _group_keys(spec):
+    by = spec['by']
+    return (by, spec.get('level', 6)) if by == 'pincode' else (tuple(by), None)
+
+
+def _scan_key(spec):
+    window = tuple(spec.get('window') or (None, None))
+    where = tuple((col, op, tuple(value) if op == 'in' else value) for col, op, value in spec.get('where', ()))
+    # The prefix sums are per PIN code: other group keys read the daily rows
+    return window, where, not where and spec['by'] == 'pincode'
+
+
+def _needed(spec):
+    cols = list(spec['columns']) + list(spec.get('present', []))
+    for num, den, _ in spec.get('ratios', {}).values():
+        cols += [num, den]
+    return cols
+
+
+# --- 2. EXECUTE ---
+
+def _scan(rollups, window, where, per_pin, masks, data_dir):
+    """The rows one group of specs reads: per-PIN window totals, or filtered daily rows."""
+    start, end = window
+    if per_pin:
+        return range_totals(time_index(rollups, data_dir), start, end)
+
+    daily = rollups['daily']
+    mask = np.ones(len(daily), dtype=bool)
+    if start is not None:
+        mask &= (daily['date'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (daily['date'] <= pd.Timestamp(end)).to_numpy()
+    for col, op, value in where:
+        # Same predicate in several scans -> evaluated once
+        key = (col, op, value)
+        if key not in masks:
+            masks[key] = OPERATORS[op](daily[col], value).to_numpy()
+        mask &= masks[key]
+    return daily[mask]
+
+
+def _group(rows, keys, columns):
+    """One groupby summing `columns` for every spec sharing this scan and these keys."""
+    by, level = keys
+    if by == 'pincode':
+        totals = rows.groupby(rows['pincode'].to_numpy() // 10 ** (6 - level))[columns].sum()
+        totals.index.name = 'prefix'
+        return totals.reset_index()
+    return rows.groupby(list(by))[columns].sum().reset_index()
+
+
+def top_rows(table, column, n, ascending=False):
+    """The n rows with the largest (smallest) `column`, in order, without a full sort."""
+    table = table[table[column].notna()]
+    if n is None or n >= len(table):
+        return table.sort_values(column, ascending=ascending, kind='stable')
+    values = table[column].to_numpy(dtype=float)
+    values = values if ascending else -values
+    picked = np.argpartition(values, n - 1)[:n]
+    picked = picked[np.argsort(values[picked], kind='stable')]
+    return table.iloc[picked]
+
+
+def finish(spec, grouped):
+    """Presence, ratios, floors and top N of one spec on its shared group totals."""
+    table = grouped
+    for col in spec.get('present', []):
+        table = table[table[col] > 0]
+    by, level = _group_keys(spec)
+    if by == 'pincode':
+        keys = ['pincode']
+        table = table.assign(pincode=prefix_label(table['prefix'], level))
+    else:
+        keys = list(by)
+    table = table[keys + list(spec['columns'])].copy()
+    for name, (num, den, offset) in spec.get('ratios', {}).items():
+        table[name] = table[num] / (table[den] + offset)
+    for col, floor in spec.get('floors', {}).items():
+        table = table[table[col] > floor]
+    return top_rows(table, spec['rank'], spec.get('top'), spec.get('ascending', False)).reset_index(drop=True)
+
+
+def run_specs(specs, rollups=None, data_dir='.'):
+    """
+    Runs {name: spec} in one plan (see module docstring) and returns {name: ranked table}.
+    Pincode-level results keep the 'pincode' label column of prefix_table().
+    """
+    rollups = rollups or load_rollups(data_dir)
+    plan = {}
+    for name, spec in specs.items():
+        group = plan.setdefault(_scan_key(spec), {}).setdefault(_group_keys(spec), {'specs': [], 'columns': []})
+        group['specs'].append(name)
+        group['columns'] = list(dict.fromkeys(group['columns'] + _needed(spec)))
+
+    masks, results = {}, {}
+    for (window, where, per_pin), groups in plan.items():
+        rows = _scan(rollups, window, where, per_pin, masks, data_dir)
+        for keys, group in groups.items():
+            grouped = _group(rows, keys, group['columns'])
+            for name in group['specs']:
+                results[name] = finish(specs[name], grouped)
+    return {name: results[name] for name in specs}
+
+
+def run_spec(spec, rollups=None, data_dir='.'):
+    return run_specs({'spec': spec}, rollups, data_dir)['spec']
+
+
+if __name__ == "__main__":
+    out_dir = os.path.join(OUTPUT_DIR, 'specs')
+    os.makedirs(out_dir, exist_ok=True)
+    for name, table in run_specs(SPECS).items():
+        table.to_csv(os.path.join(out_dir, f'{name}.csv'), index=False)
+        print(f"--- {name.upper()} (top {SPECS[name]['top']}) ---")
+        print(table.to_string(index=False))
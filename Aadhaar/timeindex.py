@@ -0,0 +1,68 @@
+"""Goal: Totals over ANY date range per PIN code without touching the daily rows again.
+
+The rollups keep, for every PIN code and every measure, the running total over the dates
+present in the data (a prefix sum). The total between two dates is then
+cumsum[after end] - cumsum[before start]: two row lookups and one subtraction for all PIN
+codes at once, so ranking every PIN code over a window costs milliseconds. Only dates that
+occur in the data are on the axis; a window boundary between them is found by binary search.
+
+The grid is dense (measures x dates x PIN codes), so it is not part of rollups.pkl: it is a
+.npy file next to it, memory-mapped by rollups.time_index() on first use (only the two date
+rows a window needs are ever read)."""
+
+import numpy as np
+import pandas as pd
+
+def time_axes(daily, measures, cumsum=None):
+    """
+    The index around a prefix-sum grid: {'index': DataFrame of PIN codes, 'dates':
+    DatetimeIndex, 'measures': list, 'cumsum': (measures x dates + 1 x PIN codes) array}.
+    Both axes are the sorted distinct values of the daily table.
+    """
+    pincodes = np.sort(daily['pincode'].unique())
+    dates = pd.DatetimeIndex(np.sort(daily['date'].unique()))
+    return {
+        'index': pd.DataFrame({'pincode': pincodes}),
+        'dates': dates,
+        'measures': list(measures),
+        'cumsum': cumsum,
+    }
+
+
+def build_time_index(daily, measures):
+    """Prefix sums of `measures` per PIN code over the sorted distinct dates of the daily table."""
+    index = time_axes(daily, measures)
+    pin_ids = np.searchsorted(index['index']['pincode'].to_numpy(), daily['pincode'].to_numpy())
+    date_ids = index['dates'].searchsorted(daily['date'])
+    n_pins, n_rows = len(index['index']), len(index['dates']) + 1
+
+    values = daily[measures].to_numpy(dtype=np.int64)
+    # int32 whenever even the archive-wide totals fit (halves the file)
+    dtype = np.int32 if values.sum(axis=0).max(initial=0) < 2 ** 31 else np.int64
+    grid = np.zeros((len(measures), n_rows, n_pins), dtype=dtype)
+    # Several daily rows can share a (PIN code, date) (district spellings): sum them
+    cells = (date_ids + 1) * n_pins + pin_ids
+    for m in range(len(measures)):
+        grid[m] = np.bincount(cells, weights=values[:, m], minlength=n_rows * n_pins).reshape(n_rows, n_pins)
+    np.cumsum(grid, axis=1, out=grid)
+    index['cumsum'] = grid
+    return index
+
+
+def date_bounds(time_index, start=None, end=None):
+    """Rows of the prefix-sum axis bracketing [start, end] (inclusive; None = open)."""
+    dates = time_index['dates']
+    lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start), side='left')
+    hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side='right')
+    return lo, max(lo, hi)
+
+
+def range_totals(time_index, start=None, end=None, measures=None):
+    """Totals of `measures` (default: all) per PIN code between start and end, inclusive."""
+    measures = time_index['measures'] if measures is None else list(measures)
+    lo, hi = date_bounds(time_index, start, end)
+    rows = [time_index['measures'].index(m) for m in measures]
+    # Only the two bracketing date rows are read (cheap on a memory-mapped grid)
+    ends = time_index['cumsum'][:, [lo, hi]][rows]
+    totals = (ends[:, 1].astype(np.int64) - ends[:, 0]).T
+    return pd.concat([time_index['index'], pd.DataFrame(totals, columns=measures)], axis=1)
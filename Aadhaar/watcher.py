@@ -0,0 +1,270 @@
+"""Goal: Keep the rollups and alerts current by themselves - no one has to notice a new workbook.
+
+A long-running asyncio loop polls the three data folders every POLL_SECONDS. When a workbook
+is added, changed or removed (and its size has stopped changing, so half-copied files are
+skipped), it is:
+1. parsed and validated in a process pool (run_in_executor - the loop never blocks),
+2. deduplicated against the other workbooks of its source (same ownership index as ingest),
+3. applied to the daily table as a delta: the file's old contribution out, the new one in
+   (no other workbook is read). New workbooks are added to the rollup store the same way:
+   their totals added to prefix and cohorts, their sketches merged into hll and quantiles.
+   A batch that takes rows out (a removed or rewritten workbook) re-derives the store from
+   the daily table instead, since distinct-PIN sketches cannot be subtracted,
+4. checked against the spike rule (day, ISO week and month, on the time pyramid that is
+   updated with the same delta) and the compliance rule for ONLY the PIN codes and districts
+   the file touched. New alerts are printed and appended to Output/watcher/alerts.csv; an
+   alert is raised once per (rule, where, period), however its detail figures move later.
+A file counts as applied only once the store holding it is saved. At start every workbook
+is parsed in one batch and the saved store is reused if it matches the workbooks.
+
+Usage: python watcher.py (from the folder holding the data folders; Ctrl+C to stop)"""
+
+import os
+import asyncio
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from ingest import (SOURCES, KEY_COLUMNS, OUTPUT_DIR, validate_frame, file_id, row_fingerprints,
+                    dedup_mask, source_files)
+from readers import read_workbook
+from rollups import (MEASURES, ROW_COUNTS, data_manifest, daily_ratios, rollups_from_daily, update_rollups,
+                     cached_rollups, save_rollups)
+from pyramid import build_pyramid, update_pyramid, scan_spikes
+
+POLL_SECONDS = 1.0
+PARSE_WORKERS = os.cpu_count()
+
+# Spike rule: same thresholds as phantom_cluster.py
+SPIKE_MULTIPLIER = 5        # PIN period > 5x the PIN's average period = spike
+MIN_AVG_UPDATES = 50        # ignore PINs with tiny baselines (per month, scaled for weeks / days)
+# Compliance rule: the watcher's own alert floor (agegap_compliance.py only draws guidance
+# zones). The ratio is child_compliance_ratio as the rollups define it (daily_ratios: per
+# daily key sum), not agegap's mean over raw workbook rows.
+COMPLIANCE_FLOOR = 0.5      # district avg (bio 5-17 / bio 17+) below this = compliance alert
+
+
+# --- 1. PARSING (runs in the worker processes) ---
+
+def parse_workbook(source, path, data_dir='.'):
+    """Validated rows of one workbook (bad rows go to quarantine, as in load_source)."""
+    measures = SOURCES[source]['measures']
+    frame = read_workbook(path, KEY_COLUMNS + measures, numeric=['pincode'] + measures)
+    clean, bad, _ = validate_frame(frame, measures)
+    if len(bad):
+        folder = os.path.join(data_dir, OUTPUT_DIR, 'quarantine', source)
+        os.makedirs(folder, exist_ok=True)
+        bad.to_csv(os.path.join(folder, os.path.splitext(os.path.basename(path))[0] + '.csv'), index=False)
+    return clean
+
+
+# --- 2. RULES (evaluated for the affected keys only) ---
+
+def spike_alerts(pyramid, pincodes):
+    """phantom_cluster's rule on the given PIN codes at every resolution of the time pyramid."""
+    hits = scan_spikes(pyramid, 'demo_age_17_', SPIKE_MULTIPLIER, MIN_AVG_UPDATES, pincodes=pincodes)
+    return [('spike', f'PIN {pin}', f'{resolution} of {period:%Y-%m-%d}',
+             f'{value} adult demographic updates vs {avg:.0f} avg/{resolution}')
+            for resolution, pin, period, value, avg in hits[['resolution', 'pincode', 'period', 'value', 'avg']].itertuples(index=False)]
+
+
+def compliance_alerts(daily, districts):
+    """District average of the rollups' child_compliance_ratio on the given (state, district) pairs."""
+    keys = pd.MultiIndex.from_arrays([daily.index.get_level_values('state'), daily.index.get_level_values('district')])
+    rows = daily_ratios(daily[keys.isin(districts)])['child_compliance_ratio']
+    if rows.empty:
+        return []
+    ratio = rows['child_compliance_ratio'].groupby(level=['state', 'district']).mean()
+    low = ratio[ratio < COMPLIANCE_FLOOR]
+    return [('compliance', f'{district} ({state})', '', f'avg child compliance ratio {value:.2f}')
+            for (state, district), value in low.items()]
+
+
+# --- 3. WATCHER ---
+
+class Watcher:
+    """Holds the per-file state; every public step is a coroutine on one event loop."""
+
+    def __init__(self, data_dir='.'):
+        self.data_dir = data_dir
+        self.pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        self.clean = {}       # path -> validated rows (before dedup), kept to redo dedup without re-parsing
+        self.parts = {}       # path -> that file's contribution to the daily table
+        self.daily = pd.DataFrame(columns=MEASURES + ROW_COUNTS,
+                                  index=pd.MultiIndex.from_arrays([[]] * 4, names=KEY_COLUMNS))
+        self.pyramid = None   # day / week / month totals per PIN, built at start, then updated by deltas
+        self.rollups = None   # the saved store (None while the daily table is ahead of it)
+        self.seen = {}        # manifest of the files in the saved store
+        self.failed = {}      # path -> (size, mtime) of a version whose refresh failed
+        self.alerts = set()   # (rule, where, period) of the alerts already raised
+        self.alert_file = os.path.join(data_dir, OUTPUT_DIR, 'watcher', 'alerts.csv')
+
+    def source_of(self, rel_path):
+        folder = rel_path.split(os.sep)[0]
+        return next(s for s, spec in SOURCES.items() if spec['folder'] == folder)
+
+    async def parse(self, rel_paths):
+        """Parses workbooks concurrently in the process pool."""
+        loop = asyncio.get_running_loop()
+        jobs = [loop.run_in_executor(self.pool, parse_workbook, self.source_of(p),
+                                     os.path.join(self.data_dir, p), self.data_dir) for p in rel_paths]
+        for rel_path, clean in zip(rel_paths, await asyncio.gather(*jobs)):
+            self.clean[rel_path] = clean
+
+    def contributions(self, source, rel_paths):
+        """The rows each file owns (one dedup pass, shared index with ingest), summed to KEY_COLUMNS."""
+        frames = [self.clean[p] for p in rel_paths]
+        ids = np.array([file_id(p) for p in rel_paths], dtype=np.uint64)
+        owners = np.repeat(ids, [len(f) for f in frames])
+        clean = pd.concat(frames, ignore_index=True)
+        live = np.array([file_id(f) for f in source_files(source, self.data_dir)], dtype=np.uint64)
+        index_path = os.path.join(self.data_dir, OUTPUT_DIR, 'dedup', f'{source}.npz')
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        keep = dedup_mask(row_fingerprints(clean), owners, index_path, live)
+        rows = clean[keep].assign(**{f'n_{source}': 1})
+        columns = SOURCES[source]['measures'] + [f'n_{source}']
+        return {p: rows[owners[keep] == i].groupby(KEY_COLUMNS)[columns].sum() for p, i in zip(rel_paths, ids)}
+
+    def apply(self, parts, removed=()):
+        """Replaces the old contributions of the files with `parts` (none for removed ones). Returns the touched keys."""
+        old = [self.parts.pop(p) for p in [*parts, *removed] if p in self.parts]
+        for rel_path in removed:
+            self.clean.pop(rel_path, None)
+        self.parts.update(parts)
+        change = [*parts.values(), *(-o for o in old)]
+        if not change:
+            return pd.MultiIndex.from_arrays([[]] * 4, names=KEY_COLUMNS)
+
+        delta = pd.concat(change).reindex(columns=MEASURES + ROW_COUNTS).fillna(0)
+        daily = self.daily.add(delta.groupby(level=KEY_COLUMNS).sum(), fill_value=0)
+        daily = daily.reindex(columns=MEASURES + ROW_COUNTS).fillna(0)
+        self.daily = daily[(daily[ROW_COUNTS] > 0).any(axis=1)].astype('int64')
+        # Same delta for the time pyramid: the new rows in, the old rows out
+        if self.pyramid is not None:
+            update_pyramid(self.pyramid, delta.reset_index())
+        return delta.index.unique()
+
+    async def refresh(self, changed, removed, current):
+        """Applies a batch of file events, re-evaluates the rules on the touched keys and saves the store."""
+        await self.parse(changed)
+        parts = {}
+        for source in SOURCES:
+            files = {p for p in changed if self.source_of(p) == source}
+            if any(self.source_of(p) == source for p in removed):
+                # Rows the other files lost to a removed file as duplicates come back
+                files |= {p for p in self.parts if self.source_of(p) == source and p not in removed}
+            if files:
+                parts.update(self.contributions(source, sorted(files)))
+        rows_out = self.rollups is None or bool(removed) or any(p in self.parts for p in parts)
+        before = self.daily
+        keys = self.apply(parts, removed)
+        store, self.rollups = self.rollups, None   # the daily table is ahead of the saved store until it is saved
+
+        if len(keys):
+            pins = keys.get_level_values('pincode').unique()
+            districts = pd.MultiIndex.from_arrays([keys.get_level_values('state'),
+                                                   keys.get_level_values('district')]).unique()
+            self.raise_alerts(spike_alerts(self.pyramid, pins) + compliance_alerts(self.daily, districts))
+
+        # Store for the analysis scripts, updated off the loop
+        manifest = {p: stat for p, stat in self.seen.items() if p not in removed}
+        manifest.update({p: current[p] for p in changed})
+        daily = self.daily.reset_index().sort_values(['pincode', 'date'], ignore_index=True)
+        if rows_out:
+            build = lambda: rollups_from_daily(daily, manifest, self.pyramid)
+        else:
+            added = pd.concat(parts.values()).reindex(columns=MEASURES + ROW_COUNTS).fillna(0).astype('int64')
+            old_rows = before[before.index.isin(keys)].reset_index()
+            new_rows = self.daily[self.daily.index.isin(keys)].reset_index()
+            build = lambda: update_rollups(store, daily, manifest, added.reset_index(), old_rows, new_rows,
+                                           self.pyramid)
+        loop = asyncio.get_running_loop()
+        rollups = await loop.run_in_executor(None, build)
+        await loop.run_in_executor(None, save_rollups, rollups, self.data_dir)
+        self.rollups = rollups
+        self.seen = manifest
+
+    def raise_alerts(self, alerts, quiet=False):
+        fresh = []
+        for alert in alerts:
+            if alert[:3] not in self.alerts:   # the detail (e.g. the rolling average) is not part of the identity
+                self.alerts.add(alert[:3])
+                fresh.append(alert)
+        if not fresh:
+            return
+        now = datetime.now().isoformat(timespec='seconds')
+        table = pd.DataFrame(fresh, columns=['rule', 'where', 'period', 'detail']).assign(time=now)
+        os.makedirs(os.path.dirname(self.alert_file), exist_ok=True)
+        table.to_csv(self.alert_file, mode='a', index=False, header=not os.path.exists(self.alert_file))
+        if quiet:
+            print(f"✔ {len(fresh)} existing alerts recorded")
+            return
+        for rule, where, period, detail in fresh:
+            print(f"🚨 [{now}] {rule.upper()}: {where} {period} - {detail}")
+
+    async def start(self):
+        """Initial load: every workbook parsed in parallel and applied in one batch, then the rules on everything."""
+        manifest = data_manifest(self.data_dir)
+        await self.parse(list(manifest))
+        parts = {}
+        for source in SOURCES:
+            files = sorted(p for p in manifest if self.source_of(p) == source)
+            if files:
+                parts.update(self.contributions(source, files))
+        self.apply(parts)
+        daily = self.daily
+
+        self.rollups = cached_rollups(self.data_dir, manifest)
+        if self.rollups is not None:
+            self.pyramid = self.rollups['pyramid']
+        else:
+            self.pyramid = build_pyramid(daily.reset_index(), MEASURES + ROW_COUNTS)
+            self.rollups = rollups_from_daily(daily.reset_index().sort_values(['pincode', 'date'], ignore_index=True),
+                                              manifest, self.pyramid)
+            await asyncio.get_running_loop().run_in_executor(None, save_rollups, self.rollups, self.data_dir)
+        self.seen = manifest
+        self.raise_alerts(spike_alerts(self.pyramid, daily.index.get_level_values('pincode').unique())
+                          + compliance_alerts(daily, pd.MultiIndex.from_arrays(
+                              [daily.index.get_level_values('state'), daily.index.get_level_values('district')]).unique()),
+                          quiet=True)
+        print(f"✔ Watching {', '.join(spec['folder'] for spec in SOURCES.values())} "
+              f"({len(manifest)} workbooks, {len(self.daily)} daily rows)")
+
+    async def run(self):
+        await self.start()
+        pending = {}   # files seen changing; applied once their (size, mtime) is stable for one poll
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            current = await asyncio.get_running_loop().run_in_executor(None, data_manifest, self.data_dir)
+            moving = {p: stat for p, stat in current.items()
+                      if self.seen.get(p) != stat and self.failed.get(p) != stat}
+            ready = [p for p, stat in moving.items() if pending.get(p) == stat]
+            pending = {p: stat for p, stat in moving.items() if p not in ready}
+            removed = [p for p in self.seen if p not in current]
+            if not ready and not removed:
+                continue
+
+            started = asyncio.get_running_loop().time()
+            try:
+                await self.refresh(ready, removed, current)
+            except Exception as exc:   # e.g. a corrupt workbook: report it, keep watching
+                if self.rollups is None:   # applied but not saved: the whole store is re-derived next poll
+                    print(f"⚠️  Refresh failed ({exc}); retried at the next poll")
+                else:
+                    self.failed.update({p: current[p] for p in ready})
+                    print(f"⚠️  Refresh failed ({exc}); the file is retried when it changes again")
+                continue
+            for p in ready:
+                self.failed.pop(p, None)
+            elapsed = asyncio.get_running_loop().time() - started
+            print(f"✔ {len(ready)} new/changed, {len(removed)} removed workbook(s) applied in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    watcher = Watcher()
+    try:
+        asyncio.run(watcher.run())
+    except KeyboardInterrupt:
+        print("Watcher stopped.")
+    finally:
+        watcher.pool.shutdown()
@@ -1,32 +1,55 @@
-"""Goal: Identify Labor Migration Hubs using the ratio of Updates vs. New Enrolments. Includes the Log-Scale Fix."""
+"""Goal: Identify Labor Migration Hubs using the ratio of Updates vs. New Enrolments. Includes the Log-Scale Fix.
 
-import pandas as pd
-import glob
+PREVIEW = True estimates the totals from a stratified sample of the workbooks (sampling.py)
+and reports each with a confidence interval - for quick threshold tuning, not final reports."""
+
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from rollups import prefix_label
+from specs import SPECS, run_spec, top_rows
+from sampling import preview_source, estimate_totals, with_interval
+
+LEVEL = 6  # PIN prefix level: 6 = PIN code, 3 = sorting district, 2 = sub-zone, 1 = zone
+PREVIEW = False  # True = sample-based estimates with CIs instead of the full archive
 
-# --- 1. LOAD DEMOGRAPHIC (Updates) ---
-files_demo = glob.glob('demographic_data/*.xlsx')
-df_demo = pd.concat([pd.read_excel(f, usecols=['pincode', 'demo_age_17_']) for f in files_demo])
-grouped_demo = df_demo.groupby('pincode')['demo_age_17_'].sum().reset_index()
 
-# --- 2. LOAD ENROLMENT (New Entries) ---
-files_enrol = glob.glob('enrolment_data/*.xlsx')
-df_enrol = pd.concat([pd.read_excel(f, usecols=['pincode', 'age_18_greater']) for f in files_enrol])
-grouped_enrol = df_enrol.groupby('pincode')['age_18_greater'].sum().reset_index()
+def preview_totals():
+    """Estimated Updates and New Enrolments per area, with standard errors and intervals."""
+    totals = []
+    for source, column in [('demographic', 'demo_age_17_'), ('enrolment', 'age_18_greater')]:
+        sample = preview_source(source, [column])
+        sample['rows']['prefix'] = sample['rows']['pincode'] // 10 ** (6 - LEVEL)
+        est = estimate_totals(sample, ['prefix'], column)
+        totals.append(est.rename(columns={'estimate': column, 'se': f'{column}_se',
+                                          'ci_low': f'{column}_ci_low', 'ci_high': f'{column}_ci_high'}))
+    # Areas sampled in both sources only (as in the full run)
+    merged = totals[0].join(totals[1], how='inner').reset_index()
+    merged.insert(0, 'pincode', prefix_label(merged.pop('prefix'), LEVEL))
+    return merged
 
-# --- 3. MERGE & CALCULATE MIGRATION SCORE ---
-merged = pd.merge(grouped_demo, grouped_enrol, on='pincode', how='inner')
 
-# Score = Updates / New Enrolments
-merged['migration_score'] = merged['demo_age_17_'] / (merged['age_18_greater'] + 1)
+# Areas present in both sources, Score = Updates / (New Enrolments + 1), only areas above the
+# volume floor (ignore tiny villages), top 10 (spec 'workforce_magnet' in specs.py)
+SPEC = dict(SPECS['workforce_magnet'], level=LEVEL)
 
-# Filter for statistically significant volume (ignore tiny villages)
-merged = merged[merged['demo_age_17_'] > 1000]
+if PREVIEW:
+    # --- 1 & 2. ESTIMATE DEMOGRAPHIC (Updates) + ENROLMENT (New Entries) FROM A SAMPLE ---
+    merged = preview_totals()
 
-# Get Top 10 Magnets
-top_magnets = merged.sort_values(by='migration_score', ascending=False).head(10)
-top_magnets['pincode'] = top_magnets['pincode'].astype(str)
+    # --- 3. CALCULATE MIGRATION SCORE ---
+    merged['migration_score'] = merged['demo_age_17_'] / (merged['age_18_greater'] + 1)
+    # Independent samples per source: delta-method error of the ratio
+    se = np.hypot(merged['demo_age_17__se'], merged['migration_score'] * merged['age_18_greater_se'])
+    merged['score_ci_low'], merged['score_ci_high'] = with_interval(merged['migration_score'],
+                                                                    se / (merged['age_18_greater'] + 1))
+    merged = merged[merged['demo_age_17_'] > SPEC['floors']['demo_age_17_']]
+    top_magnets = top_rows(merged, 'migration_score', SPEC['top'])
+    print("--- TOP 10 WORKFORCE MAGNETS (PREVIEW: estimated, with confidence intervals) ---")
+    print(top_magnets.round(1).to_string(index=False))
+else:
+    # --- 1, 2 & 3. PRE-AGGREGATED TOTALS FROM THE ROLLUPS -> MIGRATION SCORE -> TOP 10 MAGNETS ---
+    top_magnets = run_spec(SPEC)
 
 # --- 4. VISUALIZATION (With Log Scale) ---
 plt.figure(figsize=(12, 6))
@@ -37,10 +60,16 @@ sns.barplot(data=top_magnets, x='pincode', y='demo_age_17_', color='orange', lab
 # Bar 2: The Locals (New Enrolment)
 sns.barplot(data=top_magnets, x='pincode', y='age_18_greater', color='green', label='Locals (New Enrolments)')
 
+if PREVIEW:
+    # Confidence interval of the estimated Updates
+    updates = top_magnets['demo_age_17_']
+    plt.errorbar(x=np.arange(len(top_magnets)), y=updates, fmt='none', ecolor='black', capsize=4,
+                 yerr=[updates - top_magnets['demo_age_17__ci_low'], top_magnets['demo_age_17__ci_high'] - updates])
+
 # CRITICAL: LOG SCALE
 plt.yscale('log')
 
-plt.title('The "Workforce Magnet" Index (Log Scale)', fontsize=16)
+plt.title('The "Workforce Magnet" Index (Log Scale)' + (' - PREVIEW' if PREVIEW else ''), fontsize=16)
 plt.ylabel('Volume of People (Log Scale)', fontsize=12)
 plt.xlabel('PIN Code (Destination Hub)', fontsize=12)
 plt.legend()
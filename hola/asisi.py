@@ -1,8 +1,49 @@
+import os
+import json
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.preprocessing import MinMaxScaler
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.neighbors import NearestNeighbors
+
+# =============================================================================
+# SCORING CONFIGURATION
+# =============================================================================
+# The four stress components, in weight order. Saturation is inverted after scaling
+# (FEWER centers per 10k people = MORE stress).
+STRESS_COMPONENTS = ['Weighted_Load', 'Rejection_Rate', 'Recovery_Slope', 'Centers_Per_10k']
+INVERTED = np.array([False, False, False, True])
+
+# Load (35%) - Immediate pressure | Quality (25%) - Data integrity
+# Resilience (25%) - Can they handle it? | Saturation (15%) - Structural capacity
+DEFAULT_WEIGHTS = np.array([0.35, 0.25, 0.25, 0.15])
+
+# What-if weighting schemes compared against the default in the report
+WEIGHT_SCENARIOS = {
+    'Default': DEFAULT_WEIGHTS,
+    'Load First': [0.55, 0.15, 0.15, 0.15],
+    'Quality First': [0.20, 0.50, 0.15, 0.15],
+    'Resilience First': [0.20, 0.15, 0.50, 0.15],
+    'Capacity First': [0.20, 0.15, 0.15, 0.50],
+    'Equal': [0.25, 0.25, 0.25, 0.25],
+}
+
+# Score <= 0.45 -> GREEN, <= 0.7 -> YELLOW, above -> RED
+STATUS_CUTS = [0.45, 0.7]
+STATUS_LABELS = np.array(['GREEN (Stable)', 'YELLOW (Warning)', 'RED (Critical)'])
+
+# Monte Carlo uncertainty: how stable is each district's label under the simulated inputs?
+N_SIMULATIONS = 10000          # total draws
+SIM_WORKERS = os.cpu_count()   # processes (1 = run in this process)
+SIM_SEED = 42                  # root seed; every worker gets its own independent stream
+CONFIDENCE = 0.90              # width of the reported score interval
+
+# District name matching (census vs Aadhaar spellings)
+DISTRICT_MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output', 'district_mappings.json')
+MATCH_THRESHOLD = 0.6          # min cosine similarity of char n-grams to accept a fuzzy match
+MATCH_CANDIDATES = 5           # nearest census names checked for a same-state match
 
 # =============================================================================
 # PART 1: DATA INGESTION & SIMULATION (The "Mock" Layer)
@@ -32,7 +73,7 @@ def get_aadhaar_logs():
     # 1. Base Logs (What you have)
     data = {
         'state': ['JAMMU AND KASHMIR', 'JAMMU AND KASHMIR', 'MAHARASHTRA', 'UTTAR PRADESH', 'BIHAR', 'KARNATAKA', 'KERALA'],
-        'district': ['Kupwara', 'Badgam', 'Mumbai Suburban', 'Ghaziabad', 'Patna', 'Bangalore Urban', 'Wayanad'],
+        'district': ['Kupwara', 'Budgam', 'Mumbai Suburban', 'Ghaziabad', 'Patna', 'Bengaluru Urban', 'Wayanad'],
         'enrolment_volume': [150, 120, 4500, 1200, 2300, 3100, 400],
         'demo_update_volume': [400, 350, 8000, 3000, 5000, 7500, 600],
         'bio_update_volume': [200, 180, 2100, 900, 1500, 2200, 300],
@@ -73,6 +114,90 @@ def get_aadhaar_logs():
     df['history_7_days'] = historical_trends
     return df
 
+# =============================================================================
+# PART 1b: DISTRICT NAME MATCHING (Census <-> Aadhaar)
+# =============================================================================
+# Spellings differ between sources ("Bangalore Urban" vs "Bengaluru Urban", "Badgam" vs
+# "Budgam"). Names are matched once through a character n-gram TF-IDF index (all names in
+# one batched nearest-neighbour query, restricted to the same state), and every accepted
+# match is saved to DISTRICT_MAP_FILE. Later runs resolve known names with a dictionary
+# lookup; edit the file to fix or add a mapping by hand.
+
+def normalize_name(names):
+    """Lower-case, punctuation-free, single-spaced names (works on a Series)."""
+    return (names.str.lower().str.replace(r'[^a-z0-9 ]+', ' ', regex=True)
+            .str.replace(r'\s+', ' ', regex=True).str.strip())
+
+
+def load_district_map(path=DISTRICT_MAP_FILE):
+    """{'state|aadhaar district': 'state|census district'} of confirmed mappings."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_district_map(mapping, path=DISTRICT_MAP_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(mapping.items())), f, indent=2)
+
+
+def match_districts(census_keys, census_states, query_keys, query_states):
+    """
+    Nearest census name for every query name, in one batched query over a char n-gram
+    TF-IDF index. Only candidates from the same state are accepted (any state if the
+    query's state is not in the census). Returns (census positions or -1, similarity).
+    """
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 3)).fit(census_keys)
+    index = NearestNeighbors(n_neighbors=min(MATCH_CANDIDATES, len(census_keys)), metric='cosine')
+    index.fit(vectorizer.transform(census_keys))
+    distances, neighbors = index.kneighbors(vectorizer.transform(query_keys))
+
+    census_states = np.asarray(census_states)
+    query_states = np.asarray(query_states)
+    same_state = census_states[neighbors] == query_states[:, None]
+    known_state = np.isin(query_states, census_states)
+    allowed = same_state | ~known_state[:, None]
+
+    first = allowed.argmax(axis=1)                     # best allowed candidate per query
+    rows = np.arange(len(query_keys))
+    similarity = np.where(allowed[rows, first], 1 - distances[rows, first], 0.0)
+    match = np.where(similarity >= MATCH_THRESHOLD, neighbors[rows, first], -1)
+    return match, similarity
+
+
+def resolve_districts(df_census, df_aadhaar, path=DISTRICT_MAP_FILE):
+    """
+    Census row position for every Aadhaar row (-1 = unmatched). Exact and saved matches
+    are dictionary lookups; only the rest go through the fuzzy index, and what it
+    accepts is added to the saved mapping.
+    """
+    census_keys = (normalize_name(df_census['State name']) + '|' + normalize_name(df_census['District name'])).tolist()
+    query_keys = (normalize_name(df_aadhaar['state']) + '|' + normalize_name(df_aadhaar['district'])).tolist()
+    position = {key: i for i, key in enumerate(census_keys)}
+    mapping = load_district_map(path)
+
+    resolved = np.array([position.get(mapping.get(key, key), -1) for key in query_keys])
+    pending = np.flatnonzero(resolved < 0)
+    if len(pending):
+        split = lambda keys: [k.split('|', 1) for k in keys]
+        census_states, census_names = map(list, zip(*split(census_keys)))
+        query_states, query_names = map(list, zip(*split([query_keys[i] for i in pending])))
+        match, similarity = match_districts(census_names, census_states, query_names, query_states)
+
+        for i, m, sim in zip(pending, match, similarity):
+            name = f"{df_aadhaar['district'].iloc[i]} ({df_aadhaar['state'].iloc[i]})"
+            if m >= 0:
+                resolved[i] = m
+                mapping[query_keys[i]] = census_keys[m]
+                print(f"   Matched {name} -> {df_census['District name'].iloc[m]} (similarity {sim:.2f})")
+            else:
+                print(f"⚠️  No census district for {name} (best similarity {sim:.2f}); add it to {path}")
+        if (match >= 0).any():
+            save_district_map(mapping, path)
+    return resolved
+
 # =============================================================================
 # PART 2: THE ASISI ENGINE (The Logic Layer)
 # =============================================================================
@@ -92,9 +217,9 @@ def run_asisi_analysis():
     df_census['Est_Centers'] = (df_census['Pop_2025'] / np.random.randint(18000, 22000, len(df_census))).astype(int)
 
     # MERGE DATASETS
-    # Normalize names to ensure clean join
-    df_census['key'] = df_census['District name'].str.lower().str.strip()
-    df_aadhaar['key'] = df_aadhaar['district'].str.lower().str.strip()
+    # Resolve spelling differences first (saved mappings + fuzzy index), then join on the census row
+    df_census['key'] = np.arange(len(df_census))
+    df_aadhaar['key'] = resolve_districts(df_census, df_aadhaar)
     df = pd.merge(df_census, df_aadhaar, on='key', how='inner')
 
     print(">>> 4. calculating Core Metrics...")
@@ -119,59 +244,173 @@ def run_asisi_analysis():
     # We calculate the slope of the last 7 days.
     # Positive Slope (>0) = Backlog is building (BAD)
     # Negative Slope (<0) = Backlog is clearing (GOOD)
-    def get_slope(history_list):
-        days = np.array(range(len(history_list)))
-        loads = np.array(history_list)
-        # Linear regression (Polyfit degree 1)
-        slope, _ = np.polyfit(days, loads, 1)
-        return slope
-    
-    df['Recovery_Slope'] = df['history_7_days'].apply(get_slope)
+    df['Recovery_Slope'] = recovery_slopes(np.vstack(df['history_7_days'].to_numpy()))
 
     # 4.4 SATURATION (Centers per 10k people)
     df['Centers_Per_10k'] = (df['Est_Centers'] / df['Pop_2025']) * 10000
 
     print(">>> 5. Computing ASISI Score...")
     
-    scaler = MinMaxScaler()
-    
-    # Normalize Inputs (All scaled 0-1)
-    # 1. Load Stress (Higher is Worse)
-    s_load = scaler.fit_transform(df[['Weighted_Load']])
-    
-    # 2. Quality Stress (Higher Rejection is Worse)
-    s_quality = scaler.fit_transform(df[['Rejection_Rate']])
-    
-    # 3. Resilience Stress (Higher Slope is Worse/Building Backlog)
-    s_resilience = scaler.fit_transform(df[['Recovery_Slope']])
-    
-    # 4. Saturation Stress (LOWER centers is Worse, so we invert)
-    s_saturation = 1 - scaler.fit_transform(df[['Centers_Per_10k']])
-
-    # === THE ASISI FORMULA ===
-    # Weights: 
-    # Load (35%) - Immediate pressure
-    # Quality (25%) - Data integrity
-    # Resilience (25%) - Can they handle it?
-    # Saturation (15%) - Structural capacity
-    
-    df['ASISI_Score'] = (
-        (0.35 * s_load) + 
-        (0.25 * s_quality) + 
-        (0.25 * s_resilience) + 
-        (0.15 * s_saturation)
-    )
+    # Normalize all four inputs at once (0-1) and apply the ASISI weights
+    stress = stress_matrix(df)
+    df['ASISI_Score'] = score_scenarios(stress, DEFAULT_WEIGHTS)[:, 0]
 
     # Categorize
-    def get_status(x):
-        if x > 0.7: return 'RED (Critical)'
-        if x > 0.45: return 'YELLOW (Warning)'
-        return 'GREEN (Stable)'
-    
-    df['Status'] = df['ASISI_Score'].apply(get_status)
+    df['Status'] = classify(df['ASISI_Score'].to_numpy())
     
     return df
 
+# =============================================================================
+# PART 2b: VECTORIZED SCORING & WHAT-IF WEIGHT SCENARIOS
+# =============================================================================
+
+def recovery_slopes(history):
+    """
+    Least-squares slope of every row of a (districts x days) load matrix at once
+    (same result as np.polyfit(days, loads, 1) per district).
+    """
+    days = np.arange(history.shape[1]) - (history.shape[1] - 1) / 2
+    return (history - history.mean(axis=1, keepdims=True)) @ days / (days @ days)
+
+
+def scale_components(values):
+    """
+    Min-max scales (..., districts, 4) component values across districts (0-1, like
+    MinMaxScaler: a constant component scales to 0) and inverts saturation.
+    Leading axes are independent batches, e.g. simulation draws.
+    """
+    low = values.min(axis=-2, keepdims=True)
+    span = values.max(axis=-2, keepdims=True) - low
+    scaled = (values - low) / np.where(span > 0, span, 1)
+    scaled[..., INVERTED] = 1 - scaled[..., INVERTED]
+    return scaled
+
+
+def stress_matrix(df):
+    """(districts x 4) matrix of the scaled stress components."""
+    return scale_components(df[STRESS_COMPONENTS].to_numpy(dtype=float))
+
+
+def score_scenarios(stress, weights):
+    """
+    Scores every district under every weight vector with one matrix multiply.
+    weights: (4,) or (scenarios x 4). Returns (districts x scenarios).
+    """
+    return stress @ np.atleast_2d(weights).T
+
+
+def classify(scores):
+    """Vectorized status binning for a score array of any shape."""
+    return STATUS_LABELS[np.digitize(scores, STATUS_CUTS, right=True)]
+
+
+def simplex_weights(step=0.05):
+    """Every weight vector on a grid of `step` whose four weights sum to 1."""
+    n = int(round(1 / step))
+    grid = np.array([(a, b, c, n - a - b - c)
+                     for a in range(n + 1) for b in range(n + 1 - a) for c in range(n + 1 - a - b)])
+    return grid / n
+
+
+def run_weight_scenarios(df, scenarios):
+    """
+    What-if analysis over many weighting schemes.
+    scenarios: {name: [w_load, w_quality, w_resilience, w_saturation]}; the first one is the baseline.
+    Returns (scores, ranks, status, changes) - the first three are (district x scenario)
+    DataFrames, changes lists every district whose status differs from the baseline.
+    """
+    names = list(scenarios)
+    weights = np.array([scenarios[n] for n in names], dtype=float)
+    weights = weights / weights.sum(axis=1, keepdims=True)
+
+    scores = pd.DataFrame(score_scenarios(stress_matrix(df), weights), index=df['District name'], columns=names)
+    ranks = scores.rank(ascending=False, method='min').astype(int)
+    status = pd.DataFrame(classify(scores.to_numpy()), index=scores.index, columns=names)
+
+    baseline = status[names[0]].to_numpy()
+    rows, cols = np.nonzero(status.to_numpy() != baseline[:, None])
+    changes = pd.DataFrame({
+        'District name': scores.index[rows],
+        'Scenario': np.array(names)[cols],
+        'Baseline_Status': baseline[rows],
+        'Status': status.to_numpy()[rows, cols],
+        'Baseline_Rank': ranks[names[0]].to_numpy()[rows],
+        'Rank': ranks.to_numpy()[rows, cols],
+    })
+    return scores, ranks, status, changes
+
+# =============================================================================
+# PART 2c: MONTE CARLO UNCERTAINTY BANDS
+# =============================================================================
+# The simulated inputs (center sizing, rejection noise, auth multiplier) are ONE seeded
+# draw in run_asisi_analysis. Here they are redrawn thousands of times, as
+# (draws x districts) arrays, so each district gets a score interval and the
+# probability of every status instead of a label that can flip on the seed.
+
+def simulate_block(inputs, n_draws, seed):
+    """
+    Scores n_draws simulations for every district at once.
+    inputs: the columns of run_asisi_analysis used below. Returns (n_draws x districts).
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_draws, len(inputs))
+    pop = inputs['Pop_2025'].to_numpy(dtype=float)
+
+    # Same distributions as the single draw in Part 1 / Part 2
+    est_centers = (pop / rng.integers(18000, 22000, shape)).astype(int)
+    auth_volume = (inputs['demo_update_volume'].to_numpy() * rng.uniform(2, 5, shape)).astype(int)
+    rural_ratio = inputs['Rural_Households'] / (inputs['Rural_Households'] + inputs['Urban_Households'])
+    rejection = 0.03 + 0.05 * rural_ratio.to_numpy() + rng.uniform(0, 0.02, shape)
+
+    base_load = (inputs['enrolment_volume'] * 1.0 + inputs['demo_update_volume'] * 0.8
+                 + inputs['bio_update_volume'] * 0.8).to_numpy()
+    components = np.stack([
+        base_load + auth_volume * 0.1,
+        rejection,
+        np.broadcast_to(inputs['Recovery_Slope'].to_numpy(), shape),
+        est_centers / pop * 10000,
+    ], axis=-1)
+    return scale_components(components) @ DEFAULT_WEIGHTS
+
+
+def simulate_scores(df, n_draws=N_SIMULATIONS, workers=SIM_WORKERS, seed=SIM_SEED):
+    """
+    (n_draws x districts) simulated ASISI scores. Draws are split across worker
+    processes, each with an independent child stream of SeedSequence(seed), so the
+    result depends only on seed and workers - not on scheduling.
+    """
+    inputs = df[['Pop_2025', 'enrolment_volume', 'demo_update_volume', 'bio_update_volume',
+                 'Rural_Households', 'Urban_Households', 'Recovery_Slope']]
+    workers = max(1, min(workers or 1, n_draws))
+    sizes = [len(block) for block in np.array_split(np.arange(n_draws), workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+
+    if workers == 1:
+        return simulate_block(inputs, sizes[0], seeds[0])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        blocks = pool.map(simulate_block, [inputs] * workers, sizes, seeds)
+        return np.vstack(list(blocks))
+
+
+def uncertainty_bands(df, scores, confidence=CONFIDENCE):
+    """Per-district score interval and probability of each status from simulated scores."""
+    tail = (1 - confidence) / 2
+    low, median, high = np.quantile(scores, [tail, 0.5, 1 - tail], axis=0)
+    codes = np.digitize(scores, STATUS_CUTS, right=True)
+    probs = (codes[:, :, None] == np.arange(len(STATUS_LABELS))).mean(axis=0)
+
+    bands = pd.DataFrame({
+        'District name': df['District name'].to_numpy(),
+        'ASISI_Score': df['ASISI_Score'].to_numpy(),
+        'Sim_Median': median,
+        'CI_Low': low,
+        'CI_High': high,
+    })
+    for i, label in enumerate(STATUS_LABELS):
+        bands['P_' + label.split(' ')[0]] = probs[:, i]
+    bands['Likely_Status'] = STATUS_LABELS[probs.argmax(axis=1)]
+    return bands.sort_values('Sim_Median', ascending=False, ignore_index=True)
+
 # =============================================================================
 # PART 3: VISUALIZATION & REPORTING
 # =============================================================================
@@ -249,6 +488,31 @@ if __name__ == "__main__":
                 print(f"   -> Problem: High Rejection Rate ({row['Rejection_Rate']*100:.1f}%). Audit Registrar devices.")
     else:
         print("✅ No districts are currently in Critical state.")
+
+    # What-if: how sensitive is the ranking to the weights?
+    scores, ranks, status, changes = run_weight_scenarios(final_df, WEIGHT_SCENARIOS)
+    print("\n[WEIGHT SCENARIOS] Rank per scenario (1 = most stressed)")
+    print(ranks.sort_values('Default').to_string())
+    if changes.empty:
+        print("No district changes status under any scenario.")
+    else:
+        print("\nStatus changes vs. Default:")
+        print(changes.to_string(index=False))
+
+    # Sweep every weighting on a 5% grid: share of schemes that put each district in RED
+    grid_status = classify(score_scenarios(stress_matrix(final_df), simplex_weights(0.05)))
+    red_share = pd.Series((grid_status == 'RED (Critical)').mean(axis=1), index=final_df['District name'])
+    print(f"\nShare of {grid_status.shape[1]} weightings that flag each district RED:")
+    print(red_share.sort_values(ascending=False).round(3).to_string())
+
+    # Monte Carlo: score intervals and status probabilities over the simulated inputs
+    bands = uncertainty_bands(final_df, simulate_scores(final_df))
+    print(f"\n[UNCERTAINTY] {N_SIMULATIONS} simulations, {CONFIDENCE:.0%} intervals")
+    print(bands.round(3).to_string(index=False))
+    unstable = bands[bands[['P_GREEN', 'P_YELLOW', 'P_RED']].max(axis=1) < 0.9]
+    for _, row in unstable.iterrows():
+        print(f"⚠️  {row['District name']}: label not settled by the data "
+              f"(GREEN {row['P_GREEN']:.0%} / YELLOW {row['P_YELLOW']:.0%} / RED {row['P_RED']:.0%}).")
         
     # Launch Graphs
     visualize_results(final_df)
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""Shared fixtures: synthetic source rows and a store comparison, no real workbooks needed."""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Aadhaar'))
+
+from ingest import SOURCES, KEY_COLUMNS   # noqa: E402
+from rollups import LEVELS, combine_sources   # noqa: E402
+
+AREAS = [('Kerala', 'Wayanad', 670001), ('Kerala', 'Thrissur', 670202), ('Bihar', 'Gaya', 800100),
+         ('Bihar', 'Patna', 800001), ('Odisha', 'Puri', 752001)]
+
+
+def make_rows(source, n, seed, start='2024-11-01', days=120):
+    """n clean rows of one source: a few districts, 20 PIN codes each, random dates and counts."""
+    rng = np.random.default_rng(seed)
+    area = rng.integers(0, len(AREAS), n)
+    return pd.DataFrame({
+        'date': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, n), unit='D'),
+        'state': [AREAS[a][0] for a in area],
+        'district': [AREAS[a][1] for a in area],
+        'pincode': np.array([AREAS[a][2] for a in area]) + rng.integers(0, 20, n),
+        **{m: rng.integers(0, 40, n) for m in SOURCES[source]['measures']},
+    })
+
+
+@pytest.fixture
+def frames():
+    return {source: make_rows(source, 600, seed) for seed, source in enumerate(SOURCES)}
+
+
+@pytest.fixture
+def daily(frames):
+    return combine_sources(frames)
+
+
+@pytest.fixture
+def assert_same_store():
+    """Asserts two stores hold the same tables (row order and index dtypes aside)."""
+    def check(a, b):
+        order = ['pincode', 'date', 'state', 'district']
+        pd.testing.assert_frame_equal(a['daily'].sort_values(order, ignore_index=True)[b['daily'].columns],
+                                      b['daily'].sort_values(order, ignore_index=True), check_dtype=False)
+        for level in LEVELS:
+            pd.testing.assert_frame_equal(a['prefix'][level], b['prefix'][level], check_dtype=False)
+        for source in SOURCES:
+            pd.testing.assert_frame_equal(a['hll'][source]['index'].astype(str), b['hll'][source]['index'].astype(str))
+            np.testing.assert_array_equal(a['hll'][source]['registers'], b['hll'][source]['registers'])
+        for name in b['quantiles']:
+            pd.testing.assert_frame_equal(a['quantiles'][name]['index'], b['quantiles'][name]['index'])
+            np.testing.assert_array_equal(a['quantiles'][name]['counts'], b['quantiles'][name]['counts'])
+        pd.testing.assert_frame_equal(a['cohorts']['index'], b['cohorts']['index'])
+        np.testing.assert_array_equal(a['cohorts']['years'], b['cohorts']['years'])
+        np.testing.assert_array_equal(a['cohorts']['values'], b['cohorts']['values'])
+        for resolution, level in b['pyramid']['levels'].items():
+            pd.testing.assert_frame_equal(a['pyramid']['levels'][resolution].sort_index(), level.sort_index(),
+                                          check_dtype=False)
+    return check
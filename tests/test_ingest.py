@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from ingest import (BAD_PINCODE, NEGATIVE_COUNT, MISSING_COUNT, BAD_DATE, MISSING_AREA, validate_frame,
+                    row_fingerprints, dedup_owners)
+
+MEASURES = ['bio_age_5_17', 'bio_age_17_']
+
+
+def test_validate_frame_sets_one_bit_per_rule():
+    df = pd.DataFrame({
+        'date': ['01-03-2025', '01-03-2025', 'not a date', '01-03-2025', '01-03-2025', 'x'],
+        'state': ['Bihar', 'Bihar', 'Bihar', ' ', 'Bihar', None],
+        'district': ['Gaya'] * 6,
+        'pincode': [800100, 12345, 800100, 800100, 800100, 'abc'],
+        'bio_age_5_17': [3, 3, 3, 3, -1, None],
+        'bio_age_17_': [4, 4, 4, 4, 4, 4],
+    })
+    clean, bad, counts = validate_frame(df, MEASURES)
+
+    assert len(clean) == 1
+    assert bad['dq_flags'].tolist() == [BAD_PINCODE, BAD_DATE, MISSING_AREA, NEGATIVE_COUNT,
+                                        BAD_PINCODE | MISSING_COUNT | BAD_DATE | MISSING_AREA]
+    assert counts == {'bad_pincode': 2, 'negative_count': 1, 'missing_count': 1, 'bad_date': 2, 'missing_area': 2}
+
+
+def test_fingerprints_share_a_key_across_state_spellings():
+    df = pd.DataFrame({'date': pd.to_datetime(['2025-03-01'] * 3), 'state': ['Orissa', 'odisha ', 'Bihar'],
+                       'district': ['Puri'] * 3, 'pincode': [752001] * 3})
+    keys = row_fingerprints(df)
+    assert keys[0] == keys[1] != keys[2]
+
+
+def test_dedup_owners():
+    keys = np.array([1, 2, 2, 3, 3, 4], dtype=np.uint64)
+    owners = np.array([10, 10, 10, 20, 10, 20], dtype=np.uint64)
+    hist_keys = np.array([4], dtype=np.uint64)
+    hist_owners = np.array([30], dtype=np.uint64)
+
+    keep, fresh_keys, fresh_owners = dedup_owners(keys, owners, hist_keys, hist_owners)
+
+    # repeats inside one file are kept; the first file (in load order) owns a new key;
+    # a key already in the index keeps its recorded owner
+    assert keep.tolist() == [True, True, True, True, False, False]
+    assert fresh_keys.tolist() == [1, 2, 3]
+    assert fresh_owners.tolist() == [10, 10, 20]
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from ingest import SOURCES
+from rollups import MEASURES, ROW_COUNTS, partial_rollups, merge_rollups, rollups_from_daily, build_prefix_rollups
+from timeindex import build_time_index, range_totals
+
+
+def test_prefix_levels_are_integer_division_of_the_pin(daily):
+    prefix = build_prefix_rollups(daily)
+    expected = daily.groupby(daily['pincode'] // 1000)[MEASURES + ROW_COUNTS].sum()
+    np.testing.assert_array_equal(prefix[3].to_numpy(), expected.to_numpy())
+    assert prefix[1][MEASURES].sum().equals(daily[MEASURES].sum())
+
+
+def test_range_totals_match_direct_sums(daily):
+    index = build_time_index(daily, MEASURES + ROW_COUNTS)
+    for start, end in [(None, None), ('2024-12-03', '2025-01-20'), ('2025-01-05', None), ('2030-01-01', None)]:
+        totals = range_totals(index, start, end).set_index('pincode')
+        window = daily[(daily['date'] >= pd.Timestamp(start or '1900-01-01'))
+                       & (daily['date'] <= pd.Timestamp(end or '2100-01-01'))]
+        direct = window.groupby('pincode')[MEASURES + ROW_COUNTS].sum().reindex(totals.index, fill_value=0)
+        np.testing.assert_array_equal(totals.to_numpy(), direct.to_numpy())
+
+
+def test_merge_of_pin_shards_equals_full_build(daily, assert_same_store):
+    shard = daily['pincode'] % 3
+    parts = [partial_rollups(daily[shard == i].reset_index(drop=True)) for i in range(3)]
+    assert_same_store(merge_rollups(parts, {}), rollups_from_daily(daily, {}))
+
+
+def test_missing_source_columns_stay_zero(frames):
+    from rollups import combine_sources
+    daily = combine_sources({'biometric': frames['biometric']})
+    other = [m for s, spec in SOURCES.items() if s != 'biometric' for m in spec['measures']]
+    assert (daily[other] == 0).all().all()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from rollups import daily_ratios
+from sketches import (build_hll, merge_hll, distinct_pincodes, build_quantiles, merge_quantiles,
+                      subtract_quantiles, sketch_quantile)
+
+
+def test_hll_merge_equals_build_over_union(daily):
+    a, b = daily.iloc[::2], daily.iloc[1::2]
+    merged = merge_hll(build_hll(a, 'biometric'), build_hll(b, 'biometric'))
+    whole = build_hll(daily, 'biometric')
+    assert merged['index'].astype(str).equals(whole['index'].astype(str))
+    np.testing.assert_array_equal(merged['registers'], whole['registers'])
+
+
+def test_hll_estimate_is_close(daily):
+    true = daily.loc[daily['n_biometric'] > 0, 'pincode'].nunique()
+    assert distinct_pincodes(build_hll(daily, 'biometric')) == pytest.approx(true, rel=0.1)
+
+
+def test_quantile_merge_and_subtract(daily):
+    ratios = daily_ratios(daily)['child_compliance_ratio']
+    a, b = ratios.iloc[::3], ratios.drop(ratios.index[::3])
+    merged = merge_quantiles(build_quantiles(a, 'child_compliance_ratio'), build_quantiles(b, 'child_compliance_ratio'))
+    whole = build_quantiles(ratios, 'child_compliance_ratio')
+    assert merged['index'].equals(whole['index'])
+    np.testing.assert_array_equal(merged['counts'], whole['counts'])
+
+    rest = subtract_quantiles(whole, build_quantiles(a, 'child_compliance_ratio'))
+    np.testing.assert_array_equal(rest['counts'], build_quantiles(b, 'child_compliance_ratio')['counts'])
+
+
+def test_sketch_quantile_within_relative_error(daily):
+    ratios = daily_ratios(daily)['child_compliance_ratio']['child_compliance_ratio']
+    estimate = sketch_quantile(build_quantiles(daily_ratios(daily)['child_compliance_ratio'], 'child_compliance_ratio'), 0.5)
+    assert estimate == pytest.approx(ratios.quantile(0.5, interpolation='lower'), rel=0.02)
@@ -0,0 +1,77 @@
+import os
+import asyncio
+import shutil
+import pandas as pd
+import pytest
+import watcher
+from ingest import SOURCES
+from rollups import build_rollups
+from conftest import make_rows
+
+
+def write_workbook(data_dir, source, name, rows):
+    folder = os.path.join(data_dir, SOURCES[source]['folder'])
+    os.makedirs(folder, exist_ok=True)
+    rows.assign(date=rows['date'].dt.strftime('%d-%m-%Y')).to_excel(os.path.join(folder, name), index=False)
+
+
+def rebuilt(data_dir, tmp_path):
+    """The store a from-scratch build gives for the same workbooks."""
+    fresh = tmp_path / 'fresh'
+    shutil.rmtree(fresh, ignore_errors=True)
+    shutil.copytree(data_dir, fresh, ignore=shutil.ignore_patterns('Output'))
+    return build_rollups(str(fresh))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data = tmp_path / 'data'
+    for seed, source in enumerate(SOURCES):
+        first = make_rows(source, 300, seed)
+        write_workbook(data, source, 'part1.xlsx', first)
+        # overlapping second workbook: some rows repeat the first one's keys
+        write_workbook(data, source, 'part2.xlsx', pd.concat([make_rows(source, 300, seed + 10), first.head(40)]))
+    return str(data)
+
+
+def test_watcher_add_and_remove_match_a_rebuild(data_dir, tmp_path, assert_same_store, monkeypatch):
+    monkeypatch.setattr(watcher, 'PARSE_WORKERS', 1)
+    rebuilds = []
+    full = watcher.rollups_from_daily
+    monkeypatch.setattr(watcher, 'rollups_from_daily', lambda *args: rebuilds.append(1) or full(*args))
+
+    async def scenario():
+        w = watcher.Watcher(data_dir)
+        try:
+            await w.start()
+            assert_same_store(w.rollups, rebuilt(data_dir, tmp_path))
+
+            # new workbook on keys the other sources already have, plus later dates
+            added = pd.concat([make_rows('demographic', 100, 99), make_rows('biometric', 50, 0).drop(
+                columns=SOURCES['biometric']['measures']).assign(demo_age_5_17=5, demo_age_17_=7)])
+            write_workbook(data_dir, 'demographic', 'part3.xlsx', added)
+            rebuilds.clear()
+            await w.refresh(['demographic_data/part3.xlsx'], [], watcher.data_manifest(data_dir))
+            assert not rebuilds
+            assert_same_store(w.rollups, rebuilt(data_dir, tmp_path))
+
+            os.remove(os.path.join(data_dir, 'biometric_data', 'part1.xlsx'))
+            await w.refresh([], ['biometric_data/part1.xlsx'], watcher.data_manifest(data_dir))
+            assert rebuilds
+            assert_same_store(w.rollups, rebuilt(data_dir, tmp_path))
+            assert w.seen == watcher.data_manifest(data_dir)
+        finally:
+            w.pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_alerts_are_keyed_without_their_detail(tmp_path):
+    w = watcher.Watcher(str(tmp_path))
+    w.pool.shutdown()
+    w.raise_alerts([('spike', 'PIN 800100', 'week of 2025-01-06', '60 vs 10 avg/week')])
+    w.raise_alerts([('spike', 'PIN 800100', 'week of 2025-01-06', '64 vs 11 avg/week')])
+    with open(w.alert_file) as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('rule,where,period,detail')
+    assert len(lines) == 2